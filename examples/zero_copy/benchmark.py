@@ -0,0 +1,92 @@
+"""
+Peak resident memory of a master that forwards large payloads, with and
+without zero-copy. Each run starts a fresh master and a worker, and a client
+sends a job with large messages. Linux only, since the peak memory of the
+master is read from /proc.
+
+    python benchmark.py --size 50 --messages 20
+"""
+from pylm.servers import Master, Worker
+from pylm.clients import Client
+import multiprocessing
+import argparse
+import logging
+import time
+
+
+class EchoWorker(Worker):
+    def echo(self, message):
+        return message
+
+
+def master(zero_copy):
+    Master(name='server',
+           pull_address='tcp://127.0.0.1:5555',
+           pub_address='tcp://127.0.0.1:5556',
+           worker_pull_address='tcp://127.0.0.1:5557',
+           worker_push_address='tcp://127.0.0.1:5558',
+           db_address='tcp://127.0.0.1:5559',
+           log_level=logging.WARNING,
+           zero_copy=zero_copy).start()
+
+
+def worker():
+    EchoWorker('worker', 'tcp://127.0.0.1:5559',
+               log_level=logging.WARNING).start()
+
+
+def peak_memory(pid):
+    """
+    Peak resident memory of a process in MB
+    """
+    with open('/proc/{}/status'.format(pid)) as status:
+        for line in status:
+            if line.startswith('VmHWM'):
+                return int(line.split()[1]) / 1024
+
+
+def run(zero_copy, size, messages):
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=master, args=(zero_copy,)),
+                 context.Process(target=worker)]
+
+    processes[0].start()
+    time.sleep(1.0)
+    processes[1].start()
+
+    try:
+        payload = b'x' * size
+        with Client('server', 'tcp://127.0.0.1:5559',
+                    logging_level=logging.WARNING,
+                    split=True,
+                    zero_copy=zero_copy) as client:
+            start = time.time()
+            for result in client.job('server.echo',
+                                     (payload for i in range(messages)),
+                                     messages=messages):
+                assert len(result) == size
+            elapsed = time.time() - start
+
+        return peak_memory(processes[0].pid), elapsed
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=50,
+                        help='Size of each payload in MB')
+    parser.add_argument('--messages', type=int, default=20,
+                        help='Number of messages of the job')
+    parser.add_argument('--threshold', type=int, default=65536,
+                        help='Zero-copy threshold in bytes')
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    print('{:>10} {:>16} {:>10}'.format('zero_copy', 'master peak (MB)',
+                                         'time (s)'))
+    for zero_copy in (0, args.threshold):
+        memory, elapsed = run(zero_copy, size, args.messages)
+        print('{:>10} {:>16.1f} {:>10.2f}'.format(zero_copy, memory, elapsed))
@@ -0,0 +1,162 @@
+# Pylm, a framework to build components for high performance distributed
+# applications. Copyright (C) 2016 NFQ Solutions
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Throughput and latency of the pylm topologies, in local processes.
+
+    python -m pylm.bench run --topology master --transport ipc tcp \\
+        --size 64 65536 --concurrency 1 8 --output results.json
+    python -m pylm.bench compare baseline.json results.json
+    python -m pylm.bench micro logging
+"""
+from pylm.bench.runner import sweep, compare, environment
+from pylm.bench.micro import MICRO
+from pylm.bench.topologies import TOPOLOGIES, TRANSPORTS
+import argparse
+import json
+import sys
+
+
+def _print_result(result):
+    if 'error' in result:
+        print('{topology:>10} {transport:>7} {size:>9} {concurrency:>5}   '
+              'error: {error}'.format(**result), file=sys.stderr)
+    else:
+        latency = result['latency']
+        print('{:>10} {:>7} {:>9} {:>5} {:>11.1f} {:>9.3f} {:>9.3f} '
+              '{:>9.3f}'.format(result['topology'], result['transport'],
+                                result['size'], result['concurrency'],
+                                result['throughput'], latency['p50'] * 1000,
+                                latency['p99'] * 1000, latency['p999'] * 1000),
+              file=sys.stderr)
+
+
+def run(args):
+    print('{:>10} {:>7} {:>9} {:>5} {:>11} {:>9} {:>9} {:>9}'.format(
+        'topology', 'trans', 'size', 'conc', 'msg/s', 'p50 ms', 'p99 ms',
+        'p999 ms'), file=sys.stderr)
+    results = sweep(args.topology, args.transport, args.size,
+                    args.concurrency,
+                    messages=args.messages,
+                    warmup=args.warmup,
+                    workers=args.workers,
+                    stages=args.stages,
+                    settle=args.settle,
+                    timeout=args.timeout,
+                    report=_print_result)
+
+    if args.output == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    return 1 if any('error' in result for result in results['results']) \
+        else 0
+
+
+def run_compare(args):
+    with open(args.baseline) as baseline, open(args.current) as current:
+        changes = compare(json.load(baseline), json.load(current),
+                          args.tolerance)
+
+    print('{:>10} {:>7} {:>9} {:>5} {:>11} {:>9}'.format(
+        'topology', 'trans', 'size', 'conc', 'msg/s', 'p99'))
+    for change in changes:
+        print('{:>10} {:>7} {:>9} {:>5} {:>+10.1%} {:>+8.1%}{}'.format(
+            change['topology'], change['transport'], change['size'],
+            change['concurrency'], change['throughput'], change['p99'],
+            '  REGRESSION' if change['regression'] else ''))
+
+    return 1 if any(change['regression'] for change in changes) else 0
+
+
+def run_micro(args):
+    results = []
+    for name in args.benchmark:
+        results.append({'benchmark': name,
+                        'calls': args.calls,
+                        'nanoseconds': MICRO[name](args.calls)})
+        for variant, nanoseconds in sorted(results[-1]['nanoseconds'].items()):
+            print('{:>10} {:>16} {:>11.1f} ns'.format(name, variant,
+                                                       nanoseconds),
+                  file=sys.stderr)
+
+    json.dump(dict(environment(), results=results), sys.stdout, indent=2)
+    print()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m pylm.bench', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    runner = commands.add_parser('run', help='Run the benchmarks')
+    runner.add_argument('--topology', nargs='+', default=sorted(TOPOLOGIES),
+                        choices=sorted(TOPOLOGIES),
+                        help='Topologies. Defaults to all.')
+    runner.add_argument('--transport', nargs='+', default=list(TRANSPORTS),
+                        choices=TRANSPORTS,
+                        help='Transports. Defaults to all.')
+    runner.add_argument('--size', nargs='+', type=int,
+                        default=[64, 4096, 65536],
+                        help='Sizes of the payloads in bytes')
+    runner.add_argument('--concurrency', nargs='+', type=int, default=[1, 8],
+                        help='Numbers of clients that call at once')
+    runner.add_argument('--messages', type=int, default=2000,
+                        help='Calls that are measured in each case')
+    runner.add_argument('--warmup', type=int, default=50,
+                        help='Calls of each client before the measure')
+    runner.add_argument('--workers', type=int, default=2,
+                        help='Workers of the topologies that have them')
+    runner.add_argument('--stages', type=int, default=2,
+                        help='Pipelines of the pipeline topology')
+    runner.add_argument('--settle', type=float, default=1.0,
+                        help='Seconds that the servers get to start')
+    runner.add_argument('--timeout', type=float, default=120,
+                        help='Seconds before a case is killed')
+    runner.add_argument('--output', default='-',
+                        help='File for the results in JSON. Defaults to '
+                             'the standard output.')
+    runner.set_defaults(function=run)
+
+    comparer = commands.add_parser(
+        'compare', help='Compare the results of two runs')
+    comparer.add_argument('baseline', help='Results to compare with')
+    comparer.add_argument('current', help='Results of the new run')
+    comparer.add_argument('--tolerance', type=float, default=0.1,
+                          help='Relative change that is not a regression. '
+                               'Defaults to 0.1.')
+    comparer.set_defaults(function=run_compare)
+
+    micro = commands.add_parser(
+        'micro', help='Run microbenchmarks of the hot paths')
+    micro.add_argument('benchmark', nargs='*', default=sorted(MICRO),
+                       choices=sorted(MICRO),
+                       help='Microbenchmarks. Defaults to all.')
+    micro.add_argument('--calls', type=int, default=200000,
+                       help='Calls of each variant')
+    micro.set_defaults(function=run_micro)
+
+    args = parser.parse_args(argv)
+    return args.function(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
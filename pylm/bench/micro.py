@@ -0,0 +1,207 @@
+# Pylm, a framework to build components for high performance distributed
+# applications. Copyright (C) 2016 NFQ Solutions
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Microbenchmarks of pieces of the hot paths, that run in this process.
+# Each one measures the time per call of some variants of the same
+# operation.
+from pylm.parts.logs import ConsoleHandler, FORMAT, flush
+from pylm.persistence.kv import DictDB
+from pylm.bench.runner import percentile
+from contextlib import redirect_stdout
+from threading import Thread, Lock, Event
+import itertools
+import logging
+import random
+import time
+
+
+def per_call(function, calls):
+    """
+    Nanoseconds that a call of the function takes, on average.
+
+    :param function: Function without arguments
+    :param calls: Number of calls
+    """
+    start = time.perf_counter()
+    for i in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+class SlowStream(object):
+    """
+    Stream that takes some time to write each line, like a terminal or a
+    pipe with a slow reader.
+
+    :param seconds: Time of each write
+    """
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def write(self, text):
+        time.sleep(self.seconds)
+
+    def flush(self):
+        pass
+
+
+def _logger(name, level, handler):
+    logger = logging.getLogger('pylm.bench.{}'.format(name))
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(level)
+    return logger
+
+
+def logging_calls(calls):
+    """
+    A debug line of a part for each message. With the debug level off, the
+    line formatted before the call against the arguments passed to the
+    logger. With the debug level on, the time that the thread of the part
+    spends when the line goes to a stream handler against the queue of
+    :mod:`pylm.parts.logs`, both to a stream that takes 50 microseconds for
+    each line. The variants with the level on make a hundredth of the calls.
+
+    :param calls: Number of calls of each variant
+    """
+    name = 'Pull'
+    slow = SlowStream(0.00005)
+    off = _logger('off', logging.INFO, ConsoleHandler())
+    stream = _logger('stream', logging.DEBUG, logging.StreamHandler(slow))
+    stream.handlers[0].setFormatter(logging.Formatter(FORMAT))
+    queued = _logger('queue', logging.DEBUG, ConsoleHandler())
+
+    with redirect_stdout(slow):
+        results = {
+            'eager_off': per_call(
+                lambda: off.debug('{} Got inbound message'.format(name)),
+                calls),
+            'lazy_off': per_call(
+                lambda: off.debug('%s Got inbound message', name),
+                calls),
+            'stream_on': per_call(
+                lambda: stream.debug('%s Got inbound message', name),
+                max(1, calls // 100)),
+            'queue_on': per_call(
+                lambda: queued.debug('%s Got inbound message', name),
+                max(1, calls // 100))
+        }
+        flush()
+
+    return results
+
+
+class LockedDict(object):
+    """
+    The previous DictDB, a dictionary with a lock that all the instances
+    share, and that is held while the keys are cleaned.
+    """
+    lock = Lock()
+
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        try:
+            return self.store[key]
+        except KeyError:
+            return None
+
+    def set(self, key, value):
+        with self.lock:
+            self.store[key] = value
+
+    def clean(self, prefix):
+        deleted = list()
+        with self.lock:
+            for key in self.store:
+                if key.startswith(prefix):
+                    deleted.append(key)
+
+            for key in deleted:
+                del self.store[key]
+
+
+def _hammer(cache, calls, threads, keys):
+    """
+    Latencies of the gets and sets of ``threads`` threads at once, while
+    another thread sets and cleans the keys of sessions.
+    """
+    for key in keys:
+        cache.set(key, b'x')
+
+    latencies = [[] for i in range(threads)]
+    finished = Event()
+
+    def work(index):
+        chooser = random.Random(index)
+        for i in range(calls // threads):
+            key = chooser.choice(keys)
+            start = time.perf_counter()
+            if chooser.random() < 0.9:
+                cache.get(key)
+            else:
+                cache.set(key, b'y')
+            latencies[index].append(time.perf_counter() - start)
+
+    def clean():
+        session = 0
+        while not finished.is_set():
+            prefix = 'session{}-'.format(session)
+            for i in range(1000):
+                cache.set('{}{}'.format(prefix, i), b'z')
+            cache.clean(prefix)
+            session += 1
+
+    cleaner = Thread(target=clean)
+    cleaner.start()
+    workers = [Thread(target=work, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    finished.set()
+    cleaner.join()
+
+    return sorted(itertools.chain.from_iterable(latencies))
+
+
+def dictdb_calls(calls, threads=8):
+    """
+    Gets and sets of ``threads`` threads at once in a store with 100000
+    keys, while another thread cleans the keys of sessions. The mean and the
+    p99.9 latencies of the gets and the sets, with the previous store, that
+    holds its lock while it cleans, and with the striped
+    :class:`pylm.persistence.kv.DictDB`.
+
+    :param calls: Number of gets and sets of each variant
+    :param threads: Number of threads that get and set
+    """
+    keys = ['task{}'.format(i) for i in range(100000)]
+    results = {}
+    for name, cache in (('single_lock', LockedDict()),
+                        ('striped', DictDB())):
+        latencies = _hammer(cache, calls, threads, keys)
+        results[name] = sum(latencies) / len(latencies) * 1e9
+        results[name + '_p999'] = percentile(latencies, 99.9) * 1e9
+
+    return results
+
+
+MICRO = {
+    'dictdb': dictdb_calls,
+    'logging': logging_calls,
+}
@@ -0,0 +1,265 @@
+# Pylm, a framework to build components for high performance distributed
+# applications. Copyright (C) 2016 NFQ Solutions
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Runs the benchmark cases and compares their results. Each case runs in a
+# fresh process, so the cases don't share sockets, threads or caches, and a
+# case that hangs can be killed with all its servers.
+from pylm import __version__
+from pylm.bench.topologies import TOPOLOGIES, Addresses, Launcher
+from threading import Thread, Barrier, BrokenBarrierError
+import multiprocessing
+import itertools
+import platform
+import signal
+import time
+import os
+
+# Fields that identify a case in the results
+KEY = ('topology', 'transport', 'size', 'concurrency')
+
+
+def percentile(ordered, percentile):
+    """
+    Percentile of a sorted list, by the nearest rank.
+
+    :param ordered: Sorted list of values
+    :param percentile: Percentile, like 99
+    """
+    if not ordered:
+        return 0.0
+
+    rank = int(len(ordered) * percentile / 100 + 0.5)
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+def environment():
+    """
+    Versions and platform of the run, to tell the results apart.
+    """
+    return {'pylm': __version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z')}
+
+
+def measure(connect, size, concurrency, messages, warmup):
+    """
+    Calls the topology from ``concurrency`` clients at once, each one in its
+    own thread and waiting for each result before the next call.
+
+    :param connect: Function that connects the client with the given index
+    :param size: Size of the payloads in bytes
+    :param concurrency: Number of clients
+    :param messages: Number of calls that are measured, of all the clients
+    :param warmup: Calls of each client before the measure starts
+    :return: Dictionary with the throughput and the latencies
+    """
+    payload = b'x' * size
+    calls = max(1, messages // concurrency)
+    latencies = [[] for i in range(concurrency)]
+    errors = []
+    ready = Barrier(concurrency + 1)
+    done = Barrier(concurrency + 1)
+
+    def run(index):
+        client = None
+        try:
+            client, call = connect(index)
+            for i in range(warmup):
+                call(payload)
+        except Exception as error:
+            errors.append(repr(error))
+            ready.abort()
+            return
+
+        try:
+            ready.wait()
+        except BrokenBarrierError:
+            return
+
+        try:
+            for i in range(calls):
+                start = time.perf_counter()
+                result = call(payload)
+                latencies[index].append(time.perf_counter() - start)
+                if len(result) != size:
+                    raise ValueError('Got {} bytes for a payload of {}'.format(
+                        len(result), size))
+        except Exception as error:
+            errors.append(repr(error))
+        finally:
+            done.wait()
+            if client is not None:
+                client.clean()
+
+    threads = [Thread(target=run, args=(i,), daemon=True)
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        ready.wait()
+    except BrokenBarrierError:
+        raise RuntimeError(errors[0])
+
+    start = time.perf_counter()
+    done.wait()
+    elapsed = time.perf_counter() - start
+
+    if errors:
+        raise RuntimeError(errors[0])
+
+    ordered = sorted(itertools.chain.from_iterable(latencies))
+    return {'messages': len(ordered),
+            'seconds': elapsed,
+            'throughput': len(ordered) / elapsed,
+            'latency': {'mean': sum(ordered) / len(ordered),
+                        'p50': percentile(ordered, 50),
+                        'p99': percentile(ordered, 99),
+                        'p999': percentile(ordered, 99.9),
+                        'max': ordered[-1]}}
+
+
+def _drive(case, connection):
+    """
+    Runs a case in the current process, sends the result through the
+    connection and exits.
+    """
+    # The servers of the case are in the same group, to kill them all.
+    os.setpgrp()
+    addresses = Addresses(case['transport'])
+    launch = Launcher(case['transport'])
+    try:
+        connect = TOPOLOGIES[case['topology']](addresses, launch, case)
+        time.sleep(case['settle'])
+        result = measure(connect, case['size'], case['concurrency'],
+                         case['messages'], case['warmup'])
+    except Exception as error:
+        result = {'error': repr(error)}
+
+    connection.send(result)
+    launch.cleanup()
+    addresses.cleanup()
+    # The threads of the servers never end.
+    os._exit(0)
+
+
+def run_case(case):
+    """
+    Runs a benchmark case in a new process.
+
+    :param case: Dictionary with the topology, the transport, the size of
+        the payloads, the concurrency, and the options of :func:`sweep`.
+    :return: The case updated with its results, or with the error.
+    """
+    if case['topology'] not in TOPOLOGIES:
+        raise ValueError('Topology {} not supported. Use one of {}'.format(
+            case['topology'], ', '.join(sorted(TOPOLOGIES))))
+
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_drive, args=(case, sender))
+    process.start()
+    sender.close()
+
+    result = dict(case)
+    try:
+        if receiver.poll(case['timeout']):
+            result.update(receiver.recv())
+        else:
+            result['error'] = 'Timed out after {} s'.format(case['timeout'])
+    except EOFError:
+        result['error'] = 'The benchmark process died'
+    finally:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.join()
+        receiver.close()
+
+    return result
+
+
+def sweep(topologies, transports, sizes, concurrencies, messages=2000,
+          warmup=50, workers=2, stages=2, settle=1.0, timeout=120,
+          report=None):
+    """
+    Runs the cases of all the combinations of the given topologies,
+    transports, payload sizes and concurrencies.
+
+    :param topologies: Names of the topologies, from
+        :data:`pylm.bench.topologies.TOPOLOGIES`
+    :param transports: Transports, 'inproc', 'ipc' or 'tcp'
+    :param sizes: Sizes of the payloads in bytes
+    :param concurrencies: Numbers of clients that make calls at once
+    :param messages: Calls that are measured in each case. Defaults to 2000.
+    :param warmup: Calls of each client before the measure. Defaults to 50.
+    :param workers: Workers of the topologies that have them. Defaults to 2.
+    :param stages: Pipelines of the pipeline topology. Defaults to 2.
+    :param settle: Seconds that the servers get to start. Defaults to 1.
+    :param timeout: Seconds before a case is killed. Defaults to 120.
+    :param report: Function called with the result of each case.
+    :return: Dictionary with the environment and a list with the results.
+    """
+    options = {'messages': messages, 'warmup': warmup, 'workers': workers,
+               'stages': stages, 'settle': settle, 'timeout': timeout}
+    results = []
+    for topology, transport, size, concurrency in itertools.product(
+            topologies, transports, sizes, concurrencies):
+        case = dict(options, topology=topology, transport=transport,
+                    size=size, concurrency=concurrency)
+        result = run_case(case)
+        if report:
+            report(result)
+        results.append(result)
+
+    return dict(environment(), results=results)
+
+
+def compare(baseline, current, tolerance=0.1):
+    """
+    Compares the cases of two runs. A case is a regression when its
+    throughput is lower, or its p99 latency is higher, than the one of the
+    baseline by more than the tolerance.
+
+    :param baseline: Results of :func:`sweep` to compare with
+    :param current: Results of :func:`sweep`
+    :param tolerance: Relative change that is not a regression. Defaults
+        to 0.1.
+    :return: List of dictionaries with the key of each case in both runs,
+        the relative change of the throughput and of the p99 latency, and
+        whether it is a regression.
+    """
+    previous = {tuple(result[field] for field in KEY): result
+                for result in baseline['results'] if 'error' not in result}
+
+    changes = []
+    for result in current['results']:
+        key = tuple(result[field] for field in KEY)
+        if key not in previous or 'error' in result:
+            continue
+
+        before = previous[key]
+        throughput = result['throughput'] / before['throughput'] - 1
+        p99 = result['latency']['p99'] / before['latency']['p99'] - 1
+        changes.append(dict(zip(KEY, key),
+                            throughput=throughput,
+                            p99=p99,
+                            regression=throughput < -tolerance or
+                            p99 > tolerance))
+
+    return changes
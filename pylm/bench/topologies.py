@@ -0,0 +1,422 @@
+# Pylm, a framework to build components for high performance distributed
+# applications. Copyright (C) 2016 NFQ Solutions
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# The topologies that the benchmarks run. Each one starts its servers and
+# workers, with echo functions, and returns the function that makes a
+# call from a client. With the inproc transport, the servers run in threads
+# of the process of the benchmark, and in processes of their own otherwise.
+from pylm.clients import Client
+from pylm.servers import Server, Pipeline, Sink, Master, Hub, Worker, \
+    MuxWorker
+from pylm.parts.servers import ServerTemplate
+from pylm.parts.services import WorkerPullService, WorkerPushService, \
+    CacheService
+from pylm.parts.gateways import GatewayDealer, GatewayRouter, HttpGateway, \
+    MyHandler
+from pylm.persistence.kv import DictDB
+from threading import Thread
+from uuid import uuid4
+import multiprocessing
+import http.client
+import tempfile
+import logging
+import shutil
+import socket
+import os
+
+TRANSPORTS = ('inproc', 'ipc', 'tcp')
+
+# Logging level of the servers and the clients of the benchmarks
+LOG_LEVEL = logging.WARNING
+
+
+def free_port():
+    """
+    A TCP port of the loopback interface that is free now.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+class Addresses(object):
+    """
+    Addresses of the sockets of a topology for a transport, each one
+    different.
+
+    :param transport: 'inproc', 'ipc' or 'tcp'
+    """
+    def __init__(self, transport):
+        if transport not in TRANSPORTS:
+            raise ValueError('Transport {} not supported. Use one of {}'.format(
+                transport, ', '.join(TRANSPORTS)))
+
+        self.transport = transport
+        self.uuid = uuid4().hex[:8]
+        self.directory = None
+        if transport == 'ipc':
+            self.directory = tempfile.mkdtemp(prefix='pylm-bench-')
+
+    def __call__(self, name):
+        """
+        Address of a socket.
+
+        :param name: Name of the socket, unique in the topology
+        """
+        if self.transport == 'inproc':
+            return 'inproc://bench-{}-{}'.format(self.uuid, name)
+        elif self.transport == 'ipc':
+            return 'ipc://{}'.format(os.path.join(self.directory, name))
+        else:
+            return 'tcp://127.0.0.1:{}'.format(free_port())
+
+    def cleanup(self):
+        if self.directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class Launcher(object):
+    """
+    Runs the servers of a topology in threads for the inproc transport, and
+    in processes otherwise.
+
+    :param transport: 'inproc', 'ipc' or 'tcp'
+    """
+    def __init__(self, transport):
+        self.transport = transport
+        self.processes = []
+
+    def __call__(self, target, *args):
+        """
+        Starts a server.
+
+        :param target: Function at the module level that starts the server
+        :param args: Arguments of the function
+        """
+        if self.transport == 'inproc':
+            Thread(target=target, args=args, daemon=True).start()
+        else:
+            # Spawn, because forked processes can't use the zmq context.
+            context = multiprocessing.get_context('spawn')
+            process = context.Process(target=target, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+
+    def cleanup(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+
+
+class EchoServer(Server):
+    def echo(self, message):
+        return message
+
+
+class EchoPipeline(Pipeline):
+    def echo(self, message):
+        return message
+
+
+class EchoSink(Sink):
+    def echo(self, message):
+        return message
+
+
+class EchoWorker(Worker):
+    def echo(self, message):
+        return message
+
+
+class EchoMuxWorker(MuxWorker):
+    def echo(self, message):
+        yield message
+        yield message
+
+
+class QuietHandler(MyHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def run_server(name, db_address, pull_address, pub_address, pipelined):
+    EchoServer(name, db_address, pull_address, pub_address,
+               pipelined=pipelined, log_level=LOG_LEVEL).start()
+
+
+def run_pipeline(name, db_address, sub_address, pub_address, previous,
+                 to_client):
+    EchoPipeline(name, db_address, sub_address, pub_address, previous,
+                 to_client=to_client, log_level=LOG_LEVEL).start()
+
+
+def run_sink(name, db_address, sub_addresses, pub_address, previous):
+    EchoSink(name, db_address, sub_addresses, pub_address, previous,
+             to_client=True, log_level=LOG_LEVEL).start()
+
+
+def run_master(name, db_address, pull_address, pub_address,
+               worker_pull_address, worker_push_address):
+    Master(name=name,
+           pull_address=pull_address,
+           pub_address=pub_address,
+           worker_pull_address=worker_pull_address,
+           worker_push_address=worker_push_address,
+           db_address=db_address,
+           log_level=LOG_LEVEL).start()
+
+
+def run_hub(name, db_address, sub_address, pub_address,
+            worker_pull_address, worker_push_address, previous):
+    Hub(name=name,
+        sub_address=sub_address,
+        pub_address=pub_address,
+        worker_pull_address=worker_pull_address,
+        worker_push_address=worker_push_address,
+        db_address=db_address,
+        previous=previous,
+        pipelined=False,
+        log_level=LOG_LEVEL).start()
+
+
+def run_worker(name, db_address, mux=False):
+    worker = EchoMuxWorker if mux else EchoWorker
+    worker(name, db_address, log_level=LOG_LEVEL).start()
+
+
+def run_gateway(port, db_address, worker_pull_address, worker_push_address):
+    # The gateway parts warn that their names are fixed.
+    server = ServerTemplate(logging_level=logging.ERROR)
+    server.register_inbound(GatewayRouter,
+                            'gateway_router',
+                            'inproc://gateway_router',
+                            route='WorkerPush')
+    server.register_outbound(GatewayDealer,
+                             'gateway_dealer',
+                             listen_address='inproc://gateway_router')
+    server.register_bypass(HttpGateway,
+                           name='HttpGateway',
+                           listen_address='inproc://gateway_router',
+                           hostname='127.0.0.1',
+                           port=port)
+    server.register_inbound(WorkerPullService, 'WorkerPull',
+                            worker_pull_address, route='gateway_dealer')
+    server.register_outbound(WorkerPushService, 'WorkerPush',
+                             worker_push_address)
+    server.register_bypass(CacheService, 'Cache', db_address)
+    server.preset_cache(name='gateway',
+                        db_address=db_address,
+                        worker_pull_address=worker_pull_address,
+                        worker_push_address=worker_push_address)
+    # Each request would be logged otherwise
+    server.bypass_components['HttpGateway'].server.RequestHandlerClass = \
+        QuietHandler
+    server.start()
+
+
+def run_cache(name, db_address):
+    cache = DictDB()
+    cache.set('name', name.encode('utf-8'))
+    logger = logging.getLogger('pylm.bench')
+    logger.setLevel(LOG_LEVEL)
+    CacheService('Cache', db_address, logger=logger, cache=cache).start()
+
+
+def _client(name, db_address, **kwargs):
+    return Client(name, db_address, logging_level=LOG_LEVEL,
+                  probe_timeout=5000, **kwargs)
+
+
+def server(address, launch, options):
+    """
+    A standalone server.
+    """
+    db = address('db')
+    launch(run_server, 'bench', db, address('pull'), address('pub'), False)
+
+    def connect(index):
+        client = _client('bench', db)
+        return client, lambda payload: client.eval('bench.echo', payload)
+
+    return connect
+
+
+def master(address, launch, options, mux=False):
+    """
+    A master with ``workers`` workers.
+    """
+    db = address('db')
+    launch(run_master, 'bench', db, address('pull'), address('pub'),
+           address('worker_pull'), address('worker_push'))
+    for i in range(options['workers']):
+        launch(run_worker, 'worker{}'.format(i), db, mux)
+
+    def connect(index):
+        client = _client('bench', db)
+        if mux:
+            return client, lambda payload: client.eval(
+                'bench.echo', payload, messages=2)[0]
+        return client, lambda payload: client.eval('bench.echo', payload)
+
+    return connect
+
+
+def mux(address, launch, options):
+    """
+    A master with ``workers`` multiplexing workers that send back two
+    results for each message.
+    """
+    return master(address, launch, options, mux=True)
+
+
+def hub(address, launch, options):
+    """
+    A standalone server that pipes the messages to a hub with ``workers``
+    workers.
+    """
+    db = address('db')
+    pub = address('pub')
+    hub_db = address('hub_db')
+    hub_pub = address('hub_pub')
+    launch(run_server, 'bench', db, address('pull'), pub, True)
+    launch(run_hub, 'hub', hub_db, pub, hub_pub, address('worker_pull'),
+           address('worker_push'), 'bench')
+    for i in range(options['workers']):
+        launch(run_worker, 'worker{}'.format(i), hub_db)
+
+    def connect(index):
+        client = _client('bench', db, sub_address=hub_pub)
+        return client, lambda payload: client.eval(
+            ['bench.echo', 'hub.echo'], payload)
+
+    return connect
+
+
+def pipeline(address, launch, options):
+    """
+    A standalone server followed by a chain of ``stages`` pipelines.
+    """
+    db = address('db')
+    pub = address('pub')
+    launch(run_server, 'bench', db, address('pull'), pub, True)
+
+    functions = ['bench.echo']
+    previous = 'bench'
+    for i in range(options['stages']):
+        name = 'stage{}'.format(i)
+        stage_pub = address(name + '_pub')
+        launch(run_pipeline, name, address(name + '_db'), pub, stage_pub,
+               previous, i == options['stages'] - 1)
+        functions.append(name + '.echo')
+        previous = name
+        pub = stage_pub
+
+    def connect(index):
+        client = _client('bench', db, sub_address=pub)
+        return client, lambda payload: client.eval(functions, payload)
+
+    return connect
+
+
+def sink(address, launch, options):
+    """
+    Two standalone servers whose results gather in a sink. The clients
+    alternate between the servers.
+    """
+    names = ['bench0', 'bench1']
+    dbs = [address(name + '_db') for name in names]
+    pubs = [address(name + '_pub') for name in names]
+    sink_pub = address('sink_pub')
+    for name, db, pub in zip(names, dbs, pubs):
+        launch(run_server, name, db, address(name + '_pull'), pub, True)
+    launch(run_sink, 'sink', address('sink_db'), pubs, sink_pub, names)
+
+    def connect(index):
+        name = names[index % 2]
+        client = _client(name, dbs[index % 2], sub_address=sink_pub)
+        return client, lambda payload: client.eval(
+            [name + '.echo', 'sink.echo'], payload)
+
+    return connect
+
+
+def gateway(address, launch, options):
+    """
+    A HTTP gateway with ``workers`` workers. The clients make HTTP requests
+    on the loopback interface, whatever the transport of the workers.
+    """
+    db = address('db')
+    port = free_port()
+    launch(run_gateway, port, db, address('worker_pull'),
+           address('worker_push'))
+    for i in range(options['workers']):
+        launch(run_worker, 'worker{}'.format(i), db)
+
+    def connect(index):
+        def call(payload):
+            connection = http.client.HTTPConnection('127.0.0.1', port)
+            try:
+                connection.request('POST', '/echo', body=bytes(payload))
+                return connection.getresponse().read()
+            finally:
+                connection.close()
+
+        return None, call
+
+    return connect
+
+
+def cache(address, launch, options):
+    """
+    The cache service alone. Each call gets a value of the size of the
+    payload that the client set before.
+    """
+    db = address('db')
+    launch(run_cache, 'bench', db)
+
+    def connect(index):
+        # The client does not need the pull and pub sockets of a server.
+        client = Client('bench', db,
+                        push_address=address('unused_pull'),
+                        sub_address=address('unused_pub'),
+                        logging_level=logging.ERROR,
+                        this_config=True,
+                        probe_timeout=0)
+        key = 'bench{}'.format(index)
+        loaded = []
+
+        def call(payload):
+            if not loaded:
+                client.set(bytes(payload), key)
+                loaded.append(key)
+            return client.get(key)
+
+        return client, call
+
+    return connect
+
+
+TOPOLOGIES = {
+    'server': server,
+    'master': master,
+    'hub': hub,
+    'pipeline': pipeline,
+    'sink': sink,
+    'mux': mux,
+    'gateway': gateway,
+    'cache': cache,
+}
@@ -14,12 +14,20 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from pylm.parts.core import zmq_context
+from pylm.parts.core import zmq_context, async_context, PROBE_TOPIC, \
+    pack, unpack, unpack_frames, recv_frames, configure_socket
+from pylm.parts.compression import check_codec, compress, decompress, \
+    encode, decode
+from pylm.parts.tracing import sample, record
+from pylm.parts.logs import console
+from google.protobuf.message import DecodeError
 from pylm.parts.messages_pb2 import PalmMessage
-from threading import Thread
+from concurrent.futures import Future
+from threading import Thread, Event, Lock
 from uuid import uuid4
 import logging
-import time
+import asyncio
+import json
 import zmq
 import sys
 
@@ -35,6 +43,35 @@ class Client(object):
     :param session: Name of the pipeline if the session has to be reused
     :param logging_level: Specify the logging level.
     :param this_config: Do not fetch configuration from the server
+    :param probe_timeout: Milliseconds to wait for the server to confirm
+        that the client is subscribed to its results.
+    :param split: Send each payload in a frame of its own, so the servers
+        don't have to copy it, if the server supports it. Defaults to False.
+    :param zero_copy: Size in bytes from which the payloads are neither
+        copied when they are sent nor when the results are received. Needs
+        ``split``. Defaults to 0, all the payloads are copied.
+    :param codec: Codec to compress the payloads, like 'zlib' or 'lzma'.
+        Defaults to no compression. Compressed results are always
+        decompressed.
+    :param compress_threshold: Minimum size in bytes of the payloads that
+        are compressed. Defaults to 1024.
+    :param hwm: Messages that the sockets of the client queue. When the
+        server does not keep up, the calls wait instead of queueing more
+        messages. Defaults to None, the ZMQ default of 1000 messages.
+    :param trace_rate: Fraction of the messages that are traced, from 0 to
+        1. Defaults to 0, no tracing.
+    :param trace_address: Address of the trace collector of the server,
+        that gets the traced messages once their results arrive. If left
+        blank, fetches it from the master when ``trace_rate`` is set.
+
+    The client keeps the same pair of sockets to the server for all the
+    calls, and it can be used as a context manager that closes them. Calls
+    from the same client must not overlap.
+
+    With ``zero_copy``, large payloads may be any object that supports the
+    buffer protocol, like a bytearray or a numpy array. Each call waits until
+    ZMQ is done with the buffer, so it can be modified once the call
+    returns. The large results are memoryviews instead of bytes.
     """
     def __init__(self, server_name: str,
                  db_address: str,
@@ -42,9 +79,22 @@ class Client(object):
                  sub_address: str=None,
                  session: str=None,
                  logging_level: int=logging.INFO,
-                 this_config=False):
+                 this_config=False,
+                 probe_timeout: int=500,
+                 split: bool=False,
+                 zero_copy: int=0,
+                 codec: str='',
+                 compress_threshold: int=1024,
+                 hwm: int=None,
+                 trace_rate: float=0,
+                 trace_address: str=None):
         self.server_name = server_name
         self.db_address = db_address
+        self.codec = check_codec(codec)
+        self.compress_threshold = compress_threshold
+        self.hwm = hwm
+        self.trace_rate = trace_rate
+        self.trace_address = trace_address
 
         if session:
             self.pipeline = session
@@ -63,11 +113,9 @@ class Client(object):
         self.push_address = push_address
 
         # Basic console logging
-        self.logger = logging.getLogger(name=self.uuid)
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-        self.logger.addHandler(handler)
-        self.logger.setLevel(logging_level)
+        self.logger = console(
+            name=self.uuid, level=logging_level,
+            format='%(asctime)s - %(levelname)s - %(message)s')
 
         if this_config:
             self.logger.warning('Not fetching config from the server')
@@ -75,8 +123,130 @@ class Client(object):
             self.logger.info('Fetching configuration from the server')
             self._get_config_from_master()
 
-        # PUB-SUB takes a while
-        time.sleep(0.5)
+        self.push_socket = zmq_context.socket(zmq.PUSH)
+        configure_socket(self.push_socket, hwm)
+        self.push_socket.connect(self.push_address)
+
+        self.sub_socket = zmq_context.socket(zmq.SUB)
+        configure_socket(self.sub_socket, hwm)
+        self.sub_socket.setsockopt_string(zmq.SUBSCRIBE, self.uuid)
+        self.sub_socket.connect(self.sub_address)
+
+        # The traces are sent from the thread of the futures too
+        self.trace_socket = None
+        self.trace_lock = Lock()
+        if self.trace_rate and self.trace_address:
+            self.trace_socket = zmq_context.socket(zmq.PUSH)
+            self.trace_socket.connect(self.trace_address)
+
+        self.probe_timeout = probe_timeout
+        features = self._probe(self.sub_socket, self.uuid)
+        self.split = split and b'split' in features.split()
+        self.zero_copy = zero_copy
+
+        # Sockets and thread for the requests that return futures. They use
+        # their own ID, so their results don't get mixed with the rest.
+        self.futures_uuid = str(uuid4())
+        self.futures = {}
+        self.futures_push = None
+        self.futures_sub = None
+        self.receiver = None
+        self.receiver_stop = Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.clean()
+
+    def _probe(self, socket, topic):
+        """
+        PUB-SUB takes a while. Waits until the server answers a probe, that
+        is sent after the subscription to the results of the client.
+
+        :param socket: SUB socket
+        :param topic: Topic the socket is subscribed to
+        :return: The features the server supports
+        """
+        probe = PROBE_TOPIC + topic.encode('utf-8')
+        socket.setsockopt(zmq.SUBSCRIBE, probe)
+        features = b''
+
+        if socket.poll(self.probe_timeout):
+            [topic, features] = socket.recv_multipart()
+        else:
+            self.logger.warning(
+                'CLIENT {}: The server did not answer the probe'.format(
+                    self.uuid))
+
+        socket.setsockopt(zmq.UNSUBSCRIBE, probe)
+        return features
+
+    def _send(self, socket, message, payload):
+        """
+        Sends a message with the given payload. If the payload is large
+        enough, it is not copied, and the call waits until ZMQ is done with
+        it.
+
+        :param socket: PUSH socket
+        :param message: PalmMessage without the payload
+        :param payload: The payload
+        """
+        if self.trace_rate and not message.chunk:
+            sample(message, self.trace_rate)
+
+        if self.codec and len(payload) >= self.compress_threshold:
+            payload = encode(payload, self.codec)
+            message.codec = self.codec
+
+        if self.split and self.zero_copy and len(payload) >= self.zero_copy:
+            tracker = socket.send_multipart(pack(message, payload),
+                                            copy=False, track=True)
+            tracker.wait()
+        else:
+            message.payload = bytes(payload)
+            socket.send_multipart(pack(message))
+
+    def _recv(self, socket):
+        """
+        Receives a result. Large payloads are not copied. The payload is
+        still compressed if the codec of the message is set.
+
+        :param socket: SUB socket
+        :return: Topic, PalmMessage and payload. The payload is a memoryview
+            if it was not copied.
+        """
+        frames = recv_frames(socket, self.zero_copy)
+        message, payload = next(unpack_frames(frames[1:]))
+        if message.trace:
+            self._send_trace(message)
+
+        if payload is None:
+            return frames[0], message, message.payload
+        else:
+            return frames[0], message, payload.buffer
+
+    def _send_trace(self, message):
+        """
+        Records that the result of a traced message arrived, and sends the
+        trace, without the payload, to the collector.
+
+        :param message: PalmMessage with a trace id
+        """
+        record(message, 'client', 'received')
+        if not self.trace_socket:
+            return
+
+        trace = PalmMessage()
+        trace.pipeline = message.pipeline
+        trace.function = message.function
+        trace.trace = message.trace
+        trace.trace_parts.extend(message.trace_parts)
+        trace.trace_events.extend(message.trace_events)
+        trace.trace_times.extend(message.trace_times)
+
+        with self.trace_lock:
+            self.trace_socket.send(trace.SerializeToString())
 
     def _get_config_from_master(self):
         name = self.get('name').decode('utf-8')
@@ -99,12 +269,135 @@ class Client(object):
                     self.push_address)
                 )
 
+        if self.trace_rate and not self.trace_address:
+            self.trace_address = self.get('trace_address').decode('utf-8')
+            self.logger.info(
+                'CLIENT {}: Got trace address: {}'.format(
+                    self.uuid,
+                    self.trace_address)
+                )
+
         return {'sub_address': self.sub_address,
-                'push_address': self.push_address}
+                'push_address': self.push_address,
+                'trace_address': self.trace_address}
 
     def clean(self):
+        """
+        Close the sockets of the client. The futures that are still pending
+        are cancelled.
+        """
+        if self.receiver:
+            self.receiver_stop.set()
+            self.receiver.join()
+            self.futures_push.close()
+            self.futures_sub.close()
+
+            for future in self.futures.values():
+                future.cancel()
+
+        self.push_socket.close()
+        self.sub_socket.close()
         self.db.close()
 
+        if self.trace_socket:
+            self.trace_socket.close()
+
+    def _start_receiver(self):
+        if self.receiver:
+            return
+
+        self.futures_push = zmq_context.socket(zmq.PUSH)
+        configure_socket(self.futures_push, self.hwm)
+        self.futures_push.connect(self.push_address)
+
+        self.futures_sub = zmq_context.socket(zmq.SUB)
+        configure_socket(self.futures_sub, self.hwm)
+        self.futures_sub.setsockopt_string(zmq.SUBSCRIBE, self.futures_uuid)
+        self.futures_sub.connect(self.sub_address)
+        self._probe(self.futures_sub, self.futures_uuid)
+
+        self.receiver = Thread(target=self._receive, daemon=True)
+        self.receiver.start()
+
+    def _receive(self):
+        """
+        Gets the results of the requests that return futures, and sets the
+        result of each future.
+        """
+        while not self.receiver_stop.is_set():
+            if not self.futures_sub.poll(100):
+                continue
+
+            try:
+                topic, message, payload = self._recv(self.futures_sub)
+            except DecodeError:
+                self.logger.error(
+                    'CLIENT {}: Got a message that could not be '
+                    'decoded'.format(self.uuid))
+                continue
+
+            future = self.futures.pop(message.id, None)
+
+            if future:
+                # Unless the future was cancelled
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(decode(payload, message.codec))
+                    except DecodeError as error:
+                        future.set_exception(error)
+            else:
+                self.logger.warning(
+                    'CLIENT {}: Got a result for an unknown request'.format(
+                        self.uuid))
+
+    def submit(self, function, payload: bytes, cache: str=''):
+        """
+        Send a single request without waiting for the result.
+
+        :param function: Sting or list of strings following the format
+            ``server.function``.
+        :param payload: Binary message to be sent
+        :param cache: Cache data included in the message
+        :return: A :class:`concurrent.futures.Future` with the result. If the
+            server sends back more than one message, only the first one is
+            the result.
+        """
+        self._start_receiver()
+
+        if type(function) == list:
+            # Pipelined job.
+            function = ' '.join(function)
+
+        message = PalmMessage()
+        message.function = function
+        message.stage = 0
+        message.pipeline = self.pipeline
+        message.client = self.futures_uuid
+        message.id = str(uuid4())
+        message.split = self.split
+        if cache:
+            message.cache = cache
+
+        future = Future()
+        self.futures[message.id] = future
+        self._send(self.futures_push, message, payload)
+
+        return future
+
+    def eval_many(self, function, payloads, cache: str=''):
+        """
+        Send many requests without waiting for the results. The requests
+        are independent, and the results may arrive in any order.
+
+        :param function: Sting or list of strings following the format
+            ``server.function``.
+        :param payloads: Iterable with the binary messages to be sent
+        :param cache: Cache data included in the messages
+        :return: A list of :class:`concurrent.futures.Future`, one for each
+            message.
+        """
+        return [self.submit(function, payload, cache) for payload in payloads]
+
     def _sender(self, socket, function, generator, cache):
         for payload in generator:
             message = PalmMessage()
@@ -112,11 +405,11 @@ class Client(object):
             message.stage = 0
             message.pipeline = self.pipeline
             message.client = self.uuid
-            message.payload = payload
+            message.split = self.split
             if cache:
                 message.cache = cache
 
-            socket.send(message.SerializeToString())
+            self._send(socket, message, payload)
         
     def job(self, function, generator, messages: int=sys.maxsize, cache: str=''):
         """
@@ -130,13 +423,6 @@ class Client(object):
         :param cache: Cache data included in the message
         :return: an iterator with the messages that are sent back to the client.
         """
-        push_socket = zmq_context.socket(zmq.PUSH)
-        push_socket.connect(self.push_address)
-
-        sub_socket = zmq_context.socket(zmq.SUB)
-        sub_socket.setsockopt_string(zmq.SUBSCRIBE, self.uuid)
-        sub_socket.connect(self.sub_address)
-
         if type(function) == str:
             # Single-stage job
             pass
@@ -146,19 +432,21 @@ class Client(object):
 
         # Remember that sockets are not thread safe
         sender_thread = Thread(target=self._sender,
-                               args=(push_socket, function, generator, cache))
+                               args=(self.push_socket, function, generator, cache))
 
         # Sender runs in background.
         sender_thread.start()
 
-        for i in range(messages):
-            [client, message_data] = sub_socket.recv_multipart()
-            if not client.decode('utf-8') == self.uuid:
-                raise ValueError('The client got a message that does not belong')
+        try:
+            for i in range(messages):
+                topic, message, payload = self._recv(self.sub_socket)
+                if not topic.decode('utf-8') == self.uuid:
+                    raise ValueError('The client got a message that does not belong')
 
-            message = PalmMessage()
-            message.ParseFromString(message_data)
-            yield message.payload
+                yield decode(payload, message.codec)
+        finally:
+            # The socket is used by the next call
+            sender_thread.join()
 
     def eval(self, function, payload: bytes, messages: int=1, cache: str=''):
         """
@@ -172,13 +460,6 @@ class Client(object):
         :param cache: Cache data included in the message
         :return: If messages=1, the result data. If messages > 1, a list with the results
         """
-        push_socket = zmq_context.socket(zmq.PUSH)
-        push_socket.connect(self.push_address)
-
-        sub_socket = zmq_context.socket(zmq.SUB)
-        sub_socket.setsockopt_string(zmq.SUBSCRIBE, self.uuid)
-        sub_socket.connect(self.sub_address)
-
         if type(function) == str:
             # Single-stage job
             pass
@@ -191,18 +472,94 @@ class Client(object):
         message.stage = 0
         message.pipeline = self.pipeline
         message.client = self.uuid
-        message.payload = payload
+        message.split = self.split
         if cache:
             message.cache = cache
 
-        push_socket.send(message.SerializeToString())
+        self._send(self.push_socket, message, payload)
+
+        result = []
+
+        for i in range(messages):
+            topic, message, payload = self._recv(self.sub_socket)
+            result.append(decode(payload, message.codec))
+
+        if messages == 1:
+            return result[0]
+
+        else:
+            return result
+
+    @staticmethod
+    def _chunks(source, chunk_size):
+        """
+        Splits the source of a stream into chunks.
+
+        :return: Generator of tuples with each chunk and True if it is the
+            last one.
+        """
+        if hasattr(source, 'read'):
+            chunks = iter(lambda: source.read(chunk_size), b'')
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            view = memoryview(source)
+            chunks = (view[i:i + chunk_size]
+                      for i in range(0, len(view), chunk_size))
+        else:
+            chunks = iter(source)
+
+        # One chunk ahead, to know which one is the last. An empty source
+        # is a stream with a single empty chunk.
+        previous = next(chunks, b'')
+        for chunk in chunks:
+            yield previous, False
+            previous = chunk
+
+        yield previous, True
+
+    def stream(self, function, source, chunk_size: int=1048576,
+               messages: int=1, cache: str=''):
+        """
+        Send a large payload in chunks, so it doesn't have to fit in memory
+        at once. The master must have a stream address, and its workers
+        must get streams. The user function gets an iterator with the chunks.
+
+        :param function: Sting or list of strings following the format
+            ``server.function``.
+        :param source: The payload. Bytes or a buffer, a file-like object
+            open in binary mode, or an iterable that yields the chunks.
+        :param chunk_size: Size of the chunks in bytes, if the source is not
+            an iterable. Defaults to 1 MB.
+        :param messages: Number of messages expected to be sent back to the
+            client
+        :param cache: Cache data included in the messages
+        :return: If messages=1, the result data. If messages > 1, a list with the results
+        """
+        if type(function) == list:
+            # Pipelined job.
+            function = ' '.join(function)
+
+        stream = str(uuid4())
+        for number, (chunk, last) in enumerate(
+                self._chunks(source, chunk_size), 1):
+            message = PalmMessage()
+            message.function = function
+            message.stage = 0
+            message.pipeline = self.pipeline
+            message.client = self.uuid
+            message.id = stream
+            message.chunk = number
+            message.last = last
+            message.split = self.split
+            if cache:
+                message.cache = cache
+
+            self._send(self.push_socket, message, chunk)
 
         result = []
 
         for i in range(messages):
-            [client, message_data] = sub_socket.recv_multipart()
-            message.ParseFromString(message_data)
-            result.append(message.payload)
+            topic, message, payload = self._recv(self.sub_socket)
+            result.append(decode(payload, message.codec))
 
         if messages == 1:
             return result[0]
@@ -274,3 +631,381 @@ class Client(object):
         self.db.send(message.SerializeToString())
         return self.db.recv().decode('utf-8')
 
+    def stats(self):
+        """
+        Metrics of the parts that run in the process of the cache of the
+        server.
+
+        :return: Dictionary by part name with its counters and latencies
+        """
+        message = PalmMessage()
+        message.pipeline = str(uuid4())
+        message.client = self.uuid
+        message.stage = 0
+        message.function = '.'.join([self.server_name, 'stats'])
+        self.db.send(message.SerializeToString())
+        return json.loads(self.db.recv().decode('utf-8'))
+
+
+
+class AsyncClient(object):
+    """
+    Client to connect to parallel servers, built on asyncio. Many calls can
+    run at the same time over the same pair of sockets, and the results are
+    sent back to each call.
+
+    :param server_name: Server you are connecting to
+    :param db_address: Address for the cache service, for first connection or configuration.
+    :param push_address: Address of the push service of the server to pull from
+    :param sub_address: Address of the pub service of the server to subscribe to
+    :param session: Name of the pipeline if the session has to be reused
+    :param logging_level: Specify the logging level.
+    :param this_config: Do not fetch configuration from the server
+    :param probe_timeout: Milliseconds to wait for the server to confirm
+        that the client is subscribed to its results.
+    :param split: Send each payload in a frame of its own, so the servers
+        don't have to copy it, if the server supports it. Defaults to False.
+    :param codec: Codec to compress the payloads, like 'zlib' or 'lzma'.
+        Defaults to no compression. Compressed results are always
+        decompressed.
+    :param compress_threshold: Minimum size in bytes of the payloads that
+        are compressed. Defaults to 1024.
+    :param hwm: Messages that the sockets of the client queue. When the
+        server does not keep up, the calls wait instead of queueing more
+        messages. Defaults to None, the ZMQ default of 1000 messages.
+
+    Each request gets its own id, that the client uses to tell which call a
+    result belongs to. The sockets are connected on the first call.
+    """
+    def __init__(self, server_name: str,
+                 db_address: str,
+                 push_address: str=None,
+                 sub_address: str=None,
+                 session: str=None,
+                 logging_level: int=logging.INFO,
+                 this_config=False,
+                 probe_timeout: int=500,
+                 split: bool=False,
+                 codec: str='',
+                 compress_threshold: int=1024,
+                 hwm: int=None):
+        self.server_name = server_name
+        self.db_address = db_address
+        self.codec = check_codec(codec)
+        self.compress_threshold = compress_threshold
+        self.hwm = hwm
+        if session:
+            self.pipeline = session
+            self.session_set = True
+        else:
+            self.pipeline = str(uuid4())
+            self.session_set = False
+
+        self.probe_timeout = probe_timeout
+        self.split = split
+        self.uuid = str(uuid4())
+
+        self.sub_address = sub_address
+        self.push_address = push_address
+        self.this_config = this_config
+
+        # Basic console logging
+        self.logger = console(
+            name=self.uuid, level=logging_level,
+            format='%(asctime)s - %(levelname)s - %(message)s')
+
+        self.context = None
+        self.db = None
+        self.db_lock = None
+        self.push_socket = None
+        self.sub_socket = None
+        self.connect_lock = None
+        self.receiver = None
+
+        # Queue with the results of each call, by request id
+        self.calls = {}
+
+    async def _get_config_from_master(self):
+        name = (await self.get('name')).decode('utf-8')
+        if not name == self.server_name:
+            raise ValueError('You are connecting to the wrong server')
+
+        if not self.sub_address:
+            self.sub_address = (await self.get('pub_address')).decode('utf-8')
+            self.logger.info(
+                'CLIENT {}: Got subscription address: {}'.format(
+                    self.uuid,
+                    self.sub_address)
+                )
+
+        if not self.push_address:
+            self.push_address = (await self.get('pull_address')).decode('utf-8')
+            self.logger.info(
+                'CLIENT {}: Got push address: {}'.format(
+                    self.uuid,
+                    self.push_address)
+                )
+
+        return {'sub_address': self.sub_address,
+                'push_address': self.push_address}
+
+    def _connect_db(self):
+        if not self.db:
+            self.context = async_context()
+            self.db = self.context.socket(zmq.REQ)
+            self.db.identity = self.uuid.encode('utf-8')
+            self.db.connect(self.db_address)
+            self.db_lock = asyncio.Lock()
+            self.connect_lock = asyncio.Lock()
+
+    async def _connect(self):
+        self._connect_db()
+
+        async with self.connect_lock:
+            if self.receiver:
+                return
+
+            if self.this_config:
+                self.logger.warning('Not fetching config from the server')
+            else:
+                self.logger.info('Fetching configuration from the server')
+                await self._get_config_from_master()
+
+            self.push_socket = self.context.socket(zmq.PUSH)
+            configure_socket(self.push_socket, self.hwm)
+            self.push_socket.connect(self.push_address)
+
+            self.sub_socket = self.context.socket(zmq.SUB)
+            configure_socket(self.sub_socket, self.hwm)
+            self.sub_socket.setsockopt_string(zmq.SUBSCRIBE, self.uuid)
+            self.sub_socket.connect(self.sub_address)
+
+            await self._probe()
+
+            self.receiver = asyncio.ensure_future(self._receive())
+
+    async def _probe(self):
+        """
+        PUB-SUB takes a while. Waits until the server answers a probe, that
+        is sent after the subscription to the results of the client.
+        """
+        probe = PROBE_TOPIC + self.uuid.encode('utf-8')
+        self.sub_socket.setsockopt(zmq.SUBSCRIBE, probe)
+        features = b''
+
+        if await self.sub_socket.poll(self.probe_timeout):
+            [topic, features] = await self.sub_socket.recv_multipart()
+        else:
+            self.logger.warning(
+                'CLIENT {}: The server did not answer the probe'.format(
+                    self.uuid))
+
+        self.sub_socket.setsockopt(zmq.UNSUBSCRIBE, probe)
+        self.split = self.split and b'split' in features.split()
+
+    async def _receive(self):
+        """
+        Gets all the messages sent to the client, and puts each one in the
+        queue of its call.
+        """
+        while True:
+            # The first frame is the topic
+            frames = await self.sub_socket.recv_multipart()
+            try:
+                message = next(unpack(frames[1:]))
+            except DecodeError:
+                self.logger.error(
+                    'CLIENT {}: Got a message that could not be '
+                    'decoded'.format(self.uuid))
+                continue
+
+            if message.id in self.calls:
+                # Errors are raised by the call that gets them
+                try:
+                    result = decompress(message).payload
+                except DecodeError as error:
+                    result = error
+                self.calls[message.id].put_nowait(result)
+            else:
+                self.logger.warning(
+                    'CLIENT {}: Got a message from a finished call'.format(
+                        self.uuid))
+
+    def _message(self, function, call, payload, cache):
+        if type(function) == list:
+            # Pipelined job.
+            function = ' '.join(function)
+
+        message = PalmMessage()
+        message.function = function
+        message.stage = 0
+        message.pipeline = self.pipeline
+        message.client = self.uuid
+        message.id = call
+        message.split = self.split
+        message.payload = payload
+        compress(message, self.codec, self.compress_threshold)
+        if cache:
+            message.cache = cache
+
+        return pack(message)
+
+    async def _result(self, results):
+        result = await results.get()
+        if isinstance(result, DecodeError):
+            raise result
+
+        return result
+
+    async def _sender(self, function, call, generator, cache):
+        if hasattr(generator, '__aiter__'):
+            async for payload in generator:
+                await self.push_socket.send_multipart(
+                    self._message(function, call, payload, cache))
+        else:
+            for payload in generator:
+                await self.push_socket.send_multipart(
+                    self._message(function, call, payload, cache))
+
+    async def job(self, function, generator, messages: int=sys.maxsize, cache: str=''):
+        """
+        Submit a job with multiple messages to a server. To be used with
+        ``async for``.
+
+        :param function: Sting or list of strings following the format
+            ``server.function``.
+        :param generator: An iterable or asynchronous iterable that yields a
+            series of binary messages.
+        :param messages: Number of messages expected to be sent back to the
+            client. Defaults to infinity (sys.maxsize)
+        :param cache: Cache data included in the message
+        :return: an asynchronous iterator with the messages that are sent
+            back to the client.
+        """
+        await self._connect()
+
+        call = str(uuid4())
+        results = asyncio.Queue()
+        self.calls[call] = results
+
+        # Sender runs in background.
+        sender = asyncio.ensure_future(
+            self._sender(function, call, generator, cache))
+
+        try:
+            for i in range(messages):
+                yield await self._result(results)
+
+            await sender
+        finally:
+            sender.cancel()
+            del self.calls[call]
+
+    async def eval(self, function, payload: bytes, messages: int=1, cache: str=''):
+        """
+        Execute single job.
+
+        :param function: Sting or list of strings following the format
+            ``server.function``.
+        :param payload: Binary message to be sent
+        :param messages: Number of messages expected to be sent back to the
+            client
+        :param cache: Cache data included in the message
+        :return: If messages=1, the result data. If messages > 1, a list with the results
+        """
+        await self._connect()
+
+        call = str(uuid4())
+        results = asyncio.Queue()
+        self.calls[call] = results
+
+        try:
+            await self.push_socket.send_multipart(
+                self._message(function, call, payload, cache))
+            result = [await self._result(results) for i in range(messages)]
+        finally:
+            del self.calls[call]
+
+        if messages == 1:
+            return result[0]
+
+        else:
+            return result
+
+    def clean(self):
+        if self.receiver:
+            self.receiver.cancel()
+            self.push_socket.close()
+            self.sub_socket.close()
+
+        if self.db:
+            self.db.close()
+
+    async def _cache_request(self, function, payload, key=None):
+        self._connect_db()
+
+        message = PalmMessage()
+        message.pipeline = str(uuid4())
+        message.client = self.uuid
+        message.stage = 0
+        message.function = '.'.join([self.server_name, function])
+        message.payload = payload
+        if key:
+            message.cache = key
+
+        # The REQ socket only allows one request at a time.
+        async with self.db_lock:
+            await self.db.send(message.SerializeToString())
+            return await self.db.recv()
+
+    async def set(self, value: bytes, key=None):
+        """
+        Sets a key value pare in the remote database. If the key is not set,
+        the function returns a new key. Note that the order of the arguments
+        is reversed from the usual.
+
+        .. warning::
+
+            If the session attribute is specified, all the keys will be
+            prepended with the session id.
+
+        :param value: Value to be stored
+        :param key: Key for the k-v storage
+        :return: New key or the same key
+        """
+        if not type(value) == bytes:
+            raise TypeError('First argument {} must be of type <bytes>'.format(value))
+
+        if key and self.session_set:
+            key = ''.join([self.pipeline, key])
+
+        return (await self._cache_request('set', value, key)).decode('utf-8')
+
+    async def get(self, key):
+        """
+        Gets a value from server's internal cache
+
+        :param key: Key for the data to be selected.
+        :return: Value
+        """
+        return await self._cache_request('get', key.encode('utf-8'))
+
+    async def delete(self, key):
+        """
+        Deletes data in the server's internal cache.
+
+        :param key: Key of the data to be deleted
+        :return:
+        """
+        return (await self._cache_request(
+            'delete', key.encode('utf-8'))).decode('utf-8')
+
+    async def stats(self):
+        """
+        Metrics of the parts that run in the process of the cache of the
+        server.
+
+        :return: Dictionary by part name with its counters and latencies
+        """
+        return json.loads((await self._cache_request('stats', b'')).decode(
+            'utf-8'))
@@ -0,0 +1,121 @@
+# Pylm, a framework to build components for high performance distributed
+# applications. Copyright (C) 2016 NFQ Solutions
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compression of the payloads. The codec is recorded in the message, so the
+# payload is only decompressed where it is consumed, and the parts that
+# route the message never touch it.
+from google.protobuf.message import DecodeError
+import zlib
+import lzma
+import bz2
+
+
+CODECS = {
+    'zlib': (zlib.compress, zlib.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+    'bz2': (bz2.compress, bz2.decompress),
+}
+
+
+def register_codec(name, compress, decompress):
+    """
+    Adds a codec. It must be registered in every process that sends or
+    receives payloads compressed with it.
+
+    :param name: Name of the codec, as it is recorded in the messages
+    :param compress: Function that gets bytes and returns compressed bytes
+    :param decompress: Function that reverts compress
+    """
+    CODECS[name] = (compress, decompress)
+
+
+def check_codec(codec):
+    """
+    Raises ValueError if the codec is not registered.
+
+    :param codec: Name of the codec. An empty string means no compression.
+    :return: The codec
+    """
+    if codec and codec not in CODECS:
+        raise ValueError('Unknown codec {}'.format(codec))
+
+    return codec
+
+
+def encode(payload, codec):
+    """
+    Compresses a payload.
+
+    :param payload: Bytes, or any object with the buffer protocol
+    :param codec: Name of the codec
+    :return: Compressed payload
+    """
+    return CODECS[codec][0](payload)
+
+
+def decode(payload, codec):
+    """
+    Decompresses a payload. DecodeError is raised if the codec is unknown
+    or the payload can't be decompressed.
+
+    :param payload: Compressed payload
+    :param codec: Name of the codec. If empty, the payload is returned as it is.
+    :return: Payload
+    """
+    if not codec:
+        return payload
+
+    if codec not in CODECS:
+        raise DecodeError('Unknown codec {}'.format(codec))
+
+    try:
+        return CODECS[codec][1](payload)
+    except Exception as error:
+        raise DecodeError('Payload could not be decompressed with {}: {}'.format(
+            codec, error))
+
+
+def compress(message, codec, threshold=1024):
+    """
+    Compresses the payload of a message if the codec is set and the payload
+    has at least ``threshold`` bytes. The codec is recorded in the message.
+
+    :param message: PalmMessage with an uncompressed payload
+    :param codec: Name of the codec. An empty string means no compression.
+    :param threshold: Minimum size of the payload in bytes.
+    :return: The same message
+    """
+    if codec and len(message.payload) >= threshold:
+        message.payload = encode(message.payload, codec)
+        message.codec = codec
+    else:
+        message.codec = ''
+
+    return message
+
+
+def decompress(message):
+    """
+    Decompresses the payload of a message, if it is compressed.
+
+    :param message: PalmMessage
+    :return: The same message
+    """
+    if message.codec:
+        message.payload = decode(message.payload, message.codec)
+        message.codec = ''
+
+    return message
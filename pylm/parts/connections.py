@@ -19,7 +19,8 @@ import sys
 import concurrent.futures
 import traceback
 from pylm.parts.core import Inbound, Outbound, \
-    BypassInbound, BypassOutbound, zmq_context
+    BypassInbound, BypassOutbound, zmq_context, unpack, unpack_frames, \
+    recv_frames
 from urllib.request import Request, urlopen
 from pylm.parts.messages_pb2 import PalmMessage
 
@@ -60,10 +61,19 @@ class SubConnection(Inbound):
     :param logger:
     :param cache:
     :param messages:
+    :param batch: Maximum number of messages sent to the broker in a single
+        round trip. Defaults to 1, no batching.
+    :param batch_timeout: Milliseconds that an incomplete batch waits for
+        more messages.
+    :param zero_copy: Size in bytes from which the payloads are forwarded
+        without copying them. Defaults to 0, all the payloads are copied.
+    :param hwm: Messages that the socket queues. Defaults to None, the ZMQ
+        default.
     """
     def __init__(self, name, listen_address, previous,
                  broker_address="inproc://broker", logger=None, cache=None,
-                 messages=sys.maxsize):
+                 messages=sys.maxsize, batch=1, batch_timeout=0, zero_copy=0,
+                 hwm=None):
 
         super(SubConnection, self).__init__(
             name,
@@ -73,7 +83,11 @@ class SubConnection(Inbound):
             broker_address=broker_address,
             logger=logger,
             cache=cache,
-            messages=messages
+            messages=messages,
+            batch=batch,
+            batch_timeout=batch_timeout,
+            zero_copy=zero_copy,
+            hwm=hwm
         )
         self.previous = previous
 
@@ -81,25 +95,23 @@ class SubConnection(Inbound):
         """
         Call this function to start the component
         """
-        message = PalmMessage()
         self.listen_to.setsockopt_string(zmq.SUBSCRIBE, self.previous)
         self.listen_to.connect(self.listen_address)
 
         self.logger.info('{} successfully started'.format(self.name))
         for i in range(self.messages):
-            self.logger.debug('{} blocked waiting messages'.format(self.name))
-            message_data = self.listen_to.recv_multipart()[1]
-            self.logger.debug('{} Got inbound message'.format(self.name))
+            self.logger.debug('%s blocked waiting messages', self.name)
+            # The first frame is the topic
+            frames = recv_frames(self.listen_to, self.zero_copy)[1:]
+            self.logger.debug('%s Got inbound message', self.name)
 
             try:
-                message.ParseFromString(message_data)
+                for message, payload in unpack_frames(frames):
+                    for scattered in self.scatter(message):
+                        scattered = self._translate_to_broker(scattered)
+                        self._send_to_broker(scattered, payload)
 
-                for scattered in self.scatter(message):
-                    scattered = self._translate_to_broker(scattered)
-                    self.broker.send(scattered.SerializeToString())
-                    self.logger.debug('{} blocked waiting for broker'.format(
-                        self.name))
-                    self.handle_feedback(self.broker.recv())
+                self._end_of_message()
 
                 if self.reply:
                     self.listen_to.send(self.reply_feedback())
@@ -112,6 +124,8 @@ class SubConnection(Inbound):
                 if self.reply:
                     self.listen_to.send(b'0')
 
+        self._flush_batch()
+
         return self.name
 
     def cleanup(self):
@@ -241,19 +255,25 @@ class HttpConnection(Outbound):
             return response.read()
 
         for i in range(self.messages):
-            self.logger.debug('{} blocked waiting for broker'.format(self.name))
-            message_data = self.broker.recv()
-            self.logger.debug('{} Got message from broker'.format(self.name))
-            message_data = self._translate_from_broker(message_data)
-            message.ParseFromString(message_data)
+            self.logger.debug('%s blocked waiting for broker', self.name)
+            frames = self.broker.recv_multipart()
+            self.logger.debug('%s Got message from broker', self.name)
+
+            scattered_messages = []
+            # The payload may come in a frame of its own
+            for message in unpack(frames):
+                message = self._translate_from_broker(message)
+                scattered_messages.extend(
+                    scattered.SerializeToString()
+                    for scattered in self.scatter(message))
 
             with concurrent.futures.ThreadPoolExecutor(
                 max_workers=self.max_workers) as executor:
                 future_to = [executor.submit(
                     load_url,
                     self.url,
-                    scattered.SerializeToString()
-                    ) for scattered in self.scatter(message)]
+                    scattered
+                    ) for scattered in scattered_messages]
                 for future in concurrent.futures.as_completed(future_to):
                     try:
                         feedback = future.result()
@@ -270,4 +290,4 @@ class HttpConnection(Outbound):
             if feedback:
                 self.broker.send(self.reply_feedback())
             else:
-                self.broker.send(message_data)
\ No newline at end of file
+                self.broker.send(message.SerializeToString())
\ No newline at end of file
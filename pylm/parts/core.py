@@ -15,14 +15,196 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from pylm.parts.messages_pb2 import PalmMessage
+from pylm.parts.metrics import registry, size
+from pylm.parts.tracing import record
+from collections import deque
 from uuid import uuid4
 import traceback
+import time
 import zmq
 import sys
 
 
 zmq_context = zmq.Context.instance()
 
+# Prefix of the subscriptions that ask the publisher for an empty message.
+# When a subscriber gets it, its other subscriptions are in place too.
+PROBE_TOPIC = b'\x00probe'
+
+
+# Features of the servers, that they send with the answer to a probe. The
+# clients only use them if the server they connect to supports them.
+FEATURES = b'split'
+
+
+def answer_probes(socket):
+    """
+    Read the subscriptions that a XPUB socket got, and publish the features
+    of the server to the ones that ask for a probe.
+
+    :param socket: XPUB socket
+    """
+    while socket.poll(0):
+        subscription = socket.recv()
+        if subscription[:1] == b'\x01' and \
+                subscription[1:].startswith(PROBE_TOPIC):
+            socket.send_multipart([subscription[1:], FEATURES])
+
+
+# Policies when the queue of an outbound socket is full. None keeps the
+# behaviour of the socket type: PUSH and ROUTER sockets block, and PUB
+# sockets drop the messages for the slow subscribers.
+POLICIES = (None, 'block', 'drop')
+
+
+def check_policy(policy):
+    """
+    Checks that a backpressure policy is supported.
+
+    :param policy: None, 'block' or 'drop'
+    :return: The same policy
+    """
+    if policy not in POLICIES:
+        raise ValueError('Policy {} not supported. Pick one of {}'.format(
+            policy, POLICIES))
+
+    return policy
+
+
+def configure_socket(socket, hwm=None, policy=None):
+    """
+    Sets the high water marks of a socket, the number of messages that it
+    queues for each peer. With a policy, a XPUB socket stops dropping the
+    messages for the slow subscribers silently, so they can be blocked or
+    counted. Call it before the socket binds or connects.
+
+    :param socket: ZMQ socket
+    :param hwm: High water mark. Defaults to None, the ZMQ default of 1000
+        messages. 0 means no limit.
+    :param policy: None, 'block' or 'drop'
+    """
+    if hwm is not None:
+        socket.setsockopt(zmq.SNDHWM, hwm)
+        socket.setsockopt(zmq.RCVHWM, hwm)
+
+    if policy and socket.type == zmq.XPUB:
+        socket.setsockopt(zmq.XPUB_NODROP, 1)
+
+
+def send_frames(socket, frames, policy=None):
+    """
+    Sends a multipart message. With the 'drop' policy, the message is
+    dropped if the queue of the peer is full, instead of waiting.
+
+    :param socket: ZMQ socket
+    :param frames: List of frames
+    :param policy: None, 'block' or 'drop'
+    :return: False if the message was dropped, True otherwise
+    """
+    if policy == 'drop':
+        try:
+            socket.send_multipart(frames, zmq.NOBLOCK)
+        except zmq.Again:
+            return False
+    else:
+        socket.send_multipart(frames)
+
+    return True
+
+
+def pack(message, payload=None):
+    """
+    Frames of a message. If the split field of the message is set, the
+    payload is not serialized and it travels in a frame of its own.
+
+    :param message: PalmMessage
+    :param payload: Frame with the payload, as it was received. It is sent
+        instead of the payload of the message if the message has none.
+    :return: List of frames
+    """
+    if payload is not None and not message.payload:
+        message.split = True
+        return [message.SerializeToString(), payload]
+    elif message.split:
+        payload = message.payload
+        message.payload = b''
+        header = message.SerializeToString()
+        message.payload = payload
+        return [header, payload]
+    else:
+        return [message.SerializeToString()]
+
+
+def unpack_frames(frames):
+    """
+    Messages in a list of frames, along with the frame of their payload. A
+    payload that was received without copying it, as a zmq.Frame, is not
+    copied into the message either. The message comes with an empty payload
+    and the frame, that can be sent as it is with :func:`pack`. Otherwise
+    the frame is None.
+
+    :param frames: List of frames
+    :return: Generator of tuples with a PalmMessage and a zmq.Frame or None
+    """
+    frames = iter(frames)
+    for frame in frames:
+        message = PalmMessage()
+        if isinstance(frame, zmq.Frame):
+            frame = frame.bytes
+        message.ParseFromString(frame)
+
+        payload = None
+        if message.split:
+            payload = next(frames)
+            if not isinstance(payload, zmq.Frame):
+                message.payload = payload
+                payload = None
+
+        yield message, payload
+
+
+def unpack(frames):
+    """
+    Messages in a list of frames, with the payload in a frame of its own or
+    not. The frames of a batch may hold many messages.
+
+    :param frames: List of frames
+    :return: Generator of PalmMessage
+    """
+    for message, payload in unpack_frames(frames):
+        if payload is not None:
+            message.payload = payload.bytes
+        yield message
+
+
+def recv_frames(socket, zero_copy=0):
+    """
+    Receives a multipart message. The frames of at least ``zero_copy`` bytes
+    are not copied, and they are returned as zmq.Frame objects. The first
+    frame, with the identity, the topic or the message, is always copied.
+
+    :param socket: ZMQ socket
+    :param zero_copy: Size in bytes from which the frames are not copied.
+        Defaults to 0, all the frames are copied.
+    :return: List of frames
+    """
+    if not zero_copy:
+        return socket.recv_multipart()
+
+    frames = socket.recv_multipart(copy=False)
+    return [frames[0].bytes] + [
+        frame if len(frame) >= zero_copy else frame.bytes
+        for frame in frames[1:]]
+
+
+def async_context():
+    """
+    Context for asyncio sockets. It shares the inproc transport with the
+    rest of the parts, since it is a shadow of the global context.
+    """
+    import zmq.asyncio
+    return zmq.asyncio.Context.shadow(zmq_context.underlying)
+
 
 class Router(object):
     """
@@ -36,13 +218,16 @@ class Router(object):
     :param cache: Global cache of the server
     :param messages: Maximum number of inbound messages. Defaults to infinity.
     :param messages: Number of messages allowed before the router starts buffering.
+    :param zero_copy: Size in bytes from which the frames are forwarded
+        without copying them. Defaults to 0, all the frames are copied.
     """
     def __init__(self,
                  inbound_address="inproc://inbound",
                  outbound_address="inproc://outbound",
                  logger=None,
                  cache=None,
-                 messages=sys.maxsize):
+                 messages=sys.maxsize,
+                 zero_copy=0):
         # Socket that will listen to the inbound parts
         self.inbound = zmq_context.socket(zmq.ROUTER)
         self.inbound.bind(inbound_address)
@@ -61,6 +246,8 @@ class Router(object):
 
         # Cache for the server
         self.cache = cache
+        self.zero_copy = zero_copy
+        self.metrics = registry.part('router')
 
     def register_inbound(self, name, route='', block=False, log=''):
         """
@@ -95,8 +282,7 @@ class Router(object):
             'log': log
         }
 
-    def start(self):
-        self.logger.info('Launch router')
+    def _log_routes(self):
         for part in self.inbound_components:
             route = self.inbound_components[part]['route'].decode('utf-8')
             if not route:
@@ -119,18 +305,30 @@ class Router(object):
                 )
             )
 
+    def start(self):
+        self.logger.info('Launch router')
+        self._log_routes()
+
         for i in range(self.messages):
-            component, empty, message_data = self.inbound.recv_multipart()
+            # Inbound parts in batch mode send more than one message frame.
+            frames = recv_frames(self.inbound, self.zero_copy)
+            component, empty, message_data = frames[0], frames[1], frames[2:]
+            self.metrics.inc('messages_in')
 
             # Routing from inbound to outbound
             route_to = self.inbound_components[component]['route']
             block = self.inbound_components[component]['block']
 
             if route_to:
-                self.logger.debug('Router: {} routing to {}'.format(component, route_to))
-                self.outbound.send_multipart([route_to, empty, message_data])
+                self.logger.debug('Router: %s routing to %s',
+                                  component, route_to)
+                started = time.monotonic()
+                self.outbound.send_multipart([route_to, empty] + message_data)
+                self.metrics.inc('messages_out')
 
                 from_outbound = self.outbound.recv_multipart()
+                # Time that the outbound part takes to take the message
+                self.metrics.observe('latency', time.monotonic() - started)
 
                 if len(from_outbound) == 3:
                     # From a REP socket
@@ -141,6 +339,7 @@ class Router(object):
                 else:
                     self.logger.error('Error in Router:')
                     self.logger.error('Message badly formatted from {}'.format(route_to))
+                    self.metrics.inc('errors')
                     # And now drop the message
                     continue
 
@@ -170,6 +369,159 @@ class Router(object):
         self.outbound.close()
 
 
+class AsyncRouter(Router):
+    """
+    Router that does not block waiting for the outbound parts. It polls both
+    ROUTER sockets and keeps up to ``window`` messages in flight for each
+    outbound part, so a slow outbound part only stalls the inbound parts
+    that route to it.
+
+    Outbound parts reply in the same order they receive, so the feedback
+    is matched with the pending messages of each route with a FIFO. Inbound
+    parts registered with ``block=False`` are released as soon as their
+    message is handed to the outbound part; blocking parts get the feedback
+    of the first outbound part, like in :class:`Router`.
+
+    :param inbound_address: Valid ZMQ bind address for inbound parts
+    :param outbound_address: Valid ZMQ bind address for outbound parts
+    :param logger: Logger instance
+    :param cache: Global cache of the server
+    :param messages: Maximum number of inbound messages. Defaults to infinity.
+    :param window: Maximum number of messages in flight for each outbound part.
+    :param zero_copy: Size in bytes from which the frames are forwarded
+        without copying them. Defaults to 0, all the frames are copied.
+    """
+    def __init__(self,
+                 inbound_address="inproc://inbound",
+                 outbound_address="inproc://outbound",
+                 logger=None,
+                 cache=None,
+                 messages=sys.maxsize,
+                 window=16,
+                 zero_copy=0):
+        super(AsyncRouter, self).__init__(
+            inbound_address=inbound_address,
+            outbound_address=outbound_address,
+            logger=logger,
+            cache=cache,
+            messages=messages,
+            zero_copy=zero_copy
+        )
+        if window < 1:
+            raise ValueError('The router window must be at least 1')
+
+        self.window = window
+
+        # Per route. Origin of the messages sent to each outbound part, in
+        # the order they were sent, and messages waiting for a free slot.
+        self.in_flight = {}
+        self.waiting = {}
+
+    def register_outbound(self, name, route='', log=''):
+        super(AsyncRouter, self).register_outbound(name, route=route, log=log)
+        self.in_flight[name.encode('utf-8')] = deque()
+        self.waiting[name.encode('utf-8')] = deque()
+
+    def _pending(self):
+        return any(self.in_flight.values()) or any(self.waiting.values())
+
+    def _forward(self, route_to, origin, message_data):
+        """
+        Send the message to the outbound part if it has free slots, or queue
+        it until one of its messages gets its feedback.
+
+        :param route_to: Name of the outbound part
+        :param origin: Tuple with the name of the inbound part, the envelope
+            delimiter and if it blocks. None for rerouted messages, whose
+            feedback is discarded.
+        :param message_data: List of message frames for the outbound part
+        """
+        if len(self.in_flight[route_to]) >= self.window:
+            self.waiting[route_to].append((origin, message_data))
+            return
+
+        self.outbound.send_multipart([route_to, b''] + message_data)
+        self.in_flight[route_to].append(origin)
+        self.metrics.inc('messages_out')
+
+        if origin:
+            component, empty, block = origin
+            if not block:
+                self.inbound.send_multipart([component, empty, b'1'])
+
+    def _handle_inbound(self):
+        frames = recv_frames(self.inbound, self.zero_copy)
+        component, empty, message_data = frames[0], frames[1], frames[2:]
+        self.metrics.inc('messages_in')
+
+        route_to = self.inbound_components[component]['route']
+        block = self.inbound_components[component]['block']
+
+        if route_to:
+            self.logger.debug('Router: %s routing to %s', component, route_to)
+            self._forward(route_to, (component, empty, block), message_data)
+        else:
+            self.inbound.send_multipart([component, empty, b'1'])
+
+    def _handle_outbound(self):
+        from_outbound = self.outbound.recv_multipart()
+        route_to = from_outbound[0]
+
+        if len(from_outbound) == 3:
+            # From a REP socket
+            feedback = from_outbound[2]
+        elif len(from_outbound) == 2:
+            # From a DEALER socket
+            feedback = from_outbound[1]
+        else:
+            self.logger.error('Error in Router:')
+            self.logger.error('Message badly formatted from {}'.format(route_to))
+            self.metrics.inc('errors')
+            feedback = None
+
+        origin = self.in_flight[route_to].popleft()
+
+        if origin:
+            component, empty, block = origin
+
+            # Rerouting works as in the blocking router, but the feedback
+            # of the second outbound is not waited for.
+            reroute = self.outbound_components[route_to]['route']
+            if reroute and feedback is not None:
+                self._forward(reroute, None, [feedback])
+
+            if block:
+                if feedback is None:
+                    feedback = b'0'
+                self.inbound.send_multipart([component, empty, feedback])
+
+        if self.waiting[route_to]:
+            self._forward(route_to, *self.waiting[route_to].popleft())
+
+    def start(self):
+        self.logger.info('Launch asynchronous router')
+        self._log_routes()
+
+        poller = zmq.Poller()
+        poller.register(self.inbound, zmq.POLLIN)
+        poller.register(self.outbound, zmq.POLLIN)
+
+        received = 0
+        while received < self.messages or self._pending():
+            socks = dict(poller.poll())
+
+            if self.outbound in socks:
+                self._handle_outbound()
+
+            if self.inbound in socks:
+                self._handle_inbound()
+                received += 1
+                if received == self.messages:
+                    poller.unregister(self.inbound)
+
+        return b'router'
+
+
 class Inbound(object):
     """
     Generic part that connects a REQ socket to the broker, and a
@@ -184,6 +536,22 @@ class Inbound(object):
     :param logger: Logger instance
     :param cache: Cache for shared data in the server
     :param messages: Maximum number of inbound messages. Defaults to infinity.
+    :param batch: Maximum number of messages sent to the broker in a single
+        round trip. Defaults to 1, no batching.
+    :param batch_timeout: Time in milliseconds that a batch that is not full
+        waits for more inbound messages before it is sent. Parts that reply
+        never wait.
+    :param zero_copy: Size in bytes from which the payloads are forwarded
+        without copying them. Defaults to 0, all the payloads are copied.
+    :param hwm: Messages that the listening socket queues. When the queue is
+        full, the peers that send to it wait. Defaults to None, the ZMQ
+        default.
+
+    In batch mode, the feedback from the broker is handled once per batch.
+
+    Payloads that are not copied are not in the message that gets to
+    :meth:`scatter` either. They are attached to each scattered message that
+    has no payload of its own.
     """
     def __init__(self,
                  name,
@@ -194,9 +562,15 @@ class Inbound(object):
                  bind=False,
                  logger=None,
                  cache=None,
-                 messages=sys.maxsize):
+                 messages=sys.maxsize,
+                 batch=1,
+                 batch_timeout=0,
+                 zero_copy=0,
+                 hwm=None):
         self.name = name.encode('utf-8')
+        self.metrics = registry.part(name)
         self.listen_to = zmq_context.socket(socket_type)
+        configure_socket(self.listen_to, hwm)
         self.bind = bind
         self.listen_address = listen_address
         self.broker = zmq_context.socket(zmq.REQ)
@@ -207,6 +581,11 @@ class Inbound(object):
         self.messages = messages
         self.reply = reply
         self.last_message = b''
+        self.batch = batch
+        self.batch_timeout = batch_timeout
+        self.batch_frames = []
+        self.batch_messages = 0
+        self.zero_copy = zero_copy
 
     def _translate_to_broker(self, message):
         """
@@ -239,6 +618,18 @@ class Inbound(object):
         """
         yield message_data
 
+    def _scatter(self, message, payload):
+        """
+        Messages that :meth:`scatter` gets from an inbound message, along
+        with the frame of their payload.
+
+        :param message: PalmMessage
+        :param payload: Frame with the payload, if it was not copied.
+        :return: Generator of tuples with a PalmMessage and a frame or None
+        """
+        for scattered in self.scatter(message):
+            yield scattered, payload
+
     def handle_feedback(self, message_data):
         """
         Abstract method. Handles the feedback from the broker
@@ -253,12 +644,46 @@ class Inbound(object):
         """
         return self.last_message
 
+    def _send_to_broker(self, message, payload=None):
+        """
+        Sends a message to the broker. In batch mode, the message waits
+        until the batch is full.
+
+        :param message: PalmMessage
+        :param payload: Frame with the payload, if it was not copied.
+        """
+        self.batch_frames.extend(pack(message, payload))
+        self.batch_messages += 1
+        self.metrics.inc('messages_out')
+
+        if self.batch_messages >= self.batch:
+            self._flush_batch()
+
+    def _flush_batch(self):
+        """
+        Sends the pending messages to the broker in a single multipart
+        message, and handles the feedback.
+        """
+        if self.batch_frames:
+            self.broker.send_multipart(self.batch_frames)
+            self.batch_frames = []
+            self.batch_messages = 0
+            self.logger.debug('%s blocked waiting for broker', self.name)
+            self.handle_feedback(self.broker.recv())
+
+    def _end_of_message(self):
+        """
+        Called once each inbound message is scattered. The pending batch is
+        sent, unless more messages arrive within the batch timeout.
+        """
+        if self.batch_frames:
+            if self.reply or not self.listen_to.poll(self.batch_timeout):
+                self._flush_batch()
+
     def start(self):
         """
         Call this function to start the component
         """
-        message = PalmMessage()
-
         if self.bind:
             self.listen_to.bind(self.listen_address)
         else:
@@ -266,18 +691,22 @@ class Inbound(object):
 
         self.logger.info('{} successfully started'.format(self.name))
         for i in range(self.messages):
-            self.logger.debug('{} blocked waiting messages'.format(self.name))
-            message_data = self.listen_to.recv()
-            self.logger.debug('{} Got inbound message'.format(self.name))
+            self.logger.debug('%s blocked waiting messages', self.name)
+            frames = recv_frames(self.listen_to, self.zero_copy)
+            self.logger.debug('%s Got inbound message', self.name)
+            started = time.monotonic()
+            self.metrics.inc('messages_in')
+            self.metrics.inc('bytes_in', size(frames))
 
             try:
-                message.ParseFromString(message_data)
-                for scattered in self.scatter(message):
-                    scattered = self._translate_to_broker(scattered)
-                    self.broker.send(scattered.SerializeToString())
-                    self.logger.debug('{} blocked waiting for broker'.format(
-                        self.name))
-                    self.handle_feedback(self.broker.recv())
+                for message, payload in unpack_frames(frames):
+                    if message.trace:
+                        record(message, self.name, 'in')
+                    for scattered, payload in self._scatter(message, payload):
+                        scattered = self._translate_to_broker(scattered)
+                        self._send_to_broker(scattered, payload)
+
+                self._end_of_message()
 
                 if self.reply:
                     self.listen_to.send(self.reply_feedback())
@@ -285,10 +714,15 @@ class Inbound(object):
                 self.logger.error('Exception in scatter or routing.')
                 lines = traceback.format_exception(*sys.exc_info())
                 self.logger.exception(lines[0])
+                self.metrics.inc('errors')
 
                 if self.reply:
                     self.listen_to.send(b'0')
 
+            self.metrics.observe('latency', time.monotonic() - started)
+
+        self._flush_batch()
+
         return self.name
 
     def cleanup(self):
@@ -310,6 +744,21 @@ class Outbound(object):
     :param logger: Logger instance
     :param cache: Access to the cache of the server
     :param messages: Maximum number of inbound messages. Defaults to infinity.
+    :param zero_copy: Size in bytes from which the payloads are forwarded
+        without copying them. Defaults to 0, all the payloads are copied.
+    :param batch: Maximum number of messages sent to the outbound socket in
+        a single multipart message. Defaults to 1, no batching. Parts that
+        wait for a reply can't send batches.
+    :param batch_timeout: Time in milliseconds that a batch that is not full
+        waits for more messages from the broker since its first message.
+    :param hwm: Messages that the outbound socket queues for each peer.
+        Defaults to None, the ZMQ default.
+    :param policy: What happens to a message when the queue is full. 'block'
+        waits for room, and 'drop' drops the message and counts it in
+        ``dropped``. Defaults to None, the behaviour of the socket type.
+
+    Payloads that are not copied are not in the message that gets to
+    :meth:`scatter` either, like in :class:`Inbound`.
     """
     def __init__(self,
                  name,
@@ -320,9 +769,23 @@ class Outbound(object):
                  bind=False,
                  logger=None,
                  cache=None,
-                 messages=sys.maxsize):
+                 messages=sys.maxsize,
+                 zero_copy=0,
+                 batch=1,
+                 batch_timeout=0,
+                 hwm=None,
+                 policy=None):
+        if reply and batch > 1:
+            raise ValueError('Parts that wait for a reply can not send '
+                             'batches')
+
         self.name = name.encode('utf-8')
+        self.metrics = registry.part(name)
+        self.hwm = hwm
+        self.policy = check_policy(policy)
+        self.dropped = 0
         self.listen_to = zmq_context.socket(socket_type)
+        configure_socket(self.listen_to, hwm, policy)
         self.bind = bind
         self.listen_address = listen_address
         self.broker = zmq_context.socket(zmq.REP)
@@ -333,6 +796,12 @@ class Outbound(object):
         self.messages = messages
         self.reply = reply
         self.last_message = b''
+        self.zero_copy = zero_copy
+        self.batch = batch
+        self.batch_timeout = batch_timeout
+        self.batch_frames = []
+        self.batch_messages = 0
+        self.batch_deadline = 0
 
     def _translate_to_broker(self, message: PalmMessage):
         """
@@ -376,12 +845,77 @@ class Outbound(object):
         """
         return self.last_message
 
+    def _send_outbound(self, message, frames):
+        """
+        Sends a message to the outbound socket.
+
+        :param message: PalmMessage
+        :param frames: Frames of the message
+        """
+        if self.batch == 1:
+            self._push(frames)
+            return
+
+        if not self.batch_frames:
+            self.batch_deadline = time.monotonic() + self.batch_timeout / 1000
+        self.batch_frames.extend(frames)
+        self.batch_messages += 1
+
+        if self.batch_messages >= self.batch:
+            self._flush_batch()
+
+    def _flush_batch(self):
+        """
+        Sends the pending messages to the outbound socket in a single
+        multipart message.
+        """
+        if self.batch_frames:
+            self._push(self.batch_frames, self.batch_messages)
+            self.batch_frames = []
+            self.batch_messages = 0
+
+    def _push(self, frames, messages=1):
+        """
+        Sends frames to the outbound socket.
+
+        :param frames: Frames of one message, or of a batch
+        :param messages: Number of messages in the frames
+        """
+        self._send(self.listen_to, frames, messages)
+
+    def _send(self, socket, frames, messages=1):
+        """
+        Sends frames with the policy of the part, and counts the messages
+        that are dropped.
+
+        :param socket: ZMQ socket
+        :param frames: Frames of one message, or of a batch
+        :param messages: Number of messages in the frames
+        :return: False if the messages were dropped
+        """
+        if send_frames(socket, frames, self.policy):
+            return True
+
+        self.dropped += messages
+        self.metrics.inc('dropped', messages)
+        self.logger.debug('%s dropped %s messages, %s in total',
+                          self.name, messages, self.dropped)
+        return False
+
+    def _wait_for_broker(self):
+        """
+        Waits for the next message from the broker. The pending batch is
+        sent if its time is over first.
+        """
+        if self.batch_frames:
+            timeout = (self.batch_deadline - time.monotonic()) * 1000
+            if not self.broker.poll(max(int(timeout), 0)):
+                self._flush_batch()
+
     def start(self):
         """
         Call this function to start the component
         """
-        message = PalmMessage()
-
         if self.bind:
             self.listen_to.bind(self.listen_address)
         else:
@@ -390,22 +924,34 @@ class Outbound(object):
         self.logger.info('{} successfully started'.format(self.name))
             
         for i in range(self.messages):
-            self.logger.debug('{} blocked waiting for broker'.format(self.name))
-            message_data = self.broker.recv()
-            self.logger.debug('{} Got message from broker'.format(self.name))
-            message_data = self._translate_from_broker(message_data)
-            message.ParseFromString(message_data)
+            self.logger.debug('%s blocked waiting for broker', self.name)
+            self._wait_for_broker()
+            # More than one message if the inbound part sends batches
+            frames = recv_frames(self.broker, self.zero_copy)
+            started = time.monotonic()
+            for message, payload in unpack_frames(frames):
+                self.logger.debug('%s Got message from broker', self.name)
+                self.metrics.inc('messages_in')
+                message = self._translate_from_broker(message)
+                if message.trace:
+                    record(message, self.name, 'out')
 
-            for scattered in self.scatter(message):
-                self.listen_to.send(scattered.SerializeToString())
-                self.logger.debug('{} Sent message'.format(self.name))
+                for scattered in self.scatter(message):
+                    packed = pack(scattered, payload)
+                    self._send_outbound(scattered, packed)
+                    self.metrics.inc('messages_out')
+                    self.metrics.inc('bytes_out', size(packed))
+                    self.logger.debug('%s Sent message', self.name)
 
-                if self.reply:
-                    feedback = self.listen_to.recv()
-                    feedback = self._translate_to_broker(feedback)
-                    self.handle_feedback(feedback)
+                    if self.reply:
+                        feedback = self.listen_to.recv()
+                        feedback = self._translate_to_broker(feedback)
+                        self.handle_feedback(feedback)
 
             self.broker.send(self.reply_feedback())
+            self.metrics.observe('latency', time.monotonic() - started)
+
+        self._flush_batch()
 
         return self.name
 
@@ -436,6 +982,7 @@ class BypassInbound(object):
                  cache=None,
                  messages=sys.maxsize):
         self.name = name.encode('utf-8')
+        self.metrics = registry.part(name)
         self.listen_to = zmq_context.socket(socket_type)
         self.bind = bind
         self.listen_address = listen_address
@@ -0,0 +1,237 @@
+# Pylm, a framework to build components for high performance distributed
+# applications. Copyright (C) 2016 NFQ Solutions
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Dispatch of the messages to the user functions. The function strings are
+# parsed once, and the user functions are looked up in a table that is built
+# when the server starts, so the messages only cost a couple of lookups.
+from collections import deque
+from functools import lru_cache
+import zlib
+
+
+@lru_cache(maxsize=1024)
+def parse(function):
+    """
+    Steps of a function string, like 'server.function' or, for a pipeline,
+    'first.function second.function'. The result is cached.
+
+    :param function: Function string of a message
+    :return: Tuple with a tuple (server, function) for each step
+    """
+    steps = []
+    for step in function.split():
+        server, dot, name = step.partition('.')
+        if not dot:
+            raise ValueError('Pipeline call not correct. Review the '
+                             'config in your client')
+        steps.append((server, name))
+
+    if not steps:
+        raise ValueError('Pipeline call not correct. Review the '
+                         'config in your client')
+
+    return tuple(steps)
+
+
+def target(message):
+    """
+    Server and function that a message calls. In a pipeline, the step is
+    the stage of the message.
+
+    :param message: PalmMessage
+    :return: Tuple (server, function)
+    """
+    steps = parse(message.function)
+    if len(steps) == 1:
+        return steps[0]
+
+    try:
+        return steps[message.stage]
+    except IndexError:
+        raise ValueError('Pipeline call not correct. Review the '
+                         'config in your client')
+
+
+def batched(function):
+    """
+    Decorator for the user functions of a worker that get a list with the
+    payloads of the messages of a batch, and return a list with the result
+    for each one, in the same order.
+
+    :param function: User function
+    :return: The same function
+    """
+    function.batched = True
+    return function
+
+
+def call_batch(function, payloads):
+    """
+    Calls a batched user function, and checks that it returns a result for
+    each payload.
+
+    :param function: Batched user function
+    :param payloads: List of payloads
+    :return: List of results
+    """
+    results = list(function(payloads))
+    if len(results) != len(payloads):
+        raise ValueError('Got {} results for {} payloads'.format(
+            len(results), len(payloads)))
+
+    return results
+
+
+class AdaptiveBatch(object):
+    """
+    Size of the batches of a server that adapts to the load. The size grows
+    by one after each full batch while the p99 latency of the last batches
+    stays under the target, it is halved when the latency goes over the
+    target, and it shrinks to the size of the last batch when the queue of
+    messages gets empty.
+
+    :param target: Target of the p99 latency of the batches in milliseconds
+    :param max_size: Maximum size of the batches
+    :param window: Number of batches whose latency is taken into account
+    """
+    def __init__(self, target, max_size=64, window=100):
+        if target <= 0:
+            raise ValueError('The latency target must be positive')
+        if max_size < 1:
+            raise ValueError('The maximum batch size must be at least 1')
+
+        self.target = target / 1000
+        self.max_size = max_size
+        self.size = 1
+        self.latencies = deque(maxlen=window)
+
+    def p99(self):
+        """
+        99th percentile of the latencies of the last batches, in seconds.
+        """
+        if not self.latencies:
+            return 0.0
+
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+    def update(self, latency, messages):
+        """
+        Adapts the size after a batch.
+
+        :param latency: Time in seconds that the batch took
+        :param messages: Number of messages in the batch
+        """
+        self.latencies.append(latency)
+
+        if self.p99() > self.target:
+            self.size = max(1, self.size // 2)
+            # The latencies of the larger batches don't count anymore.
+            self.latencies.clear()
+        elif messages < self.size:
+            self.size = max(1, messages)
+        elif self.size < self.max_size:
+            self.size += 1
+
+
+def function_id(name):
+    """
+    Numeric id of a user function, that the messages can carry in the
+    ``function_id`` field instead of the name. It is the CRC32 of the name,
+    so it is the same for any server and any version that has the function.
+
+    :param name: Name of the function
+    :return: Positive integer
+    """
+    return zlib.crc32(name.encode('utf-8')) or 1
+
+
+def _user_function(server_class, name):
+    """
+    True if the class that defines the attribute is not one of the classes
+    of pylm.
+    """
+    for cls in server_class.__mro__:
+        if name in cls.__dict__:
+            return not cls.__module__.startswith('pylm.')
+
+    return False
+
+
+class DispatchTable(object):
+    """
+    User functions of a server, collected when it starts. The user functions,
+    the public methods that the server does not inherit from pylm, also get
+    the numeric id of :func:`function_id`.
+
+    :param server: Object with the user functions as methods
+    """
+    def __init__(self, server):
+        self.server = server
+        self.functions = {}
+        for name in dir(type(server)):
+            if not name.startswith('_') and \
+                    callable(getattr(type(server), name, None)):
+                self.functions[name] = getattr(server, name)
+
+        self.names = sorted(name for name in self.functions
+                            if _user_function(type(server), name))
+        self.ids = {name: function_id(name) for name in self.names}
+        self.by_id = {value: name for name, value in self.ids.items()}
+
+    def lookup(self, name):
+        """
+        User function with the given name, or None if there is none. Only
+        the names that are found are kept in the table.
+
+        :param name: Name of the function
+        :return: Callable or None
+        """
+        try:
+            return self.functions[name]
+        except KeyError:
+            function = getattr(self.server, name, None) if name else None
+            if not callable(function):
+                return None
+            self.functions[name] = function
+            return function
+
+    def name(self, function_id):
+        """
+        Name of the user function with the given id, or None if there is
+        none.
+
+        :param function_id: Numeric id of the function
+        :return: Name of the function
+        """
+        return self.by_id.get(function_id)
+
+    def function(self, message):
+        """
+        Name of the user function that a message calls, from its numeric id
+        if it has one. If the message has both, and the id is not the one of
+        the function in the function string, it calls nothing.
+
+        :param message: PalmMessage
+        :return: Name of the function, or None
+        """
+        if message.function_id:
+            name = self.name(message.function_id)
+            if name and message.function and target(message)[1] != name:
+                return None
+            return name
+
+        return target(message)[1]
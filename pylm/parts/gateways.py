@@ -15,7 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from pylm.parts.core import Inbound, Outbound
-from pylm.parts.core import zmq_context
+from pylm.parts.core import zmq_context, unpack
 from pylm.persistence.kv import DictDB
 from pylm.parts.messages_pb2 import PalmMessage
 from http.server import HTTPServer, BaseHTTPRequestHandler
@@ -81,14 +81,15 @@ class GatewayRouter(Inbound):
         self.logger.info('Launch component {}'.format(self.name))
 
         for i in range(self.messages):
-            self.logger.debug('Component {} blocked waiting messages'.format(self.name))
+            self.logger.debug('Component %s blocked waiting messages',
+                              self.name)
             response = self.listen_to.recv_multipart()
 
             # If the message is from anything but the dealer, send it to the
             # router.
             if len(response) == 3:
                 [target, empty, message_data] = response
-                self.logger.debug('{} Got inbound message'.format(self.name))
+                self.logger.debug('%s Got inbound message', self.name)
                 
                 try:
                     message.ParseFromString(message_data)
@@ -96,8 +97,8 @@ class GatewayRouter(Inbound):
                         scattered = self._translate_to_broker(scattered)
                         self.broker.send(scattered.SerializeToString())
                         self.logger.debug(
-                            'Component {} blocked waiting for broker'.format(
-                            self.name))
+                            'Component %s blocked waiting for broker',
+                            self.name)
                         self.broker.recv()
 
                 except:
@@ -168,22 +169,23 @@ class GatewayDealer(Outbound):
         """
         Call this function to start the component
         """
-        message = PalmMessage()
         self.listen_to.connect(self.listen_address)
 
         for i in range(self.messages):
-            self.logger.debug(
-                'Component {} blocked waiting for broker'.format(self.name))
-            [me, message_data] = self.broker.recv_multipart()
-            message.ParseFromString(message_data)
-            self.logger.debug(
-                'Component {} Got message from broker'.format(self.name))
-            target, message = self._translate_from_broker(message)
-
-            for scattered in self.scatter(message):
-                self.listen_to.send_multipart([target.encode('utf-8'), b'',
-                                               scattered.SerializeToString()])
-                self.logger.debug('Component {} sent message'.format(self.name))
+            self.logger.debug('Component %s blocked waiting for broker',
+                              self.name)
+            # More than one message frame if the inbound part sends batches
+            frames = self.broker.recv_multipart()
+
+            for message in unpack(frames[1:]):
+                self.logger.debug('Component %s Got message from broker',
+                                  self.name)
+                target, message = self._translate_from_broker(message)
+
+                for scattered in self.scatter(message):
+                    self.listen_to.send_multipart([target.encode('utf-8'), b'',
+                                                   scattered.SerializeToString()])
+                    self.logger.debug('Component %s sent message', self.name)
 
             self.broker.send(b'')
 
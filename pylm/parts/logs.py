@@ -0,0 +1,134 @@
+# Pylm, a framework to build components for high performance distributed
+# applications. Copyright (C) 2016 NFQ Solutions
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Console logging of the servers, the parts and the clients. The records
+# are put in a queue, and a single thread of each process writes them to
+# the standard output, so the threads that handle messages never block on
+# it. Log calls in the hot paths pass their arguments to the logger instead
+# of formatting them, so they cost a level check when the level is off.
+from logging.handlers import QueueHandler, QueueListener
+import multiprocessing.util
+import threading
+import logging
+import atexit
+import queue
+import sys
+import os
+
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_lock = threading.Lock()
+_pid = None
+_records = None
+_listener = None
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """
+    Writes to the current standard output, even if it was replaced after
+    the handler was created, with the formatter of the handler that queued
+    the record.
+    """
+    def format(self, record):
+        return record.console_formatter.format(record)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def _queue():
+    """
+    Queue of the records of this process. Starts the thread that writes
+    them the first time, and again in a forked process.
+    """
+    global _pid, _records, _listener
+
+    if _pid != os.getpid():
+        with _lock:
+            if _pid != os.getpid():
+                _records = queue.SimpleQueue()
+                _listener = QueueListener(_records, _StdoutHandler())
+                _listener.start()
+                _pid = os.getpid()
+                # Processes started by multiprocessing don't run atexit
+                multiprocessing.util.Finalize(None, flush, exitpriority=0)
+
+    return _records
+
+
+def flush():
+    """
+    Writes the records that are in the queue and stops the thread that
+    writes them. It starts again with the next record.
+    """
+    global _pid
+
+    with _lock:
+        if _pid == os.getpid():
+            _pid = None
+            _listener.stop()
+
+
+atexit.register(flush)
+
+
+class ConsoleHandler(QueueHandler):
+    """
+    Handler that puts the records in the queue of the process. The thread
+    that logs a record only merges its arguments into the message, because
+    they may change later, and the thread of the queue formats it.
+
+    :param format: Format of the records.
+    """
+    def __init__(self, format=FORMAT):
+        super(ConsoleHandler, self).__init__(None)
+        self.setFormatter(logging.Formatter(format))
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        record.console_formatter = self.formatter
+        return record
+
+    def enqueue(self, record):
+        _queue().put_nowait(record)
+
+
+def console(name, level, format=FORMAT):
+    """
+    Logger that writes to the standard output through the queue. The handler
+    is attached only once to each logger, so the components that share a
+    name don't repeat the lines.
+
+    :param name: Name of the logger
+    :param level: Logging level
+    :param format: Format of the records.
+    :return: The logger
+    """
+    logger = logging.getLogger(name=name)
+    if not any(isinstance(handler, ConsoleHandler)
+               for handler in logger.handlers):
+        logger.addHandler(ConsoleHandler(format))
+    logger.setLevel(level)
+    return logger
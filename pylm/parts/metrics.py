@@ -0,0 +1,248 @@
+# Pylm, a framework to build components for high performance distributed
+# applications. Copyright (C) 2016 NFQ Solutions
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Counters and latency histograms of the parts, the servers and the workers
+# that run in a process. Parts with the same name share their metrics, and a
+# server may update them from the threads of its pool, so each update takes
+# the lock of the metrics. They are read from the registry of the process.
+import threading
+import math
+
+
+def size(frames):
+    """
+    Bytes in a list of frames, copied or not.
+
+    :param frames: List of bytes or zmq.Frame
+    """
+    return sum(len(frame) for frame in frames)
+
+
+class Histogram(object):
+    """
+    Latencies in buckets whose width grows with the value, like a HDR
+    histogram. There are ``sub_buckets`` buckets for each power of two from
+    one microsecond, so the error of a percentile is below one part in
+    ``sub_buckets``. Recording a latency costs a logarithm.
+
+    :param sub_buckets: Buckets for each power of two. Defaults to 8.
+    :param max_seconds: Latencies from which all go to the last bucket.
+        Defaults to 100 seconds.
+    """
+    def __init__(self, sub_buckets=8, max_seconds=100):
+        self.sub_buckets = sub_buckets
+        self.counts = [0] * (
+            int(math.log2(max_seconds * 1e6) * sub_buckets) + 2)
+        self.count = 0
+        self.sum = 0.0
+
+    def record(self, seconds):
+        """
+        Records a latency.
+
+        :param seconds: Latency in seconds
+        """
+        micros = seconds * 1e6
+        if micros < 1:
+            index = 0
+        else:
+            index = min(int(math.log2(micros) * self.sub_buckets) + 1,
+                        len(self.counts) - 1)
+
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def upper(self, index):
+        """
+        Upper bound of a bucket in seconds.
+
+        :param index: Index of the bucket
+        """
+        return 2 ** (index / self.sub_buckets) / 1e6
+
+    def percentile(self, percentile):
+        """
+        Upper bound of the bucket of the given percentile of the latencies,
+        in seconds, or 0 if there are none.
+
+        :param percentile: Percentile, like 99
+        """
+        if not self.count:
+            return 0.0
+
+        rank = self.count * percentile / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.upper(index)
+
+        return self.upper(len(self.counts) - 1)
+
+    def buckets(self):
+        """
+        Cumulative counts at each power of two, the coarse buckets that
+        Prometheus gets.
+
+        :return: List of tuples (upper bound in seconds, count)
+        """
+        cumulative = []
+        seen = 0
+        # The last bucket has no upper bound
+        for index, count in enumerate(self.counts[:-1]):
+            seen += count
+            if index % self.sub_buckets == 0:
+                cumulative.append((self.upper(index), seen))
+
+        return cumulative
+
+    def summary(self):
+        """
+        Count, sum and usual percentiles of the latencies.
+        """
+        return {'count': self.count,
+                'sum': self.sum,
+                'p50': self.percentile(50),
+                'p99': self.percentile(99),
+                'p999': self.percentile(99.9)}
+
+
+class Metrics(object):
+    """
+    Counters and latency histograms of a part. Any thread can update them.
+
+    :param name: Name of the part
+    """
+    def __init__(self, name):
+        self.name = name
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def inc(self, counter, value=1):
+        """
+        Adds to a counter.
+
+        :param counter: Name of the counter, like 'messages_in'
+        :param value: Value to add. Defaults to 1.
+        """
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def observe(self, histogram, seconds):
+        """
+        Records a latency.
+
+        :param histogram: Name of the histogram, like 'latency'
+        :param seconds: Latency in seconds
+        """
+        with self.lock:
+            try:
+                self.histograms[histogram].record(seconds)
+            except KeyError:
+                self.histograms[histogram] = Histogram()
+                self.histograms[histogram].record(seconds)
+
+    def snapshot(self):
+        """
+        Copy of the counters and summary of the histograms.
+        """
+        with self.lock:
+            return {'counters': dict(self.counters),
+                    'latencies': {name: histogram.summary() for name, histogram
+                                  in self.histograms.items()}}
+
+
+class Registry(object):
+    """
+    Metrics of the parts that run in a process, by name. Parts with the same
+    name share the metrics.
+    """
+    def __init__(self):
+        self.parts = {}
+        self.lock = threading.Lock()
+
+    def part(self, name):
+        """
+        Metrics of a part, created the first time.
+
+        :param name: Name of the part
+        :return: Metrics
+        """
+        if isinstance(name, bytes):
+            name = name.decode('utf-8')
+
+        with self.lock:
+            if name not in self.parts:
+                self.parts[name] = Metrics(name)
+            return self.parts[name]
+
+    def snapshot(self):
+        """
+        Counters and latency summaries of all the parts.
+
+        :return: Dictionary by part name
+        """
+        with self.lock:
+            parts = list(self.parts.values())
+
+        return {metrics.name: metrics.snapshot() for metrics in parts}
+
+    def render(self):
+        """
+        Metrics of all the parts in the text format of Prometheus.
+
+        :return: String
+        """
+        with self.lock:
+            parts = list(self.parts.values())
+
+        counters = {}
+        histograms = {}
+        for metrics in parts:
+            for counter, value in list(metrics.counters.items()):
+                counters.setdefault(counter, []).append((metrics.name, value))
+            for name, histogram in list(metrics.histograms.items()):
+                histograms.setdefault(name, []).append(
+                    (metrics.name, histogram))
+
+        lines = []
+        for counter in sorted(counters):
+            family = 'pylm_{}_total'.format(counter)
+            lines.append('# TYPE {} counter'.format(family))
+            for part, value in counters[counter]:
+                lines.append('{}{{part="{}"}} {}'.format(family, part, value))
+
+        for name in sorted(histograms):
+            family = 'pylm_{}_seconds'.format(name)
+            lines.append('# TYPE {} histogram'.format(family))
+            for part, histogram in histograms[name]:
+                for upper, count in histogram.buckets():
+                    lines.append('{}_bucket{{part="{}",le="{:.6g}"}} {}'.format(
+                        family, part, upper, count))
+                lines.append('{}_bucket{{part="{}",le="+Inf"}} {}'.format(
+                    family, part, histogram.count))
+                lines.append('{}_sum{{part="{}"}} {}'.format(
+                    family, part, histogram.sum))
+                lines.append('{}_count{{part="{}"}} {}'.format(
+                    family, part, histogram.count))
+
+        return '\n'.join(lines) + '\n'
+
+
+# Metrics of this process
+registry = Registry()
@@ -14,13 +14,182 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from pylm.parts.core import Router
+from pylm.parts.core import zmq_context, Router, AsyncRouter
+from pylm.parts.services import PullService, PushService, PubService
+from pylm.parts.connections import SubConnection
+from pylm.parts.shards import ShardDispatcher, ShardCollector, pipeline_key
+from pylm.parts.logs import console
 from pylm.persistence.kv import DictDB
 from pylm.parts.messages_pb2 import PalmMessage
+from zmq.utils.monitor import recv_monitor_message
+from collections import deque
+from uuid import uuid4
 import concurrent.futures
+import multiprocessing
+import threading
 import traceback
+import tempfile
 import logging
+import zmq
 import sys
+import os
+
+
+def part_setting(setting, name):
+    """
+    Setting of a part, from a value for all the parts of a server or from a
+    dictionary with the value for each part.
+
+    :param setting: Value, or dictionary of values by part name
+    :param name: Name of the part
+    :return: The value for the part, or None if it has none
+    """
+    if isinstance(setting, dict):
+        return setting.get(name)
+
+    return setting
+
+
+class RemotePart(object):
+    """
+    Placeholder for a part that runs in its own process. The part is
+    instantiated within the process, and the attributes that are set to
+    the placeholder, like the scatter function of a master, are set to
+    the part.
+
+    :param part: part class
+    :param kind: 'inbound', 'outbound' or 'bypass'
+    :param name: Name of the part
+    :param listen_address: Valid ZeroMQ address listening to the exterior
+    :param kwargs: Keyword arguments to pass to the part
+    """
+    def __init__(self, part, kind, name, listen_address, kwargs):
+        object.__setattr__(self, 'part', part)
+        object.__setattr__(self, 'kind', kind)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'listen_address', listen_address)
+        object.__setattr__(self, 'kwargs', kwargs)
+        object.__setattr__(self, 'overrides', {})
+
+    def __setattr__(self, key, value):
+        self.overrides[key] = value
+
+    def build(self, logger, broker_address=None):
+        """
+        Instantiate the part.
+
+        :param logger: Logger instance
+        :param broker_address: Address of the router for this kind of part
+        """
+        kwargs = dict(self.kwargs)
+        if broker_address:
+            kwargs['broker_address'] = broker_address
+
+        instance = self.part(self.name,
+                             self.listen_address,
+                             logger=logger,
+                             **kwargs)
+
+        for key, value in self.overrides.items():
+            setattr(instance, key, value)
+
+        return instance
+
+
+def _start_part_process(parts, inbound_address, outbound_addresses,
+                        logging_level):
+    """
+    Entry point of the processes that run parts of a server. If one of the
+    parts dies, the process exits with an error so it can be restarted.
+    """
+    logger = console(name=multiprocessing.current_process().name,
+                     level=logging_level)
+
+    instances = []
+    for part in parts:
+        if part.kind == 'inbound':
+            instances.append(part.build(logger, inbound_address))
+        elif part.kind == 'outbound':
+            instances.append(part.build(logger, outbound_addresses[part.name]))
+        else:
+            instances.append(part.build(logger))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(instances)) as executor:
+        results = [executor.submit(instance.start) for instance in instances]
+        for future in concurrent.futures.as_completed(results):
+            try:
+                future.result()
+            except Exception as exc:
+                logger.error('This is critical, one of the parts died')
+                lines = traceback.format_exception(*sys.exc_info())
+                for line in lines:
+                    logger.error(line.strip('\n'))
+                # Do not wait for the other parts.
+                os._exit(1)
+
+
+def _relay_outbound(frontend, backend, logger):
+    """
+    Relays the messages between the router and an outbound part that runs
+    in another process. The messages that the part got and did not answer
+    when its process died are sent again to the one that replaces it, so
+    the router gets a reply for each one. The oldest of them, the one that
+    the part was handling, is answered with b'0' instead if it was already
+    sent again once, because it may be the reason the part dies.
+
+    :param frontend: DEALER socket connected to the router
+    :param backend: DEALER socket that the part connects to
+    :param logger: Logger instance
+    """
+    # Messages sent to the part and if they were sent again, in order,
+    # because the part replies in the same order it receives.
+    pending = deque()
+    monitor = backend.get_monitor_socket(
+        zmq.EVENT_ACCEPTED | zmq.EVENT_DISCONNECTED)
+
+    poller = zmq.Poller()
+    poller.register(monitor, zmq.POLLIN)
+    poller.register(backend, zmq.POLLIN)
+    connected = False
+
+    while True:
+        sockets = dict(poller.poll())
+
+        if backend in sockets:
+            frontend.send_multipart(backend.recv_multipart())
+            pending.popleft()
+
+        if frontend in sockets:
+            frames = frontend.recv_multipart()
+            pending.append([frames, False])
+            try:
+                backend.send_multipart(frames, zmq.NOBLOCK)
+            except zmq.Again:
+                # The part died, the message goes to the new one
+                pass
+
+        if monitor in sockets:
+            event = recv_monitor_message(monitor)['event']
+            if event == zmq.EVENT_DISCONNECTED and connected:
+                # Nothing reaches the part until the new one connects
+                poller.unregister(frontend)
+                connected = False
+
+            elif event == zmq.EVENT_ACCEPTED and not connected:
+                if pending and pending[0][1]:
+                    logger.error('The part died twice with the same message')
+                    pending.popleft()
+                    frontend.send_multipart([b'', b'0'])
+
+                if pending:
+                    logger.warning('Sending {} messages again'.format(
+                        len(pending)))
+                for message in pending:
+                    message[1] = True
+                    backend.send_multipart(message[0])
+
+                poller.register(frontend, zmq.POLLIN)
+                connected = True
 
 
 class ServerTemplate(object):
@@ -29,6 +198,18 @@ class ServerTemplate(object):
 
     :param logging_level: A correct logging level from the logging module.
         Defaults to INFO.
+    :param router_messages: Number of messages the router handles before it
+        shuts down. Useful for debugging.
+    :param router_window: Messages in flight allowed for each outbound part.
+        If set, the server uses an :class:`AsyncRouter` that does not block
+        waiting for the outbound parts. Defaults to 0, the blocking router.
+    :param processes: Dictionary with the name of the process that runs each
+        part, for parts that are registered without the ``process``
+        argument. Parts not present run as threads of the main process.
+    :param ipc_dir: Directory for the sockets between the router and the
+        parts that run in other processes. Defaults to the temporary directory.
+    :param zero_copy: Size in bytes from which the router forwards the
+        frames without copying them. Defaults to 0, all the frames are copied.
 
     It has important attributes that you may want to override, like
 
@@ -36,10 +217,18 @@ class ServerTemplate(object):
     :logging_level: Controls the log output of the server.
     :router: Here's the router, you may want to change its attributes too.
 
+    Parts that run in their own process get a copy of the cache when the
+    server starts, and the processes that die are restarted. The messages
+    that the outbound parts of a dead process did not answer are sent again
+    to the restarted ones.
     """
     def __init__(self,
                  logging_level=logging.INFO,
-                 router_messages=sys.maxsize):
+                 router_messages=sys.maxsize,
+                 router_window=0,
+                 processes=None,
+                 ipc_dir=None,
+                 zero_copy=0):
         # Name of the server
         self.name = ''
 
@@ -53,23 +242,49 @@ class ServerTemplate(object):
         self.outbound_components = {}
         self.bypass_components = {}
 
+        # Parts that run in other processes, grouped by process name
+        self.part_processes = processes if processes else {}
+        self.processes = {}
+        self.ipc_dir = ipc_dir if ipc_dir else tempfile.gettempdir()
+        self.uuid = str(uuid4())
+        self.supervise_interval = 1.0
+
         # Basic console logging
-        self.logger = logging.getLogger(name=self.name)
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setFormatter(
-            logging.Formatter(
-                '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        )
-        self.logger.addHandler(handler)
-        self.logger.setLevel(self.logging_level)
+        self.logger = console(name=self.name, level=self.logging_level)
 
         # Finally, the router
-        self.router = Router(logger=self.logger,
-                             cache=self.cache,
-                             messages=router_messages)
+        if router_window:
+            self.router = AsyncRouter(logger=self.logger,
+                                      cache=self.cache,
+                                      messages=router_messages,
+                                      window=router_window,
+                                      zero_copy=zero_copy)
+        else:
+            self.router = Router(logger=self.logger,
+                                 cache=self.cache,
+                                 messages=router_messages,
+                                 zero_copy=zero_copy)
+
+    def __getstate__(self):
+        # Only needed to send the bound methods of the server that are
+        # monkey patched to parts that run in other processes. Sockets stay.
+        state = self.__dict__.copy()
+        for key in ('router', 'inbound_components', 'outbound_components',
+                    'bypass_components', 'processes'):
+            state.pop(key, None)
+        return state
+
+    def _remote_part(self, part, kind, name, listen_address, process, kwargs):
+        if not process:
+            process = self.part_processes.get(name, '')
+
+        if process:
+            remote = RemotePart(part, kind, name, listen_address, kwargs)
+            self.processes.setdefault(process, []).append(remote)
+            return remote
 
     def register_inbound(self, part, name='', listen_address='', route='',
-                         block=False, log='', **kwargs):
+                         block=False, log='', process='', **kwargs):
         """
         Register inbound part to this server.
 
@@ -79,17 +294,22 @@ class ServerTemplate(object):
         :param route: Outbound part it routes to
         :param block: True if the part blocks waiting for a response
         :param log: Log message in DEBUG level for each message processed.
+        :param process: Name of the process that runs the part. Parts with
+            the same process name run together. Defaults to the main process.
         :param kwargs: Additional keyword arguments to pass to the part
         """
         # Inject the server cache in case it is not configured for the component
         if 'cache' not in kwargs:
             kwargs['cache'] = self.cache
 
-        instance = part(name,
-                        listen_address,
-                        broker_address=self.router.inbound_address,
-                        logger=self.logger,
-                        **kwargs)
+        instance = self._remote_part(part, 'inbound', name, listen_address,
+                                     process, kwargs)
+        if not instance:
+            instance = part(name,
+                            listen_address,
+                            broker_address=self.router.inbound_address,
+                            logger=self.logger,
+                            **kwargs)
 
         self.router.register_inbound(name,
                                      route=route,
@@ -99,7 +319,7 @@ class ServerTemplate(object):
         self.inbound_components[name] = instance
 
     def register_outbound(self, part, name='', listen_address='', route='',
-                          log='', **kwargs):
+                          log='', process='', **kwargs):
         """
         Register outbound part to this server
 
@@ -108,17 +328,22 @@ class ServerTemplate(object):
         :param listen_address: Valid ZeroMQ address listening to the exterior
         :param route: Outbound part it routes the response (if there is) to
         :param log: Log message in DEBUG level for each message processed
+        :param process: Name of the process that runs the part. Parts with
+            the same process name run together. Defaults to the main process.
         :param kwargs: Additional keyword arguments to pass to the part
         """
         # Inject the server cache in case it is not configured for the component
         if 'cache' not in kwargs:
             kwargs['cache'] = self.cache
 
-        instance = part(name,
-                        listen_address,
-                        broker_address=self.router.outbound_address,
-                        logger=self.logger,
-                        **kwargs)
+        instance = self._remote_part(part, 'outbound', name, listen_address,
+                                     process, kwargs)
+        if not instance:
+            instance = part(name,
+                            listen_address,
+                            broker_address=self.router.outbound_address,
+                            logger=self.logger,
+                            **kwargs)
 
         self.router.register_outbound(name,
                                       route=route,
@@ -126,26 +351,45 @@ class ServerTemplate(object):
 
         self.outbound_components[name] = instance
 
-    def register_bypass(self, part, name='', listen_address='', **kwargs):
+    def register_bypass(self, part, name='', listen_address='', process='',
+                        **kwargs):
         """
         Register a bypass part to this server
 
         :param part: part class
         :param name: part name
         :param listen_address: Valid ZeroMQ address listening to the exterior
+        :param process: Name of the process that runs the part. Defaults to
+            the main process.
         :param kwargs: Additional keyword arguments to pass to the part
         """
         # Inject the server cache in case it is not configured for the component
         if 'cache' not in kwargs:
             kwargs['cache'] = self.cache
 
-        instance = part(name,
-                        listen_address,
-                        logger=self.logger,
-                        **kwargs)
+        instance = self._remote_part(part, 'bypass', name, listen_address,
+                                     process, kwargs)
+        if not instance:
+            instance = part(name,
+                            listen_address,
+                            logger=self.logger,
+                            **kwargs)
 
         self.bypass_components[name] = instance
 
+    def dropped(self):
+        """
+        Messages that each part of this process dropped because the queues
+        of its peers were full.
+
+        :return: Dictionary with the count of each part
+        """
+        parts = dict(self.inbound_components)
+        parts.update(self.outbound_components)
+        return {name: part.dropped for name, part in parts.items()
+                if not isinstance(part, RemotePart) and
+                hasattr(part, 'dropped')}
+
     def preset_cache(self, **kwargs):
         """
         Send the following keyword arguments as cache variables. Useful
@@ -160,22 +404,386 @@ class ServerTemplate(object):
             else:
                 self.cache.set(arg, val)
 
+    def _ipc_address(self, name):
+        return 'ipc://{}'.format(
+            os.path.join(self.ipc_dir, 'pylm-{}-{}'.format(self.uuid, name))
+        )
+
+    def _start_process(self, name):
+        # Spawn, because forked processes can't use the zmq context.
+        context = multiprocessing.get_context('spawn')
+        process = context.Process(
+            target=_start_part_process,
+            args=(self.processes[name],
+                  self._ipc_address('inbound'),
+                  {part.name: self._ipc_address(part.name)
+                   for part in self.processes[name]},
+                  self.logging_level),
+            name=name)
+        process.start()
+        return process
+
+    def _bridge_outbound(self, name):
+        """
+        The router can't reach the reply socket of an outbound part that
+        connects from another process, so a dealer with the name of the
+        part relays the messages to it.
+        """
+        frontend = zmq_context.socket(zmq.DEALER)
+        frontend.setsockopt_string(zmq.IDENTITY, name)
+        frontend.connect(self.router.outbound_address)
+        backend = zmq_context.socket(zmq.DEALER)
+        backend.bind(self._ipc_address(name))
+
+        thread = threading.Thread(target=_relay_outbound,
+                                  args=(frontend, backend, self.logger),
+                                  daemon=True)
+        thread.start()
+
+    def _supervise(self, running, stop):
+        """
+        Restarts the processes of the parts that die with an error.
+        """
+        while not stop.wait(self.supervise_interval):
+            for name, process in running.items():
+                if process.exitcode:
+                    self.logger.error(
+                        'Process {} died with code {}, restarting'.format(
+                            name, process.exitcode))
+                    running[name] = self._start_process(name)
+
     def start(self):
         """
         Start the server with all its parts.
         """
         threads = []
+        running = {}
+        stop = threading.Event()
+
+        if self.processes:
+            # The router listens to the inbound parts in other processes too.
+            # Parts that are restarted take over the connection of the dead
+            # ones.
+            self.router.inbound.setsockopt(zmq.ROUTER_HANDOVER, 1)
+            self.router.inbound.bind(self._ipc_address('inbound'))
+
+            for name, part in self.outbound_components.items():
+                if isinstance(part, RemotePart):
+                    self._bridge_outbound(name)
+
+            for name in self.processes:
+                self.logger.info("Starting process {}".format(name))
+                running[name] = self._start_process(name)
+
+            threading.Thread(target=self._supervise,
+                             args=(running, stop),
+                             daemon=True).start()
 
         self.logger.info("Starting the router")
         threads.append(self.router.start)
         
         for name, part in self.inbound_components.items():
-            self.logger.info("Starting inbound part {}".format(name))
-            threads.append(part.start)
+            if not isinstance(part, RemotePart):
+                self.logger.info("Starting inbound part {}".format(name))
+                threads.append(part.start)
 
         for name, part in self.outbound_components.items():
-            self.logger.info("Starting outbound part {}".format(name))
-            threads.append(part.start)
+            if not isinstance(part, RemotePart):
+                self.logger.info("Starting outbound part {}".format(name))
+                threads.append(part.start)
+
+        for name, part in self.bypass_components.items():
+            if not isinstance(part, RemotePart):
+                self.logger.info("Starting bypass part {}".format(name))
+                threads.append(part.start)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(threads)) as executor:
+            results = [executor.submit(thread) for thread in threads]
+            for future in concurrent.futures.as_completed(results):
+                try:
+                    future.result()
+                except Exception as exc:
+                    self.logger.error('This is critical, one of the parts died')
+                    lines = traceback.format_exception(*sys.exc_info())
+                    for line in lines:
+                        self.logger.error(line.strip('\n'))
+
+        stop.set()
+        for process in running.values():
+            process.terminate()
+            process.join()
+
+        for name in ['inbound'] + list(self.outbound_components):
+            path = self._ipc_address(name)[len('ipc://'):]
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _external_socket(part):
+    """
+    Type of the socket that a part opens to the exterior, for the parts
+    that can be sharded.
+    """
+    if issubclass(part, SubConnection):
+        return zmq.SUB
+    elif issubclass(part, PullService):
+        return zmq.PULL
+    elif issubclass(part, PubService):
+        return zmq.PUB
+    elif issubclass(part, PushService):
+        return zmq.PUSH
+    else:
+        raise ValueError('Part {} can not be sharded'.format(part.__name__))
+
+
+def _start_shard(template, shard):
+    """
+    Entry point of the processes of a sharded server.
+    """
+    server = template.build_shard(shard)
+    server.start()
+
+
+class ShardedServerTemplate(object):
+    """
+    Low-level tool to build a server from parts, with ``shards`` copies of
+    the router and the parts that are connected to it. Each copy runs in
+    its own process, so the routing is not limited to a single core.
+
+    The main process keeps the external sockets. Inbound messages are sent
+    to a shard depending on their key, the pipeline by default, so the
+    messages of a pipeline are processed in order. Outbound messages from
+    all the shards are merged back. Bypass parts, like the cache service,
+    run only in the main process.
+
+    Parts are instantiated within each shard, so use the
+    :meth:`configure_shard` hook to modify them.
+
+    :param logging_level: A correct logging level from the logging module.
+        Defaults to INFO.
+    :param shards: Number of shards. Defaults to 2.
+    :param key: Function that gets a PalmMessage and returns the key that
+        selects the shard. It must be picklable.
+    :param router_window: Messages in flight allowed for each outbound part
+        of each shard. See :class:`ServerTemplate`.
+    :param ipc_dir: Directory for the sockets between the main process and
+        the shards. Defaults to the temporary directory.
+    :param zero_copy: Size in bytes from which the router of each shard
+        forwards the frames without copying them. See :class:`ServerTemplate`.
+    """
+    def __init__(self,
+                 logging_level=logging.INFO,
+                 shards=2,
+                 key=pipeline_key,
+                 router_window=0,
+                 ipc_dir=None,
+                 zero_copy=0):
+        # Name of the server
+        self.name = ''
+
+        # Logging level for the server
+        self.logging_level = logging_level
+
+        # Basic Key-value database for storage
+        self.cache = DictDB()
+
+        self.shards = shards
+        self.key = key
+        self.router_window = router_window
+        self.zero_copy = zero_copy
+        self.ipc_dir = ipc_dir if ipc_dir else tempfile.gettempdir()
+        self.uuid = str(uuid4())
+
+        self.inbound_components = {}
+        self.outbound_components = {}
+        self.bypass_components = {}
+
+        # Basic console logging
+        self.logger = console(name=self.name, level=self.logging_level)
+
+    def __getstate__(self):
+        # Bypass parts own sockets, and they stay in the main process.
+        state = self.__dict__.copy()
+        state['bypass_components'] = {}
+        return state
+
+    def shard_address(self, name, shard):
+        """
+        Address of the copy of a part in a shard.
+
+        :param name: Name of the part
+        :param shard: Index of the shard
+        """
+        return 'ipc://{}'.format(
+            os.path.join(self.ipc_dir,
+                         'pylm-{}-{}-{}'.format(self.uuid, name, shard))
+        )
+
+    def register_inbound(self, part, name='', listen_address='', route='',
+                         block=False, log='', **kwargs):
+        """
+        Register inbound part to this server. It is instantiated in each
+        shard.
+
+        :param part: part class. Only parts that pull or subscribe can be
+            sharded.
+        :param name: Name of the part
+        :param listen_address: Valid ZeroMQ address listening to the exterior
+        :param route: Outbound part it routes to
+        :param block: True if the part blocks waiting for a response
+        :param log: Log message in DEBUG level for each message processed.
+        :param kwargs: Additional keyword arguments to pass to the part
+        """
+        self.inbound_components[name] = {
+            'part': part,
+            'listen_address': listen_address,
+            'socket_type': _external_socket(part),
+            'route': route,
+            'block': block,
+            'log': log,
+            'kwargs': kwargs
+        }
+
+    def register_outbound(self, part, name='', listen_address='', route='',
+                          log='', **kwargs):
+        """
+        Register outbound part to this server. It is instantiated in each
+        shard.
+
+        :param part: part class. Only parts that push or publish can be
+            sharded.
+        :param name: Name of the part
+        :param listen_address: Valid ZeroMQ address listening to the exterior
+        :param route: Outbound part it routes the response (if there is) to
+        :param log: Log message in DEBUG level for each message processed
+        :param kwargs: Additional keyword arguments to pass to the part
+        """
+        self.outbound_components[name] = {
+            'part': part,
+            'listen_address': listen_address,
+            'socket_type': _external_socket(part),
+            'route': route,
+            'log': log,
+            'kwargs': kwargs
+        }
+
+    def register_bypass(self, part, name='', listen_address='', **kwargs):
+        """
+        Register a bypass part to this server. It runs in the main process.
+
+        :param part: part class
+        :param name: part name
+        :param listen_address: Valid ZeroMQ address listening to the exterior
+        :param kwargs: Additional keyword arguments to pass to the part
+        """
+        # Inject the server cache in case it is not configured for the component
+        if 'cache' not in kwargs:
+            kwargs['cache'] = self.cache
+
+        instance = part(name,
+                        listen_address,
+                        logger=self.logger,
+                        **kwargs)
+
+        self.bypass_components[name] = instance
+
+    def preset_cache(self, **kwargs):
+        """
+        Send the following keyword arguments as cache variables. Useful
+        for configuration variables that the workers or the clients
+        fetch straight from the cache.
+
+        :param kwargs:
+        """
+        for arg, val in kwargs.items():
+            if type(val) == str:
+                self.cache.set(arg, val.encode('utf-8'))
+            else:
+                self.cache.set(arg, val)
+
+    def configure_shard(self, server):
+        """
+        Hook to modify the parts of a shard once they are instantiated.
+
+        :param server: ServerTemplate of the shard
+        """
+        pass
+
+    def build_shard(self, shard):
+        """
+        Build the server template of a shard. Called within the process of
+        the shard.
+
+        :param shard: Index of the shard
+        :return: ServerTemplate
+        """
+        server = ServerTemplate(logging_level=self.logging_level,
+                                router_window=self.router_window,
+                                zero_copy=self.zero_copy)
+        server.name = self.name
+        server.cache = self.cache
+        server.router.cache = self.cache
+
+        for name, spec in self.inbound_components.items():
+            server.register_inbound(spec['part'],
+                                    name,
+                                    self.shard_address(name, shard),
+                                    route=spec['route'],
+                                    block=spec['block'],
+                                    log=spec['log'],
+                                    **spec['kwargs'])
+
+        for name, spec in self.outbound_components.items():
+            server.register_outbound(spec['part'],
+                                     name,
+                                     self.shard_address(name, shard),
+                                     route=spec['route'],
+                                     log=spec['log'],
+                                     **spec['kwargs'])
+
+        self.configure_shard(server)
+        return server
+
+    def start(self):
+        """
+        Start the shards, and the parts of the main process.
+        """
+        # Spawn, because forked processes can't use the zmq context.
+        context = multiprocessing.get_context('spawn')
+        processes = []
+        for shard in range(self.shards):
+            self.logger.info("Starting shard {}".format(shard))
+            processes.append(
+                context.Process(target=_start_shard,
+                                args=(self, shard),
+                                name='{}-{}'.format(self.name, shard))
+            )
+            processes[-1].start()
+
+        threads = []
+        for name, spec in self.inbound_components.items():
+            self.logger.info("Starting dispatcher for {}".format(name))
+            dispatcher = ShardDispatcher(
+                name,
+                spec['listen_address'],
+                [self.shard_address(name, shard)
+                 for shard in range(self.shards)],
+                socket_type=spec['socket_type'],
+                key=self.key,
+                previous=spec['kwargs'].get('previous', ''),
+                logger=self.logger)
+            threads.append(dispatcher.start)
+
+        for name, spec in self.outbound_components.items():
+            self.logger.info("Starting collector for {}".format(name))
+            collector = ShardCollector(
+                name,
+                spec['listen_address'],
+                [self.shard_address(name, shard)
+                 for shard in range(self.shards)],
+                socket_type=spec['socket_type'],
+                logger=self.logger)
+            threads.append(collector.start)
 
         for name, part in self.bypass_components.items():
             self.logger.info("Starting bypass part {}".format(name))
@@ -192,6 +800,10 @@ class ServerTemplate(object):
                     for line in lines:
                         self.logger.error(line.strip('\n'))
 
+        for process in processes:
+            process.terminate()
+            process.join()
+
 
 class BaseMaster(object):
     @staticmethod
@@ -18,10 +18,18 @@
 # connect, while services bind.
 from uuid import uuid4
 
-from pylm.parts.core import Inbound, Outbound,\
-    zmq_context, BypassInbound
+from pylm.parts.core import Inbound, Outbound, configure_socket,\
+    zmq_context, BypassInbound, answer_probes, pack, unpack_frames, \
+    recv_frames
 from pylm.parts.messages_pb2 import PalmMessage
+from pylm.parts.metrics import registry, size, Histogram
+from pylm.parts.sharedmem import SegmentPool, share, unshare
+from pylm.parts.tracing import record, hops
+from google.protobuf.message import DecodeError
 from http.server import HTTPServer, BaseHTTPRequestHandler
+from collections import deque
+import json
+import time
 import zmq
 import sys
 
@@ -36,13 +44,16 @@ class RepService(Inbound):
                  broker_address="inproc://broker",
                  logger=None,
                  cache=None,
-                 messages=sys.maxsize):
+                 messages=sys.maxsize,
+                 batch=1):
         """
         :param name: Name of the service
         :param listen_address: ZMQ socket address to bind to
         :param broker_address: ZMQ socket address of the broker
         :param logger: Logger instance
         :param messages: Maximum number of messages. Defaults to infinity
+        :param batch: Maximum number of scattered messages sent to the
+            broker in a single round trip.
         :return:
         """
         super(RepService, self).__init__(
@@ -54,7 +65,8 @@ class RepService(Inbound):
             bind=True,
             logger=logger,
             cache=cache,
-            messages=messages
+            messages=messages,
+            batch=batch
         )
 
 
@@ -68,13 +80,31 @@ class PullService(Inbound):
                  broker_address="inproc://broker",
                  logger=None,
                  cache=None,
-                 messages=sys.maxsize):
+                 messages=sys.maxsize,
+                 batch=1,
+                 batch_timeout=0,
+                 zero_copy=0,
+                 shared_memory=0,
+                 segments=None,
+                 hwm=None):
         """
         :param name: Name of the service
         :param listen_address: ZMQ socket address to bind to
         :param broker_address: ZMQ socket address of the broker
         :param logger: Logger instance
         :param messages: Maximum number of messages. Defaults to infinity.
+        :param batch: Maximum number of messages sent to the broker in a
+            single round trip. Defaults to 1, no batching.
+        :param batch_timeout: Milliseconds that an incomplete batch waits
+            for more messages.
+        :param zero_copy: Size in bytes from which the payloads are
+            forwarded without copying them. Defaults to 0, no zero-copy.
+        :param shared_memory: Size in bytes from which the payloads are
+            written in shared memory, and only a reference to them is
+            forwarded. Defaults to 0, no shared memory.
+        :param segments: SegmentPool that keeps the shared memory segments.
+        :param hwm: Messages that the socket queues. Defaults to None, the
+            ZMQ default.
         :return:
         """
         super(PullService, self).__init__(
@@ -86,8 +116,54 @@ class PullService(Inbound):
             bind=True,
             logger=logger,
             cache=cache,
-            messages=messages
+            messages=messages,
+            batch=batch,
+            batch_timeout=batch_timeout,
+            zero_copy=zero_copy,
+            hwm=hwm
         )
+        self.shared_memory = shared_memory
+        if shared_memory and segments is None:
+            segments = SegmentPool()
+        self.segments = segments
+
+    def _scatter(self, message, payload):
+        """
+        The payload is written once in shared memory, and all the scattered
+        messages without a payload of their own refer to it. The segment is
+        freed when the results of all of them are back.
+        """
+        if payload is not None:
+            data = payload.buffer
+        else:
+            data = message.payload
+
+        # The chunks of a stream are already small.
+        if not self.shared_memory or message.chunk or \
+                len(data) < self.shared_memory:
+            yield from super(PullService, self)._scatter(message, payload)
+            return
+
+        name = self.segments.put(data)
+        length = len(data)
+        message.payload = b''
+
+        try:
+            for scattered in self.scatter(message):
+                if scattered.payload:
+                    unshare(scattered)
+                else:
+                    self.segments.acquire(name)
+                    share(scattered, name, 0, length)
+
+                yield scattered, None
+        finally:
+            self.segments.release(name)
+
+    def cleanup(self):
+        super(PullService, self).cleanup()
+        if self.shared_memory:
+            self.segments.close()
 
 
 class PushService(Outbound):
@@ -100,13 +176,28 @@ class PushService(Outbound):
                  broker_address="inproc://broker",
                  logger=None,
                  cache=None,
-                 messages=sys.maxsize):
+                 messages=sys.maxsize,
+                 zero_copy=0,
+                 batch=1,
+                 batch_timeout=0,
+                 hwm=None,
+                 policy=None):
         """
         :param name: Name of the service
         :param listen_address: ZMQ socket address to bind to
         :param broker_address: ZMQ socket address of the broker
         :param logger: Logger instance
         :param messages: Maximum number of messages. Defaults to infinity.
+        :param zero_copy: Size in bytes from which the payloads are
+            forwarded without copying them. Defaults to 0, no zero-copy.
+        :param batch: Maximum number of messages pushed in a single
+            multipart message. Defaults to 1, no batching.
+        :param batch_timeout: Milliseconds that an incomplete batch waits
+            for more messages.
+        :param hwm: Messages that the socket queues for each worker.
+            Defaults to None, the ZMQ default.
+        :param policy: 'block' or 'drop' when the queues are full. Defaults
+            to None, the pushes block.
         :return:
         """
         super(PushService, self).__init__(
@@ -118,7 +209,12 @@ class PushService(Outbound):
             bind=True,
             logger=logger,
             cache=cache,
-            messages=messages
+            messages=messages,
+            zero_copy=zero_copy,
+            batch=batch,
+            batch_timeout=batch_timeout,
+            hwm=hwm,
+            policy=policy
         )
 
 
@@ -134,6 +230,15 @@ class PubService(Outbound):
     :param pipelined: Defaults to False. Pipelined if publishes to a
         server, False if publishes to a client.
     :param server: Name of the server, necessary to pipeline messages.
+    :param zero_copy: Size in bytes from which the payloads are forwarded
+        without copying them. Defaults to 0, no zero-copy.
+    :param hwm: Messages that the socket queues for each subscriber.
+        Defaults to None, the ZMQ default.
+    :param policy: 'block' to wait for the slow subscribers, or 'drop' to
+        drop their messages and count them in ``dropped``. Defaults to None,
+        the messages are dropped without counting them.
+
+    The socket is a XPUB, that answers the probes of the clients.
     """
     def __init__(self,
                  name,
@@ -143,17 +248,23 @@ class PubService(Outbound):
                  cache=None,
                  messages=sys.maxsize,
                  pipelined=False,
-                 server=None):
+                 server=None,
+                 zero_copy=0,
+                 hwm=None,
+                 policy=None):
         super(PubService, self).__init__(
             name,
             listen_address=listen_address,
-            socket_type=zmq.PUB,
+            socket_type=zmq.XPUB,
             reply=False,
             broker_address=broker_address,
             bind=True,
             logger=logger,
             cache=cache,
-            messages=messages
+            messages=messages,
+            zero_copy=zero_copy,
+            hwm=hwm,
+            policy=policy
         )
         self.name = server
         self.pipelined = pipelined
@@ -189,31 +300,50 @@ class PubService(Outbound):
         """
         Call this function to start the component
         """
-        message = PalmMessage()
-
         self.listen_to.bind(self.listen_address)
         self.logger.info('{} successfully started'.format(self.name))
 
-        for i in range(self.messages):
-            self.logger.debug('{} blocked waiting for broker'.format(self.name))
-            message_data = self.broker.recv()
-            self.logger.debug('{} Got message from broker'.format(self.name))
-            message_data = self._translate_from_broker(message_data)
-            message.ParseFromString(message_data)
-
-            for scattered in self.scatter(message):
-                topic, scattered = self.handle_stream(scattered)
-                self.listen_to.send_multipart([topic.encode('utf-8'),
-                                               message.SerializeToString()])
-                self.logger.debug('Component {} Sent message. Topic {}'.format(
-                    self.name, topic))
+        poller = zmq.Poller()
+        poller.register(self.broker, zmq.POLLIN)
+        poller.register(self.listen_to, zmq.POLLIN)
 
-                if self.reply:
-                    feedback = self.listen_to.recv()
-                    feedback = self._translate_to_broker(feedback)
-                    self.handle_feedback(feedback)
+        for i in range(self.messages):
+            self.logger.debug('%s blocked waiting for broker', self.name)
+            # The probes get an answer even if the broker is never idle
+            while True:
+                sockets = dict(poller.poll())
+                if self.listen_to in sockets:
+                    answer_probes(self.listen_to)
+                if self.broker in sockets:
+                    break
+
+            # More than one message if the inbound part sends batches
+            frames = recv_frames(self.broker, self.zero_copy)
+            started = time.monotonic()
+            for message, payload in unpack_frames(frames):
+                self.logger.debug('%s Got message from broker', self.name)
+                self.metrics.inc('messages_in')
+                message = self._translate_from_broker(message)
+                if message.trace:
+                    # The name of the part, the one of the server is the topic
+                    record(message, self.metrics.name, 'out')
+
+                for scattered in self.scatter(message):
+                    topic, scattered = self.handle_stream(scattered)
+                    packed = [topic.encode('utf-8')] + pack(message, payload)
+                    if self._send(self.listen_to, packed):
+                        self.metrics.inc('messages_out')
+                        self.metrics.inc('bytes_out', size(packed))
+                    self.logger.debug('Component %s Sent message. Topic %s',
+                                      self.name, topic)
+
+                    if self.reply:
+                        feedback = self.listen_to.recv()
+                        feedback = self._translate_to_broker(feedback)
+                        self.handle_feedback(feedback)
 
             self.broker.send(self.reply_feedback())
+            self.metrics.observe('latency', time.monotonic() - started)
 
         return self.name
 
@@ -222,14 +352,265 @@ class WorkerPushService(PushService):
     """
     This is a particular push service that does not modify the messages that
     the broker sends.
+
+    :param name: Name of the service
+    :param listen_address: ZMQ socket address to bind to
+    :param broker_address: ZMQ socket address of the broker
+    :param logger: Logger instance
+    :param messages: Maximum number of messages. Defaults to infinity.
+    :param zero_copy: Size in bytes from which the payloads are forwarded
+        without copying them. Defaults to 0, no zero-copy.
+    :param stream_address: ZMQ socket address to bind the ROUTER socket
+        the chunks of the streams are sent through. Defaults to None, no
+        streams.
+    :param batch: Maximum number of messages that a worker gets at once.
+        Defaults to 1, no batching.
+    :param batch_timeout: Milliseconds that an incomplete batch waits for
+        more messages.
+    :param credits: True to bind a ROUTER socket instead of a PUSH socket,
+        and send the messages only to the workers with free slots. Defaults
+        to False, the messages are pushed in turns.
+    :param tasks: TaskTracker shared with the WorkerPullService, to send
+        again the tasks that are stragglers. Defaults to None.
+    :param speculate_interval: Milliseconds between two searches of
+        stragglers. Defaults to 100.
+    :param drain_timeout: Milliseconds that the service waits for the
+        results of the last tasks, after the last message, before it drops
+        them. Defaults to 10000.
+
+    All the chunks of a stream go to the same worker. Each new stream goes
+    to the worker with the fewest streams in progress. The chunks are never
+    batched.
+
+    With credits, the workers connect a DEALER socket and send the number of
+    free slots they have, once when they connect and then once for each
+    message they process. Each message, or each batch, goes to the worker
+    with most free slots, and the service waits if none has any.
+
+    With a task tracker, each message gets an id in its ``task`` field, and
+    the tasks that take longer than the rest of the tasks of the same
+    function are sent again, once, to the next worker.
     """
+    def __init__(self,
+                 name,
+                 listen_address,
+                 broker_address="inproc://broker",
+                 logger=None,
+                 cache=None,
+                 messages=sys.maxsize,
+                 zero_copy=0,
+                 stream_address=None,
+                 batch=1,
+                 batch_timeout=0,
+                 credits=False,
+                 tasks=None,
+                 speculate_interval=100,
+                 drain_timeout=10000,
+                 hwm=None,
+                 policy=None):
+        super(WorkerPushService, self).__init__(
+            name,
+            listen_address,
+            broker_address=broker_address,
+            logger=logger,
+            cache=cache,
+            messages=messages,
+            zero_copy=zero_copy,
+            batch=batch,
+            batch_timeout=batch_timeout,
+            hwm=hwm,
+            policy=policy
+        )
+        # Free slots of each worker
+        self.credits = credits
+        self.worker_credits = {}
+
+        if credits:
+            self.listen_to.close()
+            self.listen_to = zmq_context.socket(zmq.ROUTER)
+            self.listen_to.setsockopt(zmq.ROUTER_MANDATORY, 1)
+            configure_socket(self.listen_to, hwm, policy)
+
+        self.tasks = tasks
+        self.speculate_interval = speculate_interval
+        self.drain_timeout = drain_timeout
+        self.next_speculation = 0
+
+        self.stream_address = stream_address
+        self.stream_socket = None
+
+        # Streams in progress of each worker, and worker of each stream.
+        self.stream_workers = {}
+        self.streams = {}
+
+        if stream_address:
+            self.stream_socket = zmq_context.socket(zmq.ROUTER)
+            self.stream_socket.setsockopt(zmq.ROUTER_MANDATORY, 1)
+
+    def _register_stream_workers(self, wait=False):
+        """
+        Registers the workers that said they are ready to get streams.
+
+        :param wait: Block until one worker is registered at least.
+        """
+        if wait and not self.stream_workers:
+            self.logger.warning(
+                '{} waiting for workers that get streams'.format(self.name))
+            self.stream_socket.poll()
+
+        while self.stream_socket.poll(0):
+            worker = self.stream_socket.recv_multipart()[0]
+            self.stream_workers.setdefault(worker, 0)
+
+    def _stream_worker(self):
+        """
+        Picks the worker for a new stream, the one with the fewest streams in
+        progress. The one picked goes last, so ties are resolved in turns.
+        """
+        self._register_stream_workers(wait=True)
+        worker = min(self.stream_workers, key=self.stream_workers.get)
+        self.stream_workers[worker] = self.stream_workers.pop(worker) + 1
+        return worker
+
+    def _send_chunk(self, message, frames):
+        """
+        Sends a chunk to the worker of its stream.
+
+        :param message: PalmMessage
+        :param frames: Frames of the message
+        """
+        if message.id in self.streams:
+            worker = self.streams[message.id]
+        else:
+            worker = self._stream_worker()
+            self.streams[message.id] = worker
+
+        try:
+            self.stream_socket.send_multipart([worker] + frames)
+        except zmq.ZMQError:
+            self.logger.error(
+                '{} worker of stream {} is gone'.format(self.name, message.id))
+            self.stream_workers.pop(worker, None)
+            # A new stream can still go to another worker.
+            if message.chunk == 1:
+                del self.streams[message.id]
+                return self._send_chunk(message, frames)
+
+        if message.last:
+            del self.streams[message.id]
+            if worker in self.stream_workers:
+                self.stream_workers[worker] -= 1
+
+    def _read_credits(self):
+        """
+        Adds the free slots that the workers sent.
+        """
+        while self.listen_to.poll(0):
+            worker, credits = self.listen_to.recv_multipart()
+            self.worker_credits[worker] = \
+                self.worker_credits.get(worker, 0) + int(credits)
+
+    def _credit_worker(self, messages):
+        """
+        Picks the worker with most free slots, and waits for one if none
+        has any. The one picked goes last, so ties are resolved in turns.
+
+        :param messages: Number of slots that the worker takes
+        """
+        self._read_credits()
+        while not any(credits > 0 for credits in self.worker_credits.values()):
+            self.logger.debug('%s waiting for free workers', self.name)
+            self.listen_to.poll()
+            self._read_credits()
+
+        worker = max(self.worker_credits, key=self.worker_credits.get)
+        self.worker_credits[worker] = self.worker_credits.pop(worker) - messages
+        return worker
+
+    def _push(self, frames, messages=1):
+        if not self.credits:
+            return super(WorkerPushService, self)._push(frames, messages)
+
+        while True:
+            worker = self._credit_worker(messages)
+            try:
+                if not self._send(self.listen_to, [worker] + frames,
+                                  messages):
+                    # The worker won't send back the slots of the messages
+                    # it did not get.
+                    self.worker_credits[worker] += messages
+                return
+            except zmq.ZMQError:
+                self.logger.error('{} worker is gone'.format(self.name))
+                self.worker_credits.pop(worker, None)
+
+    def _send_outbound(self, message, frames):
+        if message.chunk and self.stream_socket:
+            self._send_chunk(message, frames)
+        else:
+            if self.tasks is not None and message.task:
+                self.tasks.start(message.task, message.function, frames,
+                                 message.segment)
+            super(WorkerPushService, self)._send_outbound(message, frames)
+
+    def _speculate(self):
+        """
+        Sends again the tasks that are stragglers, at most once every
+        speculation interval.
+        """
+        now = time.monotonic()
+        if now < self.next_speculation:
+            return
+
+        self.next_speculation = now + self.speculate_interval / 1000
+        for frames in self.tasks.stragglers():
+            self.logger.debug('%s sending a straggler again', self.name)
+            self._push(frames)
+
+    def _wait_for_broker(self):
+        super(WorkerPushService, self)._wait_for_broker()
+
+        if self.tasks is not None:
+            self._speculate()
+            while not self.broker.poll(self.speculate_interval):
+                self._speculate()
+
+    def start(self):
+        if self.stream_socket:
+            self.stream_socket.bind(self.stream_address)
+
+        name = super(WorkerPushService, self).start()
+
+        # The last tasks may still be stragglers, but their workers may be
+        # gone too.
+        if self.tasks is not None:
+            deadline = time.monotonic() + self.drain_timeout / 1000
+            while len(self.tasks) and time.monotonic() < deadline:
+                self._speculate()
+                time.sleep(self.speculate_interval / 1000)
+
+            dropped = self.tasks.drop()
+            if dropped:
+                self.logger.warning(
+                    '{} dropped {} tasks without a result'.format(
+                        self.name, dropped))
+
+        return name
+
+    def cleanup(self):
+        super(WorkerPushService, self).cleanup()
+        if self.stream_socket:
+            self.stream_socket.close()
+
     def _translate_from_broker(self, message_data):
         """
         See help of parent
         :param message_data:
         :return:
         """
-        self.logger.debug('{} translating from broker'.format(self.name))
+        self.logger.debug('%s translating from broker', self.name)
+        if self.tasks is not None and not message_data.chunk:
+            message_data.task = str(uuid4())
         return message_data
 
     def _translate_to_broker(self, message_data):
@@ -244,14 +625,35 @@ class WorkerPushService(PushService):
 class WorkerPullService(PullService):
     """
     This is a particular pull service that does not modify the messages that
-    the broker sends.
+    the broker sends. If it shares the pool of segments with the part that
+    writes the payloads in shared memory, it releases the segment of each
+    result that gets back. If it shares a task tracker with the
+    WorkerPushService, only the first result of each task goes on.
     """
+    def __init__(self, *args, tasks=None, **kwargs):
+        super(WorkerPullService, self).__init__(*args, **kwargs)
+        self.tasks = tasks
+
+    def _scatter(self, message, payload):
+        if self.tasks is not None and message.task and \
+                not self.tasks.finish(message.task):
+            self.logger.debug('%s discarded a repeated result', self.name)
+            if message.segment and self.segments is not None:
+                self.segments.release(message.segment)
+            return
+
+        yield from super(WorkerPullService, self)._scatter(message, payload)
+
     def _translate_to_broker(self, message_data):
         """
         See help of parent
         :param message_data:
         :return:
         """
+        if message_data.segment and self.segments is not None:
+            self.segments.release(message_data.segment)
+            unshare(message_data)
+
         return message_data
 
     def _translate_from_broker(self, message_data):
@@ -342,9 +744,9 @@ class PushPullService(object):
         self.broker.send(initial_message.SerializeToString())
 
         for i in range(self.messages):
-            self.logger.debug('{} blocked waiting for broker'.format(self.name))
+            self.logger.debug('%s blocked waiting for broker', self.name)
             message_data = self.broker.recv()
-            self.logger.debug('Got message {} from broker'.format(i))
+            self.logger.debug('Got message %s from broker', i)
             message.ParseFromString(message_data)
 
             for scattered in self.scatter(message):
@@ -468,13 +870,16 @@ class HttpService(Inbound):
 
 class CacheService(RepBypassService):
     """
-    Cache service for clients and workers
+    Cache service for clients and workers. Besides the instructions to set,
+    get and delete keys, the 'stats' instruction returns the metrics of the
+    parts that run in the process of the service, as JSON.
     """
     def recv(self):
         message_data = self.listen_to.recv()
         message = PalmMessage()
         message.ParseFromString(message_data)
         instruction = message.function.split('.')[1]
+        self.metrics.inc('messages_in')
 
         if instruction == 'set':
             if message.cache:
@@ -482,34 +887,157 @@ class CacheService(RepBypassService):
             else:
                 key = str(uuid4())
 
-            self.logger.debug('Cache Service: Set key {}'.format(key))
+            self.logger.debug('Cache Service: Set key %s', key)
             value = message.payload
             self.cache.set(key, value)
             return_value = key.encode('utf-8')
 
         elif instruction == 'get':
             key = message.payload.decode('utf-8')
-            self.logger.debug('Cache Service: Get key {}'.format(key))
+            self.logger.debug('Cache Service: Get key %s', key)
             value = self.cache.get(key)
             if not value:
                 self.logger.error('key {} not present'.format(key))
+                self.metrics.inc('misses')
                 return_value = b''
             else:
+                self.metrics.inc('hits')
                 return_value = value
 
         elif instruction == 'delete':
             key = message.payload.decode('utf-8')
-            self.logger.debug('Cache Service: Delete key {}'.format(key))
+            self.logger.debug('Cache Service: Delete key %s', key)
             self.cache.delete(key)
             return_value = key.encode('utf-8')
 
+        elif instruction == 'stats':
+            self.logger.debug('Cache Service: Stats')
+            return_value = json.dumps(registry.snapshot()).encode('utf-8')
+
         else:
             self.logger.error(
                 'Cache {}:Key not found in the database'.format(self.name)
             )
+            self.metrics.inc('errors')
             return_value = b''
 
         if isinstance(return_value, str):
             self.listen_to.send_string(return_value)
         else:
             self.listen_to.send(return_value)
+
+
+class MetricsService(object):
+    """
+    Bypass part that serves the metrics of the parts that run in its
+    process, in the text format of Prometheus, on any path of an HTTP
+    server.
+
+    :param name: Name of the part
+    :param listen_address: Address of the HTTP server, like
+        'http://127.0.0.1:9100' or '127.0.0.1:9100'
+    :param logger: Logger instance
+    :param cache: Cache of the server. Not used.
+    :param messages: Number of requests before the part stops. Defaults
+        to infinity.
+    :param metrics: Registry with the metrics. Defaults to the one of the
+        process.
+    """
+    def __init__(self, name, listen_address, logger=None, cache=None,
+                 messages=sys.maxsize, metrics=None):
+        self.name = name.encode('utf-8')
+        self.listen_address = listen_address
+        self.logger = logger
+        self.cache = cache
+        self.messages = messages
+        self.registry = metrics if metrics is not None else registry
+
+        hostname, colon, port = listen_address.split('://')[-1].rpartition(':')
+        if not colon:
+            raise ValueError('The address of the metrics service needs a port')
+
+        self.server = HTTPServer((hostname, int(port)), self._make_handler())
+
+    def _make_handler(self):
+        metrics = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return MetricsHandler
+
+    def start(self):
+        self.logger.info('{} serving metrics at {}'.format(
+            self.name, self.listen_address))
+        for i in range(self.messages):
+            self.server.handle_request()
+
+        return self.name
+
+    def cleanup(self):
+        self.server.server_close()
+
+
+class TraceService(BypassInbound):
+    """
+    Bypass part that collects the traced messages that the clients send
+    once they get their results, and keeps the latency of each hop between
+    two consecutive events of the messages.
+
+    :param name: Name of the part
+    :param listen_address: ZMQ address the clients push the traces to
+    :param logger: Logger instance
+    :param cache: Cache of the server. Not used.
+    :param messages: Number of traces before the part stops. Defaults to
+        infinity.
+    :param window: Number of traces that are kept. Defaults to 1000.
+    """
+    def __init__(self, name, listen_address, logger=None, cache=None,
+                 messages=sys.maxsize, window=1000):
+        super(TraceService, self).__init__(name, listen_address, zmq.PULL,
+                                           reply=False, bind=True,
+                                           logger=logger, cache=cache,
+                                           messages=messages)
+        self.traces = deque(maxlen=window)
+        self.hops = {}
+
+    def recv(self, reply_data=None):
+        message = PalmMessage()
+        try:
+            message.ParseFromString(self.listen_to.recv())
+        except DecodeError:
+            self.logger.error('Trace could not be decoded')
+            self.metrics.inc('errors')
+            return
+
+        self.metrics.inc('messages_in')
+        trace = hops(message)
+        self.traces.append((message.trace, trace))
+        for hop, seconds in trace:
+            if hop not in self.hops:
+                self.hops[hop] = Histogram()
+            self.hops[hop].record(seconds)
+
+        if trace:
+            self.logger.debug('Trace %s took %.6f s', message.trace,
+                              message.trace_times[-1] - message.trace_times[0])
+
+    def breakdown(self):
+        """
+        Latency of each hop of the traces, as in
+        :meth:`pylm.parts.metrics.Histogram.summary`.
+
+        :return: Dictionary by hop, like 'Pull.in -> WorkerPush.out'
+        """
+        return {hop: histogram.summary()
+                for hop, histogram in list(self.hops.items())}
@@ -0,0 +1,199 @@
+# Pylm, a framework to build components for high performance distributed
+# applications. Copyright (C) 2016 NFQ Solutions
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Parts that sit at the edge of a sharded server. They own the external
+# sockets, and connect them with the copies of the parts that run in each
+# shard.
+from pylm.parts.core import zmq_context, answer_probes
+from pylm.parts.messages_pb2 import PalmMessage
+from google.protobuf.message import DecodeError
+import zlib
+import zmq
+import sys
+
+
+def pipeline_key(message):
+    """
+    Default sharding key. All the messages of the same pipeline go to the
+    same shard, which keeps them in order.
+
+    :param message: PalmMessage
+    :return: The key as a string
+    """
+    return message.pipeline
+
+
+class ShardDispatcher(object):
+    """
+    Part that listens to the external socket of an inbound part, and sends
+    each message to the copy of the part in one of the shards. Messages with
+    the same key always go to the same shard.
+
+    :param name: Name of the part
+    :param listen_address: ZMQ address of the external socket
+    :param shard_addresses: ZMQ addresses of the part in each shard
+    :param socket_type: Type of the external socket. zmq.PULL or zmq.SUB
+    :param key: Function that gets a PalmMessage and returns the key
+    :param previous: Topic to subscribe to if the socket is zmq.SUB
+    :param logger: Logger instance
+    :param messages: Maximum number of inbound messages. Defaults to infinity.
+    """
+    def __init__(self,
+                 name,
+                 listen_address,
+                 shard_addresses,
+                 socket_type=zmq.PULL,
+                 key=pipeline_key,
+                 previous='',
+                 logger=None,
+                 messages=sys.maxsize):
+        self.name = name.encode('utf-8')
+        self.listen_to = zmq_context.socket(socket_type)
+        self.listen_address = listen_address
+        self.socket_type = socket_type
+        self.shards = []
+
+        if socket_type == zmq.SUB:
+            self.listen_to.setsockopt_string(zmq.SUBSCRIBE, previous)
+            self.listen_to.connect(listen_address)
+            # The copies of the part in the shards are subscribed too.
+            for address in shard_addresses:
+                self.shards.append(zmq_context.socket(zmq.PUB))
+                self.shards[-1].bind(address)
+
+        elif socket_type == zmq.PULL:
+            self.listen_to.bind(listen_address)
+            for address in shard_addresses:
+                self.shards.append(zmq_context.socket(zmq.PUSH))
+                self.shards[-1].connect(address)
+
+        else:
+            raise ValueError('Only PULL and SUB sockets can be sharded')
+
+        self.key = key
+        self.logger = logger
+        self.messages = messages
+
+    def select_shard(self, message):
+        """
+        Shard that gets the message. The hash must be the same in every
+        process, so the built-in hash for strings can't be used.
+
+        :param message: PalmMessage
+        :return: Index of the shard
+        """
+        key = self.key(message)
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+
+        return zlib.crc32(key) % len(self.shards)
+
+    def start(self):
+        message = PalmMessage()
+        self.logger.info('{} successfully started'.format(self.name))
+
+        for i in range(self.messages):
+            frames = self.listen_to.recv_multipart()
+
+            # The topic comes first in messages from a SUB socket. The
+            # payload may come after the rest of the message.
+            try:
+                if self.socket_type == zmq.SUB:
+                    message.ParseFromString(frames[1])
+                else:
+                    message.ParseFromString(frames[0])
+            except DecodeError:
+                self.logger.error('{} Message could not be decoded'.format(
+                    self.name))
+                continue
+
+            self.shards[self.select_shard(message)].send_multipart(frames)
+
+        return self.name
+
+    def cleanup(self):
+        self.listen_to.close()
+        for socket in self.shards:
+            socket.close()
+
+
+class ShardCollector(object):
+    """
+    Part that collects the messages that the copies of an outbound part send
+    from each shard, and forwards them to the external socket.
+
+    :param name: Name of the part
+    :param listen_address: ZMQ address of the external socket
+    :param shard_addresses: ZMQ addresses of the part in each shard
+    :param socket_type: Type of the external socket. zmq.PUSH or zmq.PUB
+    :param logger: Logger instance
+    :param messages: Maximum number of outbound messages. Defaults to infinity.
+    """
+    def __init__(self,
+                 name,
+                 listen_address,
+                 shard_addresses,
+                 socket_type=zmq.PUSH,
+                 logger=None,
+                 messages=sys.maxsize):
+        self.name = name.encode('utf-8')
+        self.listen_address = listen_address
+        self.socket_type = socket_type
+
+        if socket_type == zmq.PUB:
+            # Subscribed to everything, so the subscriptions of the clients
+            # are only filtered here and don't have to reach the shards.
+            # The probes of the clients are answered here too.
+            self.listen_to = zmq_context.socket(zmq.XPUB)
+            self.shards = zmq_context.socket(zmq.SUB)
+            self.shards.setsockopt_string(zmq.SUBSCRIBE, '')
+        elif socket_type == zmq.PUSH:
+            self.listen_to = zmq_context.socket(zmq.PUSH)
+            self.shards = zmq_context.socket(zmq.PULL)
+        else:
+            raise ValueError('Only PUSH and PUB sockets can be sharded')
+
+        self.listen_to.bind(listen_address)
+        for address in shard_addresses:
+            self.shards.connect(address)
+
+        self.logger = logger
+        self.messages = messages
+
+    def start(self):
+        self.logger.info('{} successfully started'.format(self.name))
+
+        poller = zmq.Poller()
+        poller.register(self.shards, zmq.POLLIN)
+        if self.socket_type == zmq.PUB:
+            poller.register(self.listen_to, zmq.POLLIN)
+
+        for i in range(self.messages):
+            # The probes get an answer even if the shards are never idle
+            while True:
+                sockets = dict(poller.poll())
+                if self.listen_to in sockets:
+                    answer_probes(self.listen_to)
+                if self.shards in sockets:
+                    break
+
+            self.listen_to.send_multipart(self.shards.recv_multipart())
+
+        return self.name
+
+    def cleanup(self):
+        self.listen_to.close()
+        self.shards.close()
@@ -0,0 +1,192 @@
+# Pylm, a framework to build components for high performance distributed
+# applications. Copyright (C) 2016 NFQ Solutions
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Payloads in shared memory, for workers that run in the same host as the
+# master. The payload is written once in a segment, and the messages only
+# carry the name of the segment, the offset and the length.
+from multiprocessing import shared_memory
+from google.protobuf.message import DecodeError
+import threading
+import mmap
+import os
+
+try:
+    import _posixshmem
+except ImportError:
+    _posixshmem = None
+
+
+class SegmentPool(object):
+    """
+    Shared memory segments created by a server, with the number of messages
+    that refer to each one. A segment is freed when its last reference is
+    released.
+
+    The pool is only shared by parts that run in the same process.
+    """
+    def __init__(self):
+        self.segments = {}
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        # Only needed to send the pool to the process of the parts, before
+        # any segment is created.
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def __len__(self):
+        return len(self.segments)
+
+    def put(self, payload):
+        """
+        Writes a payload in a new segment, with one reference that belongs
+        to the caller.
+
+        :param payload: Bytes, or any object with the buffer protocol
+        :return: Name of the segment
+        """
+        payload = memoryview(payload).cast('B')
+        segment = shared_memory.SharedMemory(create=True,
+                                             size=max(len(payload), 1))
+        segment.buf[:len(payload)] = payload
+
+        with self.lock:
+            self.segments[segment.name] = [segment, 1]
+
+        return segment.name
+
+    def acquire(self, name):
+        """
+        Adds a reference to a segment.
+
+        :param name: Name of the segment
+        """
+        with self.lock:
+            self.segments[name][1] += 1
+
+    def release(self, name):
+        """
+        Removes a reference to a segment, and frees it if it was the last one.
+        Segments that are not in the pool are ignored.
+
+        :param name: Name of the segment
+        """
+        with self.lock:
+            if name not in self.segments:
+                return
+
+            self.segments[name][1] -= 1
+            if self.segments[name][1] > 0:
+                return
+
+            segment = self.segments.pop(name)[0]
+
+        segment.close()
+        segment.unlink()
+
+    def close(self):
+        """
+        Frees all the segments, referenced or not.
+        """
+        with self.lock:
+            segments = [segment for segment, refs in self.segments.values()]
+            self.segments = {}
+
+        for segment in segments:
+            segment.close()
+            segment.unlink()
+
+
+def read(name, offset, length):
+    """
+    Copies a payload from a segment created by another process.
+    DecodeError is raised if the segment does not exist, for instance
+    because the process that reads it does not run in the same host.
+
+    :param name: Name of the segment
+    :param offset: Position of the payload in the segment
+    :param length: Length of the payload in bytes
+    :return: Payload
+    """
+    try:
+        if _posixshmem is None:
+            segment = shared_memory.SharedMemory(name=name)
+            try:
+                with segment.buf[offset:offset + length] as view:
+                    return bytes(view)
+            finally:
+                segment.close()
+
+        # Opened without SharedMemory, that would register the segment in
+        # the resource tracker as if it belonged to this process.
+        fd = _posixshmem.shm_open('/' + name, os.O_RDONLY, mode=0o600)
+        try:
+            with mmap.mmap(fd, 0, prot=mmap.PROT_READ) as segment:
+                return segment[offset:offset + length]
+        finally:
+            os.close(fd)
+
+    except OSError as error:
+        raise DecodeError('Shared memory segment {} not available: {}'.format(
+            name, error))
+
+
+def share(message, name, offset, length):
+    """
+    Points a message to a payload in shared memory. The payload of the
+    message is cleared.
+
+    :param message: PalmMessage
+    :param name: Name of the segment
+    :param offset: Position of the payload in the segment
+    :param length: Length of the payload in bytes
+    :return: The same message
+    """
+    message.payload = b''
+    message.segment = name
+    message.offset = offset
+    message.length = length
+    return message
+
+
+def load(message):
+    """
+    Copies the payload of a message from shared memory, if it is there.
+    The segment stays in the message, so the server that created it knows
+    that it can be released when the result comes back.
+
+    :param message: PalmMessage
+    :return: The same message
+    """
+    if message.segment and not message.payload:
+        message.payload = read(message.segment, message.offset, message.length)
+
+    return message
+
+
+def unshare(message):
+    """
+    Removes the reference to shared memory from a message.
+
+    :param message: PalmMessage
+    :return: The same message
+    """
+    message.ClearField('segment')
+    message.ClearField('offset')
+    message.ClearField('length')
+    return message
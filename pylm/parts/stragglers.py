@@ -0,0 +1,172 @@
+# Pylm, a framework to build components for high performance distributed
+# applications. Copyright (C) 2016 NFQ Solutions
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Tracking of the tasks that a master sends to its workers, to send again
+# the ones that take much longer than the rest of the tasks of the same
+# function, and to keep only the first result of each task.
+from collections import deque
+import threading
+import time
+
+
+class TaskTracker(object):
+    """
+    Tasks sent to the workers and not finished yet, and latencies of the
+    last tasks of each function. A task is a straggler when it takes longer
+    than ``factor`` times the given percentile of the latencies of its
+    function.
+
+    The tracker is shared by the part that sends the tasks and the part
+    that gets the results, so they must run in the same process.
+
+    :param percentile: Percentile of the latencies, like 99
+    :param factor: Multiplier of the percentile. Defaults to 1.
+    :param min_samples: Latencies of a function needed before any of its
+        tasks is a straggler. Defaults to 20.
+    :param window: Latencies of each function that are kept. Defaults to
+        1000.
+    :param segments: SegmentPool of the payloads in shared memory. A task
+        sent again takes one more reference to its segment.
+    :param expire: Seconds that a task sent twice waits for its second
+        result after it was sent again. Defaults to 60.
+    """
+    def __init__(self, percentile, factor=1.0, min_samples=20, window=1000,
+                 segments=None, expire=60):
+        if not 0 < percentile < 100:
+            raise ValueError('The percentile must be between 0 and 100')
+
+        self.percentile = percentile
+        self.factor = factor
+        self.min_samples = min_samples
+        self.window = window
+        self.segments = segments
+        self.expire = expire
+        self.lock = threading.Lock()
+
+        # Task id -> (start time, function, frames, segment)
+        self.pending = {}
+        self.latencies = {}
+        # Tasks sent twice, whose second result has to be discarded, and
+        # when they were sent again
+        self.speculated = {}
+
+    def __getstate__(self):
+        # Only needed to send the tracker to the process of the parts,
+        # before any task is sent.
+        return {key: value for key, value in self.__dict__.items()
+                if key != 'lock'}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def start(self, task, function, frames, segment=''):
+        """
+        Records a task that is sent to a worker.
+
+        :param task: Id of the task
+        :param function: Function that the task calls
+        :param frames: Frames of the message, to send them again
+        :param segment: Shared memory segment of the payload, if any
+        """
+        with self.lock:
+            self.pending[task] = (time.monotonic(), function, frames, segment)
+
+    def finish(self, task):
+        """
+        Records the result of a task.
+
+        :param task: Id of the task
+        :return: False if the task already had a result, True otherwise
+        """
+        with self.lock:
+            if task not in self.pending:
+                if task in self.speculated:
+                    del self.speculated[task]
+                    return False
+                return True
+
+            start, function, frames, segment = self.pending.pop(task)
+            self.latencies.setdefault(
+                function, deque(maxlen=self.window)).append(
+                time.monotonic() - start)
+            return True
+
+    def threshold(self, function):
+        """
+        Time in seconds from which a task of the function is a straggler,
+        or None if there are not enough latencies yet.
+
+        :param function: Function of the tasks
+        """
+        latencies = self.latencies.get(function, ())
+        if len(latencies) < self.min_samples:
+            return None
+
+        ordered = sorted(latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index] * self.factor
+
+    def stragglers(self):
+        """
+        Tasks that are stragglers and were not sent again yet. They are
+        recorded as sent again. The tasks sent twice that had their first
+        result but still wait for the second one after ``expire`` seconds
+        are forgotten, since the worker of the copy may be gone.
+
+        :return: List with the frames of the messages of the tasks
+        """
+        now = time.monotonic()
+        found = []
+        with self.lock:
+            for task, sent in list(self.speculated.items()):
+                if task not in self.pending and now - sent > self.expire:
+                    del self.speculated[task]
+
+            thresholds = {}
+            for task, (start, function, frames, segment) in \
+                    self.pending.items():
+                if task in self.speculated:
+                    continue
+
+                if function not in thresholds:
+                    thresholds[function] = self.threshold(function)
+
+                threshold = thresholds[function]
+                if threshold is not None and now - start > threshold:
+                    self.speculated[task] = now
+                    if segment and self.segments is not None:
+                        self.segments.acquire(segment)
+                    found.append(frames)
+
+        return found
+
+    def drop(self):
+        """
+        Forgets the tasks that have no result yet. The second results of the
+        tasks sent twice that already had one are still discarded.
+
+        :return: Number of tasks that had no result yet
+        """
+        with self.lock:
+            dropped = len(self.pending)
+            for task in self.pending:
+                self.speculated.pop(task, None)
+            self.pending.clear()
+            return dropped
@@ -0,0 +1,85 @@
+# Pylm, a framework to build components for high performance distributed
+# applications. Copyright (C) 2016 NFQ Solutions
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Tracing of sampled messages. The client gives a trace id to a fraction of
+# its messages, and every part that handles a message with a trace id
+# appends an event to it. The messages without a trace id cost a single
+# check of the field.
+from uuid import uuid4
+import random
+import time
+
+
+def sample(message, rate):
+    """
+    Gives a trace id to the message with the given probability, and
+    records that the client sent it.
+
+    :param message: PalmMessage
+    :param rate: Fraction of the messages that are traced, from 0 to 1
+    :return: True if the message is traced
+    """
+    if rate >= 1 or random.random() < rate:
+        message.trace = uuid4().hex
+        record(message, 'client', 'sent')
+        return True
+
+    return False
+
+
+def record(message, part, event):
+    """
+    Appends an event to a traced message. The time is the monotonic clock
+    of the host, so the times of the parts that run in different hosts
+    can't be compared.
+
+    :param message: PalmMessage with a trace id
+    :param part: Name of the part, or of the server, as str or bytes
+    :param event: Name of the event, like 'in' or 'out'
+    """
+    if isinstance(part, bytes):
+        part = part.decode('utf-8')
+
+    message.trace_parts.append(part)
+    message.trace_events.append(event)
+    message.trace_times.append(time.monotonic())
+
+
+def events(message):
+    """
+    Events of a traced message.
+
+    :param message: PalmMessage
+    :return: List of tuples (part, event, time)
+    """
+    return list(zip(message.trace_parts, message.trace_events,
+                    message.trace_times))
+
+
+def hops(message):
+    """
+    Time between each pair of consecutive events of a traced message.
+
+    :param message: PalmMessage
+    :return: List of tuples (hop, seconds). The hop is a string like
+        'Pull.in -> WorkerPush.out'.
+    """
+    steps = ['{}.{}'.format(part, event) for part, event in zip(
+        message.trace_parts, message.trace_events)]
+    times = message.trace_times
+
+    return [('{} -> {}'.format(steps[i - 1], steps[i]),
+             times[i] - times[i - 1]) for i in range(1, len(times))]
@@ -65,7 +65,7 @@ class Client(object):
             self.logger.error("Could not access etcd database")
             sys.exit(-1)
             
-        self.logger.debug('Get key {}'.format(request_string))
+        self.logger.debug('Get key %s', request_string)
         times = 1
         
         while req.status_code == 404: 
@@ -122,7 +122,7 @@ class Client(object):
             self.logger.error("Could not access etcd database")
             sys.exit(-1)
 
-        self.logger.debug('Put key {} with value {}'.format(request_string,value))
+        self.logger.debug('Put key %s with value %s', request_string,value)
         if r.status_code == 404:
             raise EtcdError("I don't know if it fits here.")
 
@@ -131,14 +131,14 @@ class Client(object):
         Deletes a key or a node given the full path.
         """
         request_string = ''.join([self.request_prefix,key])
-        self.logger.debug('Delete key {}'.format(request_string))
+        self.logger.debug('Delete key %s', request_string)
         if directory:
             r = requests.delete(request_string,params={'dir': 'true'})
         else:
             r = requests.delete(request_string)
 
         if r.status_code == 200:
-            self.logger.debug('Successfully deleted key'.format(request_string))
+            self.logger.debug('Successfully deleted key')
 
 
 class EtcdPoller(object):
@@ -178,7 +178,7 @@ class EtcdPoller(object):
                 response = self.etcd.wait(self.key)
 
             self.wait_index = response['node']['modifiedIndex']+1
-            self.logger.debug('New wait index: {}'.format(self.wait_index))
+            self.logger.debug('New wait index: %s', self.wait_index)
             message = PalmMessage()
             message.function = self.function
             message.pipeline = ''
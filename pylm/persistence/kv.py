@@ -23,40 +23,64 @@ from threading import Lock
 
 class DictDB(object):
     """
-    DictDB is just a dictionary with a lock that keeps threads from colliding.
+    DictDB is a dictionary split in stripes, each one with its own lock,
+    so the writes of keys in different stripes don't wait for each other.
+    Reads don't take any lock, since getting an item of a dictionary is
+    atomic, and they see the last value that was set.
+
+    :param stripes: Number of stripes. Defaults to 16.
     """
-    lock = Lock()
+    def __init__(self, stripes=16):
+        self.stripes = [{} for i in range(stripes)]
+        self.locks = [Lock() for i in range(stripes)]
+
+    def __getstate__(self):
+        # The locks can't be pickled, and the hashes of the strings, that
+        # choose the stripes, change from one process to another.
+        store = {}
+        for stripe in self.stripes:
+            store.update(stripe)
+        return {'stripes': len(self.stripes), 'store': store}
 
-    def __init__(self):
-        self.store = {}
+    def __setstate__(self, state):
+        self.__init__(state['stripes'])
+        for key, value in state['store'].items():
+            self.stripes[self._stripe(key)][key] = value
+
+    def _stripe(self, key):
+        return hash(key) % len(self.stripes)
 
     def __contains__(self, item):
-        if item in self.store:
-            return True
-        else:
-            return False
+        return item in self.stripes[self._stripe(item)]
+
+    def __len__(self):
+        return sum(len(stripe) for stripe in self.stripes)
 
     def get(self, key):
-        try:
-            return self.store[key]
-        except KeyError:
-            return None
+        return self.stripes[self._stripe(key)].get(key)
 
     def set(self, key, value):
-        with self.lock:
-            self.store[key] = value
+        index = self._stripe(key)
+        with self.locks[index]:
+            self.stripes[index][key] = value
 
     def delete(self, key):
-        with self.lock:
-            del self.store[key]
+        index = self._stripe(key)
+        with self.locks[index]:
+            del self.stripes[index][key]
 
     def clean(self, prefix):
-        deleted = list()
-        with self.lock:
-            for key in self.store:
-                if key.startswith(prefix):
-                    deleted.append(key)
-
-            for key in deleted:
-                del self.store[key]
+        """
+        Deletes all the keys that start with the prefix. The keys of each
+        stripe are copied before they are scanned, and the lock of the
+        stripe is only taken to delete each key, so the other operations
+        don't wait for the scan. A key with the prefix that is set while
+        the cleanup runs may survive it.
 
+        :param prefix: Prefix of the keys
+        """
+        for stripe, lock in zip(self.stripes, self.locks):
+            for key in list(stripe):
+                if key.startswith(prefix):
+                    with lock:
+                        stripe.pop(key, None)
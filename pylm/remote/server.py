@@ -17,6 +17,7 @@
 from wsgiref.simple_server import make_server
 from collections import namedtuple
 from pylm.parts.messages_pb2 import PalmMessage
+from pylm.parts.dispatch import target
 
 Request = namedtuple('Request', 'method data')
 
@@ -37,7 +38,7 @@ class RequestHandler(object):
 
                 # This exports the message information
                 self.message = message
-                instruction = message.function.split('.')[1]
+                instruction = target(message)[1]
                 result = getattr(self, instruction)(message.payload)
                 message.payload = result
                 response_body = message.SerializeToString()
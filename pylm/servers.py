@@ -14,23 +14,70 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from pylm.parts.core import zmq_context
+from pylm.parts.core import zmq_context, async_context, answer_probes, \
+    pack, unpack, check_policy, configure_socket, send_frames
+from pylm.parts.compression import check_codec, compress, decompress
+from pylm.parts.sharedmem import SegmentPool, load
+from pylm.parts.stragglers import TaskTracker
+from pylm.parts.metrics import registry, size
+from pylm.parts.tracing import record
+from pylm.parts.logs import console
+from pylm.parts.dispatch import DispatchTable, AdaptiveBatch, target, \
+    call_batch
 from pylm.parts.services import WorkerPullService, WorkerPushService, \
-    CacheService
+    CacheService, MetricsService, TraceService
 from pylm.parts.services import PullService, PubService
 from pylm.parts.connections import SubConnection
-from pylm.parts.servers import BaseMaster, ServerTemplate
+from pylm.parts.servers import BaseMaster, ServerTemplate, \
+    ShardedServerTemplate, part_setting
+from pylm.parts.shards import pipeline_key
 from pylm.parts.messages_pb2 import PalmMessage
 from pylm.persistence.kv import DictDB
 from google.protobuf.message import DecodeError
+from concurrent.futures import FIRST_COMPLETED
+from collections import deque
+from threading import Thread
 from uuid import uuid4
 import concurrent.futures
+import multiprocessing
 import traceback
 import logging
+import time
+import asyncio
+import inspect
 import zmq
 import sys
 
 
+# Server that runs the user functions in the processes of a process pool.
+# Each process gets a copy of the server when the pool starts.
+_pool_server = None
+
+
+def _set_pool_server(server):
+    global _pool_server
+    server.dispatch = DispatchTable(server)
+    server.metrics = registry.part(server.name)
+    _pool_server = server
+
+
+def _call_pool_server(function, payload):
+    return _pool_server._call(function, payload)
+
+
+def _serve_metrics(address, logger):
+    """
+    Serves the metrics of the process from a daemon thread.
+
+    :param address: Address of the HTTP server, like '127.0.0.1:9100'
+    :param logger: Logger instance
+    :return: MetricsService
+    """
+    service = MetricsService('metrics', address, logger=logger)
+    Thread(target=service.start, daemon=True).start()
+    return service
+
+
 class Server(object):
     """
     Standalone and minimal server that replies single requests.
@@ -43,10 +90,52 @@ class Server(object):
     :param log_level: Minimum output log level.
     :param int messages: Total number of messages that the server processes.
         Useful for debugging.
+    :param int concurrency: Number of user functions that run at the same
+        time. Defaults to 1, the functions run one after the other in the
+        thread that receives the messages.
+    :param str pool: 'thread' to run the user functions in a thread pool,
+        for functions that wait for I/O, or 'process' to run them in a
+        process pool, for functions that need the CPU.
+    :param bool ordered: True if the results are sent in the same order as
+        the messages arrived. Defaults to True.
+    :param int max_in_flight: Maximum number of messages that are being
+        processed at the same time. Defaults to the concurrency.
+    :param str codec: Codec to compress the results, like 'zlib' or 'lzma'.
+        Defaults to no compression. Compressed messages are always
+        decompressed before they get to the user functions.
+    :param int compress_threshold: Minimum size in bytes of the results
+        that are compressed. Defaults to 1024.
+    :param batch_latency: Target of the p99 latency in milliseconds of the
+        batches of messages. If set, the server takes the messages that are
+        waiting in batches, whose size adapts to keep the latency under
+        the target. Defaults to 0, one message at a time.
+    :param int max_batch: Maximum size of the batches. Defaults to 64.
+    :param int hwm: Messages that the sockets queue. Defaults to None, the
+        ZMQ default of 1000 messages.
+    :param str policy: 'block' to wait for the slow subscribers when their
+        queue is full, or 'drop' to drop their results and count them in
+        ``dropped``. Defaults to None, the results are dropped without
+        counting them.
+    :param str metrics_address: Address of an HTTP server for the metrics
+        of the server in the text format of Prometheus, like
+        '127.0.0.1:9100'. Defaults to None, no HTTP server.
+
+    The user functions decorated with :func:`pylm.parts.dispatch.batched`
+    get a list with the payloads of the consecutive messages of a batch that
+    call them, and return a list of results. Batches need a concurrency of 1.
+
+    When the user functions run in a pool, they should not rely on the
+    ``message`` attribute of the server. With the process pool, each process
+    has its own copy of the server, and changes to its attributes are not
+    seen by the others.
     """
     def __init__(self, name, db_address,
                  pull_address, pub_address, pipelined=False,
-                 log_level=logging.INFO, messages=sys.maxsize):
+                 log_level=logging.INFO, messages=sys.maxsize,
+                 concurrency=1, pool='thread', ordered=True,
+                 max_in_flight=0, codec='', compress_threshold=1024,
+                 batch_latency=0, max_batch=64, hwm=None, policy=None,
+                 metrics_address=None):
         self.name = name
         self.cache = DictDB()
         self.db_address = db_address
@@ -59,24 +148,58 @@ class Server(object):
         self.cache.set('pull_address', pull_address.encode('utf-8'))
         self.cache.set('pub_address', pub_address.encode('utf-8'))
 
-        self.logger = logging.getLogger(name=name)
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setFormatter(
-            logging.Formatter(
-                '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-            )
-        )
-        self.logger.addHandler(handler)
-        self.logger.setLevel(log_level)
+        self.logger = console(name=name, level=log_level)
 
         self.messages = messages
+        self._configure_pool(concurrency, pool, ordered, max_in_flight)
+        self.dispatch = DispatchTable(self)
+        self.codec = check_codec(codec)
+        self.compress_threshold = compress_threshold
+        self.policy = check_policy(policy)
+        self.dropped = 0
+        self.metrics = registry.part(name)
+        self.metrics_address = metrics_address
+
+        self.batch = None
+        if batch_latency:
+            if concurrency > 1:
+                raise ValueError('Batches need a concurrency of 1')
+            self.batch = AdaptiveBatch(batch_latency, max_batch)
 
         self.pull_socket = zmq_context.socket(zmq.PULL)
+        configure_socket(self.pull_socket, hwm)
         self.pull_socket.bind(self.pull_address)
 
-        self.pub_socket = zmq_context.socket(zmq.PUB)
+        self.pub_socket = zmq_context.socket(zmq.XPUB)
+        configure_socket(self.pub_socket, hwm, policy)
         self.pub_socket.bind(self.pub_address)
 
+        self.poller = zmq.Poller()
+        self.poller.register(self.pull_socket, zmq.POLLIN)
+        self.poller.register(self.pub_socket, zmq.POLLIN)
+
+    def __getstate__(self):
+        # Only needed to send the server to the processes of the pool.
+        state = self.__dict__.copy()
+        for key in ('pull_socket', 'sub_socket', 'sub_sockets', 'pub_socket',
+                    'poller', 'executor', 'in_flight', 'message', 'dispatch',
+                    'metrics'):
+            state.pop(key, None)
+        return state
+
+    def _configure_pool(self, concurrency, pool, ordered, max_in_flight):
+        if concurrency < 1:
+            raise ValueError('The concurrency must be at least 1')
+        if pool not in ('thread', 'process'):
+            raise ValueError("The pool must be 'thread' or 'process'")
+
+        self.concurrency = concurrency
+        self.pool = pool
+        self.ordered = ordered
+        self.max_in_flight = max_in_flight if max_in_flight else concurrency
+        self.executor = None
+        self.in_flight = deque()
+
     def handle_stream(self, message):
         """
         Handle the stream of messages.
@@ -113,58 +236,285 @@ class Server(object):
         """
         return payload
 
-    def _execution_handler(self):
-        for i in range(self.messages):
-            self.logger.debug('Server waiting for messages')
-            message_data = self.pull_socket.recv()
-            self.logger.debug('Got message {}'.format(i + 1))
-            result = b'0'
-            self.message = PalmMessage()
-            try:
-                self.message.ParseFromString(message_data)
+    def _function_name(self, message):
+        """
+        Name of the user function that the message calls, or None if the
+        message is for another server.
+        """
+        if message.function_id:
+            function = self.dispatch.function(message)
+            if not function:
+                self.logger.error(
+                    'Function id {} was not found, or it does not match the '
+                    'function {}'.format(message.function_id,
+                                         message.function))
+            return function
 
-                # Handle the fact that the message may be a complete pipeline
-                try:
-                    if ' ' in self.message.function:
-                        [server, function] = self.message.function.split()[
-                            self.message.stage].split('.')
-                    else:
-                        [server, function] = self.message.function.split('.')
-                except IndexError:
-                    raise ValueError('Pipeline call not correct. Review the '
-                                     'config in your client')
-                        
-                if not self.name == server:
-                    self.logger.error('You called {}, instead of {}'.format(
-                        server, self.name))
+        # Handle the fact that the message may be a complete pipeline
+        server, function = target(message)
+
+        if not self.name == server:
+            self.logger.error('You called {}, instead of {}'.format(
+                server, self.name))
+            return None
+
+        return function
+
+    def _call(self, function, payload):
+        """
+        Call the user function. If it fails, the error is logged and the
+        result is b'0'.
+        """
+        user_function = self.dispatch.lookup(function)
+        if user_function is None:
+            self.logger.error(
+                'Function {} was not found'.format(function)
+            )
+            return b'0'
+
+        try:
+            if getattr(user_function, 'batched', False):
+                return call_batch(user_function, [payload])[0]
+            return user_function(payload)
+        except:
+            self.metrics.inc('errors')
+            self.logger.error('User function gave an error')
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            lines = traceback.format_exception(
+                exc_type, exc_value, exc_traceback)
+            for l in lines:
+                self.logger.exception(l)
+
+        return b'0'
+
+    def _publish(self, message, result):
+        # Do nothing if the function returns no value
+        if result is None:
+            return
+
+        message.payload = result
+        compress(message, self.codec, self.compress_threshold)
+        self.message = message
+
+        topic, self.message = self.handle_stream(message)
+        if self.message.trace:
+            record(self.message, self.name, 'out')
+        if send_frames(self.pub_socket,
+                       [topic.encode('utf-8')] + pack(self.message),
+                       self.policy):
+            self.metrics.inc('messages_out')
+        else:
+            self.dropped += 1
+            self.metrics.inc('dropped')
+            self.logger.debug('Dropped a result, %s in total', self.dropped)
+
+    def _publish_ready(self, wait=False):
+        """
+        Publish the results of the user functions that are done. If wait is
+        True, it waits for one result at least.
+        """
+        if self.ordered:
+            while self.in_flight and (wait or self.in_flight[0][1].done()):
+                message, future, started = self.in_flight.popleft()
+                self._publish(message, future.result())
+                self.metrics.observe('latency', time.monotonic() - started)
+                wait = False
+
+        elif self.in_flight:
+            if wait:
+                concurrent.futures.wait([f for m, f, t in self.in_flight],
+                                        return_when=FIRST_COMPLETED)
+            pending = deque()
+            for message, future, started in self.in_flight:
+                if future.done():
+                    self._publish(message, future.result())
+                    self.metrics.observe('latency',
+                                         time.monotonic() - started)
                 else:
-                    try:
-                        user_function = getattr(self, function)
-                        self.logger.debug('Looking for {}'.format(function))
-                        try:
-                            result = user_function(self.message.payload)
-                        except:
-                            self.logger.error('User function gave an error')
-                            exc_type, exc_value, exc_traceback = sys.exc_info()
-                            lines = traceback.format_exception(
-                                exc_type, exc_value, exc_traceback)
-                            for l in lines:
-                                self.logger.exception(l)
-
-                    except KeyError:
-                        self.logger.error(
-                            'Function {} was not found'.format(function)
-                        )
+                    pending.append((message, future, started))
+            self.in_flight = pending
+
+    def _poll(self):
+        """
+        Wait for messages to arrive, and publish the results that get ready
+        in the meantime. The probes of the clients are answered here too.
+        """
+        while True:
+            if self.in_flight:
+                socks = dict(self.poller.poll(1))
+                self._publish_ready()
+            else:
+                socks = dict(self.poller.poll())
+
+            if self.pub_socket in socks:
+                answer_probes(self.pub_socket)
+                del socks[self.pub_socket]
+
+            if socks:
+                return socks
+
+    def _execute(self, frames):
+        """
+        Run the user function the message calls, and publish the result. If
+        there is a pool, the result is published when it gets ready.
+        """
+        function = None
+        message = PalmMessage()
+        self.message = message
+        started = time.monotonic()
+        self.metrics.inc('messages_in')
+        self.metrics.inc('bytes_in', size(frames))
+        try:
+            message = self.message = next(unpack(frames))
+            if message.trace:
+                record(message, self.name, 'in')
+            decompress(message)
+            function = self._function_name(message)
+        except DecodeError:
+            self.logger.error('Message could not be decoded')
+            self.metrics.inc('errors')
+
+        if not function:
+            self._publish(message, b'0')
+
+        elif self.executor:
+            while len(self.in_flight) >= self.max_in_flight:
+                self._publish_ready(wait=True)
+
+            if self.pool == 'process':
+                future = self.executor.submit(_call_pool_server,
+                                              function,
+                                              message.payload)
+            else:
+                future = self.executor.submit(self._call,
+                                              function,
+                                              message.payload)
+
+            self.in_flight.append((message, future, started))
+
+        else:
+            self._publish(message, self._call(function, message.payload))
+            self.metrics.observe('latency', time.monotonic() - started)
+
+    def _execute_batch(self, batch):
+        """
+        Run the user functions the messages of a batch call, and publish the
+        results. The consecutive messages that call the same batched
+        function are processed in a single call.
+        """
+        calls = deque()
+        for frames in batch:
+            function = None
+            message = PalmMessage()
+            self.metrics.inc('messages_in')
+            self.metrics.inc('bytes_in', size(frames))
+            try:
+                message = next(unpack(frames))
+                if message.trace:
+                    record(message, self.name, 'in')
+                decompress(message)
+                function = self._function_name(message)
             except DecodeError:
                 self.logger.error('Message could not be decoded')
+                self.metrics.inc('errors')
+
+            if function:
+                calls.append((message, function))
+            else:
+                self._publish(message, b'0')
+
+        while calls:
+            message, function = calls.popleft()
+            user_function = self.dispatch.lookup(function)
+            if not getattr(user_function, 'batched', False):
+                self._publish(message, self._call(function, message.payload))
+                continue
 
-            self.message.payload = result
+            messages = [message]
+            while calls and calls[0][1] == function:
+                messages.append(calls.popleft()[0])
+
+            try:
+                results = call_batch(user_function,
+                                     [m.payload for m in messages])
+            except:
+                self.metrics.inc('errors')
+                self.logger.error('User function gave an error')
+                lines = traceback.format_exception(*sys.exc_info())
+                for l in lines:
+                    self.logger.exception(l)
+                results = [b'0'] * len(messages)
+
+            for message, result in zip(messages, results):
+                self._publish(message, result)
+
+    def _recv_batch(self, size):
+        """
+        Gets a message, and the ones that are already waiting up to the
+        size of the batch.
+        """
+        batch = [self.pull_socket.recv_multipart()]
+        while len(batch) < size:
+            try:
+                batch.append(self.pull_socket.recv_multipart(zmq.NOBLOCK))
+            except zmq.Again:
+                break
+
+        return batch
+
+    def _start_executor(self):
+        if self.concurrency == 1:
+            self.executor = None
+        elif self.pool == 'process':
+            # Spawn, because forked processes can't use the zmq context.
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.concurrency,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_set_pool_server,
+                initargs=(self,))
+        else:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.concurrency)
 
-            topic, self.message = self.handle_stream(self.message)
+    def _stop_executor(self):
+        while self.in_flight:
+            self._publish_ready(wait=True)
 
-            self.pub_socket.send_multipart(
-                [topic.encode('utf-8'), self.message.SerializeToString()]
-            )
+        if self.executor:
+            self.executor.shutdown()
+            self.executor = None
+
+    def _execution_handler(self):
+        if self.batch:
+            return self._batch_execution_handler()
+
+        self._start_executor()
+        try:
+            for i in range(self.messages):
+                self.logger.debug('Server waiting for messages')
+                self._poll()
+                frames = self.pull_socket.recv_multipart()
+                self.logger.debug('Got message %s', i + 1)
+                self._execute(frames)
+        finally:
+            self._stop_executor()
+
+    def _batch_execution_handler(self):
+        received = 0
+        while received < self.messages:
+            self.logger.debug('Server waiting for messages')
+            self._poll()
+            start = time.monotonic()
+            batch = self._recv_batch(
+                min(self.batch.size, self.messages - received))
+            received += len(batch)
+            self.logger.debug('Got a batch of %s', len(batch))
+            self._execute_batch(batch)
+            latency = time.monotonic() - start
+            self.batch.update(latency, len(batch))
+            # Each message of the batch waits for the whole batch
+            for message in batch:
+                self.metrics.observe('latency', latency)
 
     def start(self, cache_messages=sys.maxsize):
         """
@@ -176,6 +526,9 @@ class Server(object):
         """
         threads = []
 
+        if self.metrics_address:
+            _serve_metrics(self.metrics_address, self.logger)
+
         cache = CacheService('cache', self.db_address, logger=self.logger,
                              cache=self.cache, messages=cache_messages)
 
@@ -211,10 +564,33 @@ class Pipeline(Server):
     :param log_level: Minimum output log level.
     :param int messages: Total number of messages that the server processes.
         Useful for debugging.
+    :param int concurrency: Number of user functions that run at the same
+        time. Defaults to 1.
+    :param str pool: 'thread' or 'process'. Defaults to 'thread'.
+    :param bool ordered: True if the results are sent in the same order as
+        the messages arrived. Defaults to True.
+    :param int max_in_flight: Maximum number of messages that are being
+        processed at the same time. Defaults to the concurrency.
+    :param str codec: Codec to compress the results. Defaults to no
+        compression.
+    :param int compress_threshold: Minimum size in bytes of the results
+        that are compressed. Defaults to 1024.
+    :param int hwm: Messages that the sockets queue. Defaults to None, the
+        ZMQ default of 1000 messages.
+    :param str policy: 'block' to wait for the slow subscribers when their
+        queue is full, or 'drop' to drop their results and count them in
+        ``dropped``. Defaults to None, the results are dropped without
+        counting them.
+    :param str metrics_address: Address of an HTTP server for the metrics
+        of the server in the text format of Prometheus, like
+        '127.0.0.1:9100'. Defaults to None, no HTTP server.
     """
     def __init__(self, name, db_address,
                  sub_address, pub_address, previous, to_client=True,
-                 log_level=logging.INFO, messages=sys.maxsize):
+                 log_level=logging.INFO, messages=sys.maxsize,
+                 concurrency=1, pool='thread', ordered=True,
+                 max_in_flight=0, codec='', compress_threshold=1024,
+                 hwm=None, policy=None, metrics_address=None):
         self.name = name
         self.cache = DictDB()
         self.db_address = db_address
@@ -227,80 +603,43 @@ class Pipeline(Server):
         self.cache.set('sub_address', sub_address.encode('utf-8'))
         self.cache.set('pub_address', pub_address.encode('utf-8'))
 
-        self.logger = logging.getLogger(name=name)
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setFormatter(
-            logging.Formatter(
-                '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-            )
-        )
-        self.logger.addHandler(handler)
-        self.logger.setLevel(log_level)
+        self.logger = console(name=name, level=log_level)
 
         self.messages = messages
+        self._configure_pool(concurrency, pool, ordered, max_in_flight)
+        self.dispatch = DispatchTable(self)
+        self.codec = check_codec(codec)
+        self.compress_threshold = compress_threshold
+        self.policy = check_policy(policy)
+        self.dropped = 0
+        self.metrics = registry.part(name)
+        self.metrics_address = metrics_address
 
         self.sub_socket = zmq_context.socket(zmq.SUB)
+        configure_socket(self.sub_socket, hwm)
         self.sub_socket.setsockopt_string(zmq.SUBSCRIBE, previous)
         self.sub_socket.connect(self.sub_address)
 
-        self.pub_socket = zmq_context.socket(zmq.PUB)
+        self.pub_socket = zmq_context.socket(zmq.XPUB)
+        configure_socket(self.pub_socket, hwm, policy)
         self.pub_socket.bind(self.pub_address)
 
-    def _execution_handler(self):
-        for i in range(self.messages):
-            self.logger.debug('Server waiting for messages')
-            message_data = self.sub_socket.recv_multipart()[1]
-            self.logger.debug('Got message {}'.format(i + 1))
-            result = b'0'
-            self.message = PalmMessage()
-            try:
-                self.message.ParseFromString(message_data)
-
-                # Handle the fact that the message may be a complete pipeline
-                try:
-                    if ' ' in self.message.function:
-                        [server, function] = self.message.function.split()[
-                            self.message.stage].split('.')
-                    else:
-                        [server, function] = self.message.function.split('.')
-                except IndexError:
-                    raise ValueError('Pipeline call not correct. Review the '
-                                     'config in your client')
-                        
-                if not self.name == server:
-                    self.logger.error('You called {}, instead of {}'.format(
-                        server, self.name))
-                else:
-                    try:
-                        user_function = getattr(self, function)
-                        self.logger.debug('Looking for {}'.format(function))
-                        try:
-                            result = user_function(self.message.payload)
-                        except:
-                            self.logger.error('User function gave an error')
-                            exc_type, exc_value, exc_traceback = sys.exc_info()
-                            lines = traceback.format_exception(
-                                exc_type, exc_value, exc_traceback)
-                            for l in lines:
-                                self.logger.exception(l)
-
-                    except KeyError:
-                        self.logger.error(
-                            'Function {} was not found'.format(function)
-                        )
-            except DecodeError:
-                self.logger.error('Message could not be decoded')
-
-            # Do nothing if the function returns no value
-            if result is None:
-                continue
-
-            self.message.payload = result
+        self.poller = zmq.Poller()
+        self.poller.register(self.sub_socket, zmq.POLLIN)
+        self.poller.register(self.pub_socket, zmq.POLLIN)
 
-            topic, self.message = self.handle_stream(self.message)
-            self.pub_socket.send_multipart(
-                [topic.encode('utf-8'), self.message.SerializeToString()]
-            )
+    def _execution_handler(self):
+        self._start_executor()
+        try:
+            for i in range(self.messages):
+                self.logger.debug('Server waiting for messages')
+                self._poll()
+                # The first frame is the topic
+                frames = self.sub_socket.recv_multipart()[1:]
+                self.logger.debug('Got message %s', i + 1)
+                self._execute(frames)
+        finally:
+            self._stop_executor()
 
 
 class Sink(Server):
@@ -316,10 +655,33 @@ class Sink(Server):
     :param log_level: Minimum output log level. Defaults to INFO
     :param int messages: Total number of messages that the server processes. Defaults to Infty
         Useful for debugging.
+    :param int concurrency: Number of user functions that run at the same
+        time. Defaults to 1.
+    :param str pool: 'thread' or 'process'. Defaults to 'thread'.
+    :param bool ordered: True if the results are sent in the same order as
+        the messages arrived. Defaults to True.
+    :param int max_in_flight: Maximum number of messages that are being
+        processed at the same time. Defaults to the concurrency.
+    :param str codec: Codec to compress the results. Defaults to no
+        compression.
+    :param int compress_threshold: Minimum size in bytes of the results
+        that are compressed. Defaults to 1024.
+    :param int hwm: Messages that the sockets queue. Defaults to None, the
+        ZMQ default of 1000 messages.
+    :param str policy: 'block' to wait for the slow subscribers when their
+        queue is full, or 'drop' to drop their results and count them in
+        ``dropped``. Defaults to None, the results are dropped without
+        counting them.
+    :param str metrics_address: Address of an HTTP server for the metrics
+        of the server in the text format of Prometheus, like
+        '127.0.0.1:9100'. Defaults to None, no HTTP server.
     """
     def __init__(self, name, db_address,
                  sub_addresses, pub_address, previous, to_client=True,
-                 log_level=logging.INFO, messages=sys.maxsize):
+                 log_level=logging.INFO, messages=sys.maxsize,
+                 concurrency=1, pool='thread', ordered=True,
+                 max_in_flight=0, codec='', compress_threshold=1024,
+                 hwm=None, policy=None, metrics_address=None):
         self.name = name
         self.cache = DictDB()
         self.db_address = db_address
@@ -334,17 +696,17 @@ class Sink(Server):
 
         self.cache.set('pub_address', pub_address.encode('utf-8'))
 
-        self.logger = logging.getLogger(name=name)
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setFormatter(
-            logging.Formatter(
-                '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-            )
-        )
-        self.logger.addHandler(handler)
-        self.logger.setLevel(log_level)
+        self.logger = console(name=name, level=log_level)
 
         self.messages = messages
+        self._configure_pool(concurrency, pool, ordered, max_in_flight)
+        self.dispatch = DispatchTable(self)
+        self.codec = check_codec(codec)
+        self.compress_threshold = compress_threshold
+        self.policy = check_policy(policy)
+        self.dropped = 0
+        self.metrics = registry.part(name)
+        self.metrics_address = metrics_address
 
         self.sub_sockets = list()
 
@@ -354,78 +716,36 @@ class Sink(Server):
         
         for address, prev in zip(self.sub_addresses, previous):
             self.sub_sockets.append(zmq_context.socket(zmq.SUB))
+            configure_socket(self.sub_sockets[-1], hwm)
             self.sub_sockets[-1].setsockopt_string(zmq.SUBSCRIBE, prev)
             self.sub_sockets[-1].connect(address)
 
-        self.pub_socket = zmq_context.socket(zmq.PUB)
+        self.pub_socket = zmq_context.socket(zmq.XPUB)
+        configure_socket(self.pub_socket, hwm, policy)
         self.pub_socket.bind(self.pub_address)
 
         self.poller = zmq.Poller()
 
         for sock in self.sub_sockets:
             self.poller.register(sock, zmq.POLLIN)
+
+        self.poller.register(self.pub_socket, zmq.POLLIN)
         
     def _execution_handler(self):
-        for i in range(self.messages):
-            self.logger.debug('Server waiting for messages')
-            locked_socks = dict(self.poller.poll())
-
-            for sock in self.sub_sockets:
-                if sock in locked_socks:
-                    message_data = sock.recv_multipart()[1]
-                    
-                    self.logger.debug('Got message {}'.format(i + 1))
-                    result = b'0'
-                    self.message = PalmMessage()
-                    try:
-                        self.message.ParseFromString(message_data)
-                    
-                        # Handle the fact that the message may be a complete pipeline
-                        try:
-                            if ' ' in self.message.function:
-                                [server, function] = self.message.function.split()[
-                                    self.message.stage].split('.')
-                            else:
-                                [server, function] = self.message.function.split('.')
-                        except IndexError:
-                            raise ValueError('Pipeline call not correct. Review the '
-                                             'config in your client')
-
-                        if not self.name == server:
-                            self.logger.error('You called {}, instead of {}'.format(
-                                server, self.name))
-                        else:
-                            try:
-                                user_function = getattr(self, function)
-                                self.logger.debug('Looking for {}'.format(function))
-                                try:
-                                    result = user_function(self.message.payload)
-                                except:
-                                    self.logger.error('User function gave an error')
-                                    exc_type, exc_value, exc_traceback = sys.exc_info()
-                                    lines = traceback.format_exception(
-                                        exc_type, exc_value, exc_traceback)
-                                    for l in lines:
-                                        self.logger.exception(l)
-                    
-                            except KeyError:
-                                self.logger.error(
-                                    'Function {} was not found'.format(function)
-                                )
-                    except DecodeError:
-                        self.logger.error('Message could not be decoded')
-                    
-                    # Do nothing if the function returns no value
-                    if result is None:
-                        continue
-                    
-                    self.message.payload = result
-                    
-                    topic, self.message = self.handle_stream(self.message)
-
-                    self.pub_socket.send_multipart(
-                        [topic.encode('utf-8'), self.message.SerializeToString()]
-                    )
+        self._start_executor()
+        try:
+            for i in range(self.messages):
+                self.logger.debug('Server waiting for messages')
+                locked_socks = self._poll()
+
+                for sock in self.sub_sockets:
+                    if sock in locked_socks:
+                        # The first frame is the topic
+                        frames = sock.recv_multipart()[1:]
+                        self.logger.debug('Got message %s', i + 1)
+                        self._execute(frames)
+        finally:
+            self._stop_executor()
 
 
 class Master(ServerTemplate, BaseMaster):
@@ -442,34 +762,131 @@ class Master(ServerTemplate, BaseMaster):
     :param cache: Key-value embeddable database. Pick from one of the
         supported ones
     :param log_level: Logging level
+    :param router_window: Messages in flight allowed for each outbound part.
+        Defaults to 0, a router that handles one message at a time.
+    :param broker_batch: Maximum number of messages that the inbound parts
+        send to the router in a single round trip. Defaults to 1.
+    :param broker_batch_timeout: Milliseconds that an incomplete batch
+        waits for more messages before it is sent to the router.
+    :param zero_copy: Size in bytes from which the payloads are forwarded
+        from the clients to the workers and back without copying them. The
+        scatter and gather functions see an empty payload in those messages.
+        Defaults to 0, all the payloads are copied.
+    :param worker_stream_address: Valid address for the workers to get the
+        chunks of the streams from. Defaults to None, no streams.
+    :param shared_memory: Size in bytes from which the payloads are sent to
+        the workers through shared memory. The workers must run in the same
+        host. Defaults to 0, no shared memory.
+    :param worker_batch: Maximum number of messages that each worker gets
+        at once. Defaults to 1, no batching.
+    :param worker_batch_timeout: Milliseconds that an incomplete batch for
+        the workers waits for more messages. Defaults to 0.
+    :param worker_credits: True if the workers advertise their free slots,
+        and the messages only go to the ones that have some. The workers
+        must be created with ``credits``. Defaults to False, the messages
+        are pushed to the workers in turns.
+    :param speculate: Percentile of the latencies of each function, like
+        99, from which a task is sent again to another worker. Only the
+        first result of each task goes on. Defaults to 0, no speculation.
+    :param hwm: Messages that the sockets of the parts queue, for all the
+        parts or a dictionary with the value of each part, like
+        ``{'Pull': 1000, 'WorkerPush': 10}``. Defaults to None, the ZMQ
+        default of 1000 messages.
+    :param policy: What the WorkerPush and Pub parts do when the queues of
+        their peers are full, for both parts or a dictionary with the policy
+        of each part. 'block' waits, and 'drop' drops the message and counts
+        it. Defaults to None, the pushes to the workers block and the slow
+        subscribers lose messages without counting them.
+    :param metrics_address: Address of an HTTP server for the metrics of
+        the parts in the text format of Prometheus, like '127.0.0.1:9100'.
+        Defaults to None, no HTTP server.
+    :param trace_address: Address of the collector of the traces of the
+        clients created with ``trace_rate``. Defaults to None, no collector.
+    :param processes: Dictionary with the name of the process that runs
+        each part, like ``{'Pub': 'pub', 'Cache': 'cache'}``. The parts are
+        'Pull', 'WorkerPull', 'WorkerPush', 'Pub' and 'Cache'. Parts not
+        present run as threads of the main process.
 
     """
     def __init__(self, name: str, pull_address: str, pub_address: str,
                  worker_pull_address: str, worker_push_address: str,
                  db_address: str, pipelined: bool=False,
-                 cache: object = DictDB(), log_level: int = logging.INFO):
-        super(Master, self).__init__(logging_level=log_level)
+                 cache: object = DictDB(), log_level: int = logging.INFO,
+                 router_window: int = 0, broker_batch: int = 1,
+                 broker_batch_timeout: int = 0, processes: dict = None,
+                 zero_copy: int = 0, worker_stream_address: str = None,
+                 shared_memory: int = 0, worker_batch: int = 1,
+                 worker_batch_timeout: int = 0, worker_credits: bool = False,
+                 speculate: float = 0, hwm: object = None,
+                 policy: object = None, metrics_address: str = None,
+                 trace_address: str = None):
+        super(Master, self).__init__(logging_level=log_level,
+                                     router_window=router_window,
+                                     processes=processes,
+                                     zero_copy=zero_copy)
         self.name = name
         self.cache = cache
         self.pipelined = pipelined
 
+        # The part that writes the segments and the one that releases them
+        # share the pool, so they must run in the same process.
+        segments = None
+        if shared_memory:
+            if self.part_processes.get('Pull', '') != \
+                    self.part_processes.get('WorkerPull', ''):
+                raise ValueError('Pull and WorkerPull must run in the same '
+                                 'process to use shared memory')
+            segments = SegmentPool()
+
+        # The part that sends the tasks and the one that gets the results
+        # share the tracker of the tasks.
+        tasks = None
+        if speculate:
+            same = ('WorkerPush', 'WorkerPull', 'Pull') if shared_memory \
+                else ('WorkerPush', 'WorkerPull')
+            if len({self.part_processes.get(part, '') for part in same}) > 1:
+                raise ValueError('{} must run in the same process to '
+                                 'speculate'.format(' and '.join(same)))
+            tasks = TaskTracker(speculate, segments=segments)
+
         self.register_inbound(
-            PullService, 'Pull', pull_address, route='WorkerPush')
+            PullService, 'Pull', pull_address, route='WorkerPush',
+            batch=broker_batch, batch_timeout=broker_batch_timeout,
+            zero_copy=zero_copy, shared_memory=shared_memory,
+            segments=segments, hwm=part_setting(hwm, 'Pull'))
         self.register_inbound(
-            WorkerPullService, 'WorkerPull', worker_pull_address, route='Pub')
+            WorkerPullService, 'WorkerPull', worker_pull_address, route='Pub',
+            batch=broker_batch, batch_timeout=broker_batch_timeout,
+            zero_copy=zero_copy, segments=segments, tasks=tasks,
+            hwm=part_setting(hwm, 'WorkerPull'))
         self.register_outbound(
-            WorkerPushService, 'WorkerPush', worker_push_address)
+            WorkerPushService, 'WorkerPush', worker_push_address,
+            zero_copy=zero_copy, stream_address=worker_stream_address,
+            batch=worker_batch, batch_timeout=worker_batch_timeout,
+            credits=worker_credits, tasks=tasks,
+            hwm=part_setting(hwm, 'WorkerPush'),
+            policy=part_setting(policy, 'WorkerPush'))
         self.register_outbound(
             PubService, 'Pub', pub_address, log='to_sink',
-            pipelined=pipelined, server=self.name)
+            pipelined=pipelined, server=self.name, zero_copy=zero_copy,
+            hwm=part_setting(hwm, 'Pub'), policy=part_setting(policy, 'Pub'))
         self.register_bypass(
             CacheService, 'Cache', db_address)
+        if metrics_address:
+            self.register_bypass(
+                MetricsService, 'Metrics', metrics_address)
+        if trace_address:
+            self.register_bypass(
+                TraceService, 'Trace', trace_address)
+            self.preset_cache(trace_address=trace_address)
         self.preset_cache(name=name,
                           db_address=db_address,
                           pull_address=pull_address,
                           pub_address=pub_address,
                           worker_pull_address=worker_pull_address,
                           worker_push_address=worker_push_address)
+        if worker_stream_address:
+            self.preset_cache(worker_stream_address=worker_stream_address)
 
         # Monkey patches the scatter and gather functions to the
         # scatter function of Push and Pull parts respectively.
@@ -478,6 +895,92 @@ class Master(ServerTemplate, BaseMaster):
         self.outbound_components['Pub'].handle_stream = self.handle_stream
 
 
+class ShardedMaster(ShardedServerTemplate, BaseMaster):
+    """
+    Master whose router and parts are replicated in ``shards`` processes.
+    The messages of a pipeline are always routed by the same shard, so
+    they keep their order. The cache service runs in the main process.
+
+    :param name: Name of the server
+    :param pull_address: Valid address for the pull service
+    :param pub_address: Valid address for the pub service
+    :param worker_pull_address: Valid address for the pull-from-workers service
+    :param worker_push_address: Valid address for the push-to-workers service
+    :param db_address: Valid address to bind the Cache service
+    :param pipelined: The output connects to a Pipeline or a Hub.
+    :param cache: Key-value embeddable database. Pick from one of the
+        supported ones
+    :param log_level: Logging level
+    :param shards: Number of processes for the router and the parts.
+    :param key: Function that gets a PalmMessage and returns the sharding
+        key. Defaults to the pipeline. It must be picklable.
+    :param router_window: Messages in flight allowed for each outbound part.
+        Defaults to 0, a router that handles one message at a time.
+    :param broker_batch: Maximum number of messages that the inbound parts
+        send to the router in a single round trip. Defaults to 1.
+    :param broker_batch_timeout: Milliseconds that an incomplete batch
+        waits for more messages before it is sent to the router.
+    :param zero_copy: Size in bytes from which the payloads are forwarded
+        from the clients to the workers and back without copying them. The
+        scatter and gather functions see an empty payload in those messages.
+        Defaults to 0, all the payloads are copied.
+    :param worker_batch: Maximum number of messages that each worker gets
+        at once. Defaults to 1, no batching.
+    :param worker_batch_timeout: Milliseconds that an incomplete batch for
+        the workers waits for more messages. Defaults to 0.
+
+    """
+    def __init__(self, name: str, pull_address: str, pub_address: str,
+                 worker_pull_address: str, worker_push_address: str,
+                 db_address: str, pipelined: bool=False,
+                 cache: object = DictDB(), log_level: int = logging.INFO,
+                 shards: int = 2, key=pipeline_key, router_window: int = 0,
+                 broker_batch: int = 1, broker_batch_timeout: int = 0,
+                 zero_copy: int = 0, worker_batch: int = 1,
+                 worker_batch_timeout: int = 0):
+        super(ShardedMaster, self).__init__(logging_level=log_level,
+                                            shards=shards,
+                                            key=key,
+                                            router_window=router_window,
+                                            zero_copy=zero_copy)
+        self.name = name
+        self.cache = cache
+        self.pipelined = pipelined
+
+        self.register_inbound(
+            PullService, 'Pull', pull_address, route='WorkerPush',
+            batch=broker_batch, batch_timeout=broker_batch_timeout,
+            zero_copy=zero_copy)
+        self.register_inbound(
+            WorkerPullService, 'WorkerPull', worker_pull_address, route='Pub',
+            batch=broker_batch, batch_timeout=broker_batch_timeout,
+            zero_copy=zero_copy)
+        self.register_outbound(
+            WorkerPushService, 'WorkerPush', worker_push_address,
+            zero_copy=zero_copy, batch=worker_batch,
+            batch_timeout=worker_batch_timeout)
+        self.register_outbound(
+            PubService, 'Pub', pub_address, log='to_sink',
+            pipelined=pipelined, server=self.name, zero_copy=zero_copy)
+        self.register_bypass(
+            CacheService, 'Cache', db_address)
+        self.preset_cache(name=name,
+                          db_address=db_address,
+                          pull_address=pull_address,
+                          pub_address=pub_address,
+                          worker_pull_address=worker_pull_address,
+                          worker_push_address=worker_push_address)
+
+    def configure_shard(self, server):
+        """
+        Monkey patches the scatter and gather functions to the parts of
+        each shard.
+        """
+        server.inbound_components['Pull'].scatter = self.scatter
+        server.outbound_components['Pub'].scatter = self.gather
+        server.outbound_components['Pub'].handle_stream = self.handle_stream
+
+
 class Hub(ServerTemplate, BaseMaster):
     """
     A Hub is a pipelined Master.
@@ -492,35 +995,101 @@ class Hub(ServerTemplate, BaseMaster):
     :param pipelined: The stream is pipelined to another server.
     :param cache: Key-value embeddable database. Pick from one of the supported ones
     :param log_level: Logging level
+    :param router_window: Messages in flight allowed for each outbound part.
+        Defaults to 0, a router that handles one message at a time.
+    :param broker_batch: Maximum number of messages that the inbound parts
+        send to the router in a single round trip. Defaults to 1.
+    :param broker_batch_timeout: Milliseconds that an incomplete batch
+        waits for more messages before it is sent to the router.
+    :param zero_copy: Size in bytes from which the payloads are forwarded
+        from the clients to the workers and back without copying them. The
+        scatter and gather functions see an empty payload in those messages.
+        Defaults to 0, all the payloads are copied.
+    :param worker_stream_address: Valid address for the workers to get the
+        chunks of the streams from. Defaults to None, no streams.
+    :param worker_batch: Maximum number of messages that each worker gets
+        at once. Defaults to 1, no batching.
+    :param worker_batch_timeout: Milliseconds that an incomplete batch for
+        the workers waits for more messages. Defaults to 0.
+    :param worker_credits: True if the workers advertise their free slots,
+        and the messages only go to the ones that have some. The workers
+        must be created with ``credits``. Defaults to False, the messages
+        are pushed to the workers in turns.
+    :param hwm: Messages that the sockets of the parts queue, for all the
+        parts or a dictionary with the value of each part, like
+        ``{'Sub': 1000, 'WorkerPush': 10}``. Defaults to None, the ZMQ
+        default of 1000 messages.
+    :param policy: What the WorkerPush and Pub parts do when the queues of
+        their peers are full, for both parts or a dictionary with the policy
+        of each part. 'block' waits, and 'drop' drops the message and counts
+        it. Defaults to None, the pushes to the workers block and the slow
+        subscribers lose messages without counting them.
+    :param metrics_address: Address of an HTTP server for the metrics of
+        the parts in the text format of Prometheus, like '127.0.0.1:9100'.
+        Defaults to None, no HTTP server.
+    :param trace_address: Address of the collector of the traces of the
+        clients created with ``trace_rate``. Defaults to None, no collector.
+    :param processes: Dictionary with the name of the process that runs
+        each part, like ``{'Pub': 'pub', 'Cache': 'cache'}``. The parts are
+        'Sub', 'WorkerPull', 'WorkerPush', 'Pub' and 'Cache'. Parts not
+        present run as threads of the main process.
 
     """
     def __init__(self, name: str, sub_address: str, pub_address: str,
                  worker_pull_address: str, worker_push_address: str, db_address: str,
                  previous: str, pipelined: bool=False, cache: object = DictDB(),
-                 log_level: int = logging.INFO):
-
-        super(Hub, self).__init__(logging_level=log_level)
+                 log_level: int = logging.INFO, router_window: int = 0,
+                 broker_batch: int = 1, broker_batch_timeout: int = 0,
+                 processes: dict = None, zero_copy: int = 0,
+                 worker_stream_address: str = None, worker_batch: int = 1,
+                 worker_batch_timeout: int = 0, worker_credits: bool = False,
+                 hwm: object = None, policy: object = None,
+                 metrics_address: str = None, trace_address: str = None):
+
+        super(Hub, self).__init__(logging_level=log_level,
+                                  router_window=router_window,
+                                  processes=processes,
+                                  zero_copy=zero_copy)
         self.name = name
         self.cache = cache
         self.pipelined = pipelined
 
         self.register_inbound(
             SubConnection, 'Sub', sub_address, route='WorkerPush',
-            previous=previous)
+            previous=previous, batch=broker_batch,
+            batch_timeout=broker_batch_timeout, zero_copy=zero_copy,
+            hwm=part_setting(hwm, 'Sub'))
         self.register_inbound(
-            WorkerPullService, 'WorkerPull', worker_pull_address, route='Pub')
+            WorkerPullService, 'WorkerPull', worker_pull_address, route='Pub',
+            batch=broker_batch, batch_timeout=broker_batch_timeout,
+            zero_copy=zero_copy, hwm=part_setting(hwm, 'WorkerPull'))
         self.register_outbound(
-            WorkerPushService, 'WorkerPush', worker_push_address)
+            WorkerPushService, 'WorkerPush', worker_push_address,
+            zero_copy=zero_copy, stream_address=worker_stream_address,
+            batch=worker_batch, batch_timeout=worker_batch_timeout,
+            credits=worker_credits, hwm=part_setting(hwm, 'WorkerPush'),
+            policy=part_setting(policy, 'WorkerPush'))
         self.register_outbound(
-            PubService, 'Pub', pub_address, log='to_sink', pipelined=pipelined)
+            PubService, 'Pub', pub_address, log='to_sink', pipelined=pipelined,
+            zero_copy=zero_copy, hwm=part_setting(hwm, 'Pub'),
+            policy=part_setting(policy, 'Pub'))
         self.register_bypass(
             CacheService, 'Cache', db_address)
+        if metrics_address:
+            self.register_bypass(
+                MetricsService, 'Metrics', metrics_address)
+        if trace_address:
+            self.register_bypass(
+                TraceService, 'Trace', trace_address)
+            self.preset_cache(trace_address=trace_address)
         self.preset_cache(name=name,
                           db_address=db_address,
                           sub_address=sub_address,
                           pub_address=pub_address,
                           worker_pull_address=worker_pull_address,
                           worker_push_address=worker_push_address)
+        if worker_stream_address:
+            self.preset_cache(worker_stream_address=worker_stream_address)
 
         # Monkey patches the scatter and gather functions to the
         # scatter function of Push and Pull parts respectively.
@@ -541,11 +1110,47 @@ class Worker(object):
         fetches it from the master
     :param log_level: Log level for this server.
     :param messages: Number of messages before it is shut down.
+    :param codec: Codec to compress the results, like 'zlib' or 'lzma'.
+        Defaults to no compression. Compressed messages are always
+        decompressed before they get to the user functions.
+    :param compress_threshold: Minimum size in bytes of the results that
+        are compressed. Defaults to 1024.
+    :param streams: True if the worker gets the streams that the clients
+        send in chunks. Defaults to False.
+    :param stream_address: Address the workers get the chunks of the streams
+        from. If left blank, fetches it from the master.
+    :param credits: Free slots that the worker advertises to a master
+        created with ``worker_credits``. With more than one, the worker gets
+        the next messages while it processes one. Defaults to 0, for a
+        master that pushes the messages in turns.
+    :param hwm: Messages that the sockets of the worker queue. Without
+        credits, the messages that wait for the worker are bounded by this
+        and by the hwm of the master. Defaults to None, the ZMQ default of
+        1000 messages.
+    :param metrics_address: Address of an HTTP server for the metrics of
+        the worker in the text format of Prometheus, like '127.0.0.1:9100'.
+        Defaults to None, no HTTP server.
+
+    The user functions that are called with a stream get an iterator with
+    the payloads of the chunks instead of a payload. The worker processes
+    one stream at a time, and the chunks of other streams that arrive
+    meanwhile wait in memory.
+
+    The payloads that the master writes in shared memory are copied from it
+    before the user function is called, so the worker must run in the same
+    host as the master.
+
+    The user functions decorated with :func:`pylm.parts.dispatch.batched`
+    get a list with the payloads of the messages that the master sends in
+    the same batch, and return a list with their results. Other functions
+    get the messages of a batch one by one.
 
     """
     def __init__(self, name='', db_address='', push_address=None,
                  pull_address=None, log_level=logging.INFO,
-                 messages=sys.maxsize):
+                 messages=sys.maxsize, codec='', compress_threshold=1024,
+                 streams=False, stream_address=None, credits=0, hwm=None,
+                 metrics_address=None):
 
         self.uuid = str(uuid4())
 
@@ -556,17 +1161,13 @@ class Worker(object):
             self.name = name
 
         # Configure the log handler
-        self.logger = logging.getLogger(name=name)
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setFormatter(logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        )
-        self.logger.addHandler(handler)
-        self.logger.setLevel(log_level)
+        self.logger = console(name=name, level=log_level)
 
         # Configure the connections.
         self.push_address = push_address
         self.pull_address = pull_address
+        self.streams = streams or bool(stream_address)
+        self.stream_address = stream_address
 
         if not db_address:
             raise ValueError('db_address argument is mandatory')
@@ -577,14 +1178,47 @@ class Worker(object):
 
         self._get_config_from_master()
 
-        self.pull = zmq_context.socket(zmq.PULL)
-        self.pull.connect(self.push_address)
+        # With credits, the worker tells the master how many messages it
+        # can take, and then gives back one slot per message.
+        self.credits = credits
+        if credits:
+            self.pull = zmq_context.socket(zmq.DEALER)
+            self.pull.identity = self.uuid.encode('utf-8')
+            configure_socket(self.pull, hwm)
+            self.pull.connect(self.push_address)
+            self.pull.send(str(credits).encode('utf-8'))
+        else:
+            self.pull = zmq_context.socket(zmq.PULL)
+            configure_socket(self.pull, hwm)
+            self.pull.connect(self.push_address)
 
         self.push = zmq_context.socket(zmq.PUSH)
+        configure_socket(self.push, hwm)
         self.push.connect(self.pull_address)
 
+        # The worker tells the master it is ready to get streams
+        self.stream = None
+        self.poller = zmq.Poller()
+        self.poller.register(self.pull, zmq.POLLIN)
+        if self.streams:
+            self.stream = zmq_context.socket(zmq.DEALER)
+            self.stream.identity = self.uuid.encode('utf-8')
+            self.stream.connect(self.stream_address)
+            self.stream.send(b'ready')
+            self.poller.register(self.stream, zmq.POLLIN)
+
+        # Chunks of other streams that arrive during a stream, and the
+        # messages of a batch that are still to be processed.
+        self.pending = deque()
+        self.batch_results = deque()
+
         self.messages = messages
         self.message = PalmMessage()
+        self.codec = check_codec(codec)
+        self.compress_threshold = compress_threshold
+        self.dispatch = DispatchTable(self)
+        self.metrics = registry.part(self.name)
+        self.metrics_address = metrics_address
 
     def _get_config_from_master(self):
         if not self.push_address:
@@ -597,35 +1231,157 @@ class Worker(object):
             self.logger.info(
                 'Got worker pull address: {}'.format(self.pull_address))
 
+        if self.streams and not self.stream_address:
+            self.stream_address = self.get(
+                'worker_stream_address').decode('utf-8')
+            self.logger.info(
+                'Got worker stream address: {}'.format(self.stream_address))
+
         return {'push_address': self.push_address,
-                'pull_address': self.pull_address}
+                'pull_address': self.pull_address,
+                'stream_address': self.stream_address}
+
+    def _recv(self):
+        """
+        Waits for a message, or for the first chunk of a stream.
+
+        :return: PalmMessage
+        """
+        if self.pending:
+            return self.pending.popleft()
+
+        socket = self.pull
+        if self.stream:
+            socks = dict(self.poller.poll())
+            if self.stream in socks:
+                socket = self.stream
+
+        messages = unpack(socket.recv_multipart())
+        message = next(messages)
+        # The rest of the batch, if the master sends batches
+        self.pending.extend(messages)
+        return message
+
+    def _next_chunk(self, stream):
+        """
+        Next chunk of a stream. The chunks of other streams are kept for
+        later.
+
+        :param stream: Id of the stream
+        :return: PalmMessage
+        """
+        for chunk in self.pending:
+            if chunk.id == stream:
+                self.pending.remove(chunk)
+                return chunk
+
+        while True:
+            chunk = next(unpack(self.stream.recv_multipart()))
+            if chunk.id == stream:
+                return chunk
+
+            self.pending.append(chunk)
+
+    def _chunks(self, message):
+        """
+        Iterator with the payloads of a stream, from its first chunk.
+
+        :param message: First chunk of the stream
+        """
+        yield message.payload
+        last = message.last
+
+        while not last:
+            chunk = decompress(self._next_chunk(message.id))
+            last = chunk.last
+            yield chunk.payload
+
+    def _exec_batch(self, user_function):
+        """
+        Calls a batched user function with the payload of the message and
+        the ones of the messages of the same batch that call it too. The
+        results of the other messages wait in ``batch_results``.
+
+        :param user_function: Function that gets a list of payloads
+        :return: Result for the message
+        """
+        messages = [self.message]
+        while self.pending and not self.pending[0].chunk and \
+                self.pending[0].function == self.message.function and \
+                self.pending[0].function_id == self.message.function_id:
+            try:
+                decompress(load(self.pending[0]))
+            except DecodeError:
+                break
+            message = self.pending.popleft()
+            if message.trace:
+                record(message, self.name, 'in')
+            messages.append(message)
+
+        self.metrics.inc('messages_in', len(messages) - 1)
+        started = time.monotonic()
+        try:
+            results = call_batch(user_function, [m.payload for m in messages])
+        except:
+            self.metrics.inc('errors')
+            self.logger.error(
+                '{} Batched function gave an error'.format(self.name))
+            lines = traceback.format_exception(*sys.exc_info())
+            self.logger.exception(lines[0])
+            results = [b'0'] * len(messages)
+
+        # The first message is observed by the caller
+        for message in messages[1:]:
+            self.metrics.observe('latency', time.monotonic() - started)
+
+        self.batch_results.extend(zip(messages[1:], results[1:]))
+        return results[0]
 
     def _exec_function(self):
         """
         Waits for a message and return the result
         """
-        message_data = self.pull.recv()
-        self.logger.debug('{} Got a message'.format(self.name))
         result = b'0'
+        chunks = None
+        started = None
         try:
-            self.message.ParseFromString(message_data)
-            try:
-                if ' ' in self.message.function:
-                    instruction = self.message.function.split()[
-                        self.message.stage].split('.')[1]
-                else:
-                    instruction = self.message.function.split('.')[1]
-            except IndexError:
-                raise ValueError('Pipeline call not correct. Review the '
-                                 'config in your client')
+            self.message = self._recv()
+            started = time.monotonic()
+            self.metrics.inc('messages_in')
+            if self.message.trace:
+                record(self.message, self.name, 'in')
+            self.logger.debug('%s Got a message', self.name)
+            decompress(load(self.message))
+            instruction = self.dispatch.function(self.message)
+
+            user_function = self.dispatch.lookup(instruction)
+            if self.message.chunk and self.stream is None:
+                # The other chunks of the stream can't get here
+                self.metrics.inc('errors')
+                self.logger.error(
+                    '{} Got a chunk of a stream, but streams are '
+                    'disabled'.format(self.name))
+                self.message.chunk = 0
+                self.message.last = False
+            elif user_function is None:
+                self.metrics.inc('errors')
+                self.logger.error(
+                    'Function {} was not found'.format(instruction)
+                )
+            else:
+                if self.message.chunk:
+                    chunks = self._chunks(self.message)
 
-            try:
-                user_function = getattr(self, instruction)
-                self.logger.debug('Looking for {}'.format(instruction))
                 try:
-                    result = user_function(self.message.payload)
-                    self.logger.debug('{} Ok'.format(instruction))
+                    if chunks:
+                        result = user_function(chunks)
+                    elif getattr(user_function, 'batched', False):
+                        result = self._exec_batch(user_function)
+                    else:
+                        result = user_function(self.message.payload)
+                    self.logger.debug('%s Ok', instruction)
                 except:
+                    self.metrics.inc('errors')
                     self.logger.error(
                         '{} User function {} gave an error'.format(
                             self.name, instruction)
@@ -633,21 +1389,45 @@ class Worker(object):
                     lines = traceback.format_exception(*sys.exc_info())
                     self.logger.exception(lines[0])
 
-            except AttributeError:
-                self.logger.error(
-                    'Function {} was not found'.format(instruction)
-                )
         except DecodeError:
+            self.metrics.inc('errors')
             self.logger.error('Message could not be decoded')
+
+        if chunks:
+            # The chunks the function did not read. The result is a
+            # regular message.
+            for chunk in chunks:
+                pass
+            self.message.chunk = 0
+            self.message.last = False
+
+        if started is not None:
+            self.metrics.observe('latency', time.monotonic() - started)
+
         return result
 
     def start(self):
         """
         Starts the server
         """
+        if self.metrics_address:
+            _serve_metrics(self.metrics_address, self.logger)
+
         for i in range(self.messages):
-            self.message.payload = self._exec_function()
-            self.push.send(self.message.SerializeToString())
+            if self.batch_results:
+                self.message, result = self.batch_results.popleft()
+            else:
+                result = self._exec_function()
+
+            self.message.payload = result
+            if self.message.trace:
+                record(self.message, self.name, 'out')
+            compress(self.message, self.codec, self.compress_threshold)
+            self.push.send_multipart(pack(self.message))
+            self.metrics.inc('messages_out')
+
+            if self.credits:
+                self.pull.send(b'1')
 
     def set(self, value, key=None):
         """
@@ -715,13 +1495,340 @@ class MuxWorker(Worker):
         fetches it from the master
     :param log_level: Log level for this server.
     :param messages: Number of messages before it is shut down.
+    :param codec: Codec to compress the results. Defaults to no compression.
+    :param compress_threshold: Minimum size in bytes of the results that
+        are compressed. Defaults to 1024.
 
     """
     def start(self):
         """
         Starts the server
         """
+        if self.metrics_address:
+            _serve_metrics(self.metrics_address, self.logger)
+
         for i in range(self.messages):
-            for r in self._exec_function():
+            if self.batch_results:
+                self.message, result = self.batch_results.popleft()
+            else:
+                result = self._exec_function()
+
+            for r in result:
                 self.message.payload = r
-                self.push.send(self.message.SerializeToString())
+                if self.message.trace:
+                    record(self.message, self.name, 'out')
+                compress(self.message, self.codec, self.compress_threshold)
+                self.push.send_multipart(pack(self.message))
+                self.metrics.inc('messages_out')
+
+            if self.credits:
+                self.pull.send(b'1')
+
+
+class AsyncWorker(object):
+    """
+    Standalone worker for the standalone master, built on asyncio. The user
+    functions may be coroutines, and the worker keeps up to ``concurrency``
+    messages in flight, which is useful when the functions wait for I/O.
+
+    :param name: Name assigned to this worker server
+    :param db_address: Address of the db service of the master
+    :param push_address: Address the workers push to. If left blank, fetches
+        it from the master
+    :param pull_address: Address the workers pull from. If left blank,
+        fetches it from the master
+    :param log_level: Log level for this server.
+    :param messages: Number of messages before it is shut down.
+    :param concurrency: Maximum number of messages in flight. Defaults to 10.
+    :param codec: Codec to compress the results. Defaults to no compression.
+    :param compress_threshold: Minimum size in bytes of the results that
+        are compressed. Defaults to 1024.
+    :param credits: Free slots that the worker advertises to a master
+        created with ``worker_credits``, usually the concurrency. Defaults
+        to 0, for a master that pushes the messages in turns.
+    :param hwm: Messages that the sockets of the worker queue. Defaults to
+        None, the ZMQ default of 1000 messages.
+    :param metrics_address: Address of an HTTP server for the metrics of
+        the worker in the text format of Prometheus, like '127.0.0.1:9100'.
+        Defaults to None, no HTTP server.
+
+    The methods to access the cache of the master, get, set and delete,
+    are coroutines too. The user functions decorated with
+    :func:`pylm.parts.dispatch.batched` get the payloads of the consecutive
+    messages of a batch that call them in a single list, like in
+    :class:`Worker`, and they can't be coroutines.
+    """
+    def __init__(self, name='', db_address='', push_address=None,
+                 pull_address=None, log_level=logging.INFO,
+                 messages=sys.maxsize, concurrency=10, codec='',
+                 compress_threshold=1024, credits=0, hwm=None,
+                 metrics_address=None):
+
+        self.uuid = str(uuid4())
+
+        # Give a random name if not given
+        if not name:
+            self.name = self.uuid
+        else:
+            self.name = name
+
+        # Configure the log handler
+        self.logger = console(name=name, level=log_level)
+
+        if not db_address:
+            raise ValueError('db_address argument is mandatory')
+
+        if concurrency < 1:
+            raise ValueError('The concurrency must be at least 1')
+
+        # The sockets are created when the worker starts, within the loop.
+        self.push_address = push_address
+        self.pull_address = pull_address
+        self.db_address = db_address
+        self.context = None
+        self.db = None
+        self.db_lock = None
+        self.pull = None
+        self.push = None
+
+        self.messages = messages
+        self.concurrency = concurrency
+        self.credits = credits
+        self.hwm = hwm
+        self.codec = check_codec(codec)
+        self.compress_threshold = compress_threshold
+        self.dispatch = DispatchTable(self)
+        self.metrics = registry.part(self.name)
+        self.metrics_address = metrics_address
+
+    async def _get_config_from_master(self):
+        if not self.push_address:
+            self.push_address = (
+                await self.get('worker_push_address')).decode('utf-8')
+            self.logger.info(
+                'Got worker push address: {}'.format(self.push_address))
+
+        if not self.pull_address:
+            self.pull_address = (
+                await self.get('worker_pull_address')).decode('utf-8')
+            self.logger.info(
+                'Got worker pull address: {}'.format(self.pull_address))
+
+        return {'push_address': self.push_address,
+                'pull_address': self.pull_address}
+
+    async def _exec_function(self, message):
+        """
+        Runs the user function the message calls, and returns the result
+        """
+        result = b'0'
+        try:
+            instruction = self.dispatch.function(message)
+        except ValueError as error:
+            self.metrics.inc('errors')
+            self.logger.error(str(error))
+            return result
+
+        user_function = self.dispatch.lookup(instruction)
+        if user_function is None:
+            self.metrics.inc('errors')
+            self.logger.error(
+                'Function {} was not found'.format(instruction)
+            )
+            return result
+
+        try:
+            result = user_function(message.payload)
+            if inspect.isawaitable(result):
+                result = await result
+            self.logger.debug('%s Ok', instruction)
+        except:
+            self.metrics.inc('errors')
+            self.logger.error(
+                '{} User function {} gave an error'.format(
+                    self.name, instruction)
+            )
+            lines = traceback.format_exception(*sys.exc_info())
+            self.logger.exception(lines[0])
+            result = b'0'
+
+        return result
+
+    def _exec_batch(self, user_function, messages):
+        """
+        Calls a batched user function with the payloads of the messages.
+
+        :param user_function: Function that gets a list of payloads
+        :param messages: Messages that call the function
+        :return: List with the result of each message
+        """
+        try:
+            return call_batch(user_function, [m.payload for m in messages])
+        except:
+            self.metrics.inc('errors')
+            self.logger.error(
+                '{} Batched function gave an error'.format(self.name))
+            lines = traceback.format_exception(*sys.exc_info())
+            self.logger.exception(lines[0])
+            return [b'0'] * len(messages)
+
+    async def _exec_messages(self, messages):
+        """
+        Runs the user functions of the messages of a batch, one after the
+        other. The consecutive messages that call the same batched function
+        go together in a single call.
+
+        :param messages: Decoded messages
+        :return: List with the result of each message
+        """
+        results = []
+        i = 0
+        while i < len(messages):
+            message = messages[i]
+            try:
+                user_function = self.dispatch.lookup(
+                    self.dispatch.function(message))
+            except ValueError:
+                user_function = None
+
+            if getattr(user_function, 'batched', False):
+                j = i + 1
+                while j < len(messages) and \
+                        messages[j].function == message.function and \
+                        messages[j].function_id == message.function_id:
+                    j += 1
+                results.extend(self._exec_batch(user_function, messages[i:j]))
+                i = j
+            else:
+                results.append(await self._exec_function(message))
+                i += 1
+
+        return results
+
+    async def _handle(self, frames, slots):
+        try:
+            try:
+                messages = list(unpack(frames))
+            except DecodeError:
+                self.metrics.inc('errors')
+                self.logger.error('Message could not be decoded')
+                messages = [PalmMessage()]
+
+            started = time.monotonic()
+            for message in messages:
+                self.metrics.inc('messages_in')
+                if message.trace:
+                    record(message, self.name, 'in')
+                try:
+                    decompress(load(message))
+                except DecodeError:
+                    self.metrics.inc('errors')
+                    self.logger.error('Message could not be decoded')
+
+            results = await self._exec_messages(messages)
+            for message, result in zip(messages, results):
+                message.payload = result
+                self.metrics.observe('latency', time.monotonic() - started)
+                if message.trace:
+                    record(message, self.name, 'out')
+                compress(message, self.codec, self.compress_threshold)
+                await self.push.send_multipart(pack(message))
+                self.metrics.inc('messages_out')
+
+                if self.credits:
+                    await self.pull.send(b'1')
+        finally:
+            slots.release()
+
+    async def run(self):
+        """
+        Coroutine that runs the worker until it gets all its messages.
+        """
+        if self.metrics_address:
+            _serve_metrics(self.metrics_address, self.logger)
+
+        self.context = async_context()
+        self.db = self.context.socket(zmq.REQ)
+        self.db.connect(self.db_address)
+        self.db_lock = asyncio.Lock()
+
+        await self._get_config_from_master()
+
+        if self.credits:
+            self.pull = self.context.socket(zmq.DEALER)
+            self.pull.identity = self.uuid.encode('utf-8')
+            configure_socket(self.pull, self.hwm)
+            self.pull.connect(self.push_address)
+            await self.pull.send(str(self.credits).encode('utf-8'))
+        else:
+            self.pull = self.context.socket(zmq.PULL)
+            configure_socket(self.pull, self.hwm)
+            self.pull.connect(self.push_address)
+
+        self.push = self.context.socket(zmq.PUSH)
+        configure_socket(self.push, self.hwm)
+        self.push.connect(self.pull_address)
+
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+
+        for i in range(self.messages):
+            await slots.acquire()
+            frames = await self.pull.recv_multipart()
+            self.logger.debug('%s Got a message', self.name)
+            task = asyncio.ensure_future(self._handle(frames, slots))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.wait(tasks)
+
+    def start(self):
+        """
+        Starts the server
+        """
+        asyncio.run(self.run())
+
+    async def _cache_request(self, function, payload, key=None):
+        message = PalmMessage()
+        message.pipeline = str(uuid4())
+        message.client = self.uuid
+        message.stage = 0
+        message.function = '.'.join(['_', function])
+        message.payload = payload
+        if key:
+            message.cache = key
+
+        # The REQ socket only allows one request at a time.
+        async with self.db_lock:
+            await self.db.send(message.SerializeToString())
+            return await self.db.recv()
+
+    async def set(self, value, key=None):
+        """
+        Sets a key value pare in the remote database.
+
+        :param key:
+        :param value:
+        :return:
+        """
+        return (await self._cache_request('set', value, key)).decode('utf-8')
+
+    async def get(self, key):
+        """
+        Gets a value from server's internal cache
+
+        :param key: Key for the data to be selected.
+        :return:
+        """
+        return await self._cache_request('get', key.encode('utf-8'))
+
+    async def delete(self, key):
+        """
+        Deletes data in the server's internal cache.
+
+        :param key: Key of the data to be deleted
+        :return:
+        """
+        return (await self._cache_request(
+            'delete', key.encode('utf-8'))).decode('utf-8')
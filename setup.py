@@ -58,7 +58,8 @@ setup(name='pylm',
       packages=['pylm',
                 'pylm.parts',
                 'pylm.persistence',
-                'pylm.remote'],
+                'pylm.remote',
+                'pylm.bench'],
       classifiers=[
           'Development Status :: 4 - Beta',
           'Environment :: Console',
@@ -0,0 +1,93 @@
+import concurrent.futures
+import logging
+
+import zmq
+
+from pylm.parts.core import zmq_context, AsyncRouter
+
+
+def test_async_router_block():
+    router = AsyncRouter(inbound_address='inproc://async_inbound1',
+                         outbound_address='inproc://async_outbound1',
+                         logger=logging,
+                         messages=2)
+    router.register_inbound('inbound', route='outbound', block=True)
+    router.register_outbound('outbound')
+
+    def inbound():
+        socket = zmq_context.socket(zmq.REQ)
+        socket.identity = b'inbound'
+        socket.connect('inproc://async_inbound1')
+        got = []
+        for payload in [b'1', b'2']:
+            socket.send(payload)
+            got.append(socket.recv())
+        socket.close()
+        return got
+
+    # Outbound parts connect before the router starts, like in the servers.
+    socket = zmq_context.socket(zmq.REP)
+    socket.identity = b'outbound'
+    socket.connect('inproc://async_outbound1')
+
+    def outbound():
+        for i in range(2):
+            socket.send(socket.recv() + b' back')
+        socket.close()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        results = [executor.submit(router.start),
+                   executor.submit(inbound),
+                   executor.submit(outbound)]
+        assert results[0].result() == b'router'
+        assert results[1].result() == [b'1 back', b'2 back']
+
+
+def test_async_router_window():
+    """
+    The outbound part gets two messages before it replies to any of them,
+    which would deadlock the blocking router.
+    """
+    router = AsyncRouter(inbound_address='inproc://async_inbound2',
+                         outbound_address='inproc://async_outbound2',
+                         logger=logging,
+                         messages=2,
+                         window=2)
+    router.register_inbound('inbound', route='outbound')
+    router.register_outbound('outbound')
+
+    def inbound():
+        socket = zmq_context.socket(zmq.REQ)
+        socket.identity = b'inbound'
+        socket.connect('inproc://async_inbound2')
+        got = []
+        for payload in [b'1', b'2']:
+            socket.send(payload)
+            got.append(socket.recv())
+        socket.close()
+        return got
+
+    # Outbound parts connect before the router starts, like in the servers.
+    socket = zmq_context.socket(zmq.DEALER)
+    socket.identity = b'outbound'
+    socket.connect('inproc://async_outbound2')
+
+    def outbound():
+        got = [socket.recv_multipart()[1] for i in range(2)]
+        for i in range(2):
+            socket.send(b'')
+        socket.close()
+        return got
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        results = [executor.submit(router.start),
+                   executor.submit(inbound),
+                   executor.submit(outbound)]
+        assert results[0].result() == b'router'
+        assert results[1].result() == [b'1', b'1']
+        assert results[2].result() == [b'1', b'2']
+
+
+if __name__ == '__main__':
+    test_async_router_block()
+    test_async_router_window()
@@ -0,0 +1,76 @@
+import concurrent.futures
+import logging
+
+import zmq
+
+from pylm.parts.core import zmq_context, Router
+from pylm.parts.messages_pb2 import PalmMessage
+from pylm.parts.services import PullService, PushService
+
+
+def test_batched_scatter():
+    """
+    A message scattered in six goes through the router in two round trips
+    """
+    router = Router(inbound_address='inproc://batch_inbound',
+                    outbound_address='inproc://batch_outbound',
+                    logger=logging,
+                    messages=2)
+    router.register_inbound('puller', route='pusher')
+    router.register_outbound('pusher')
+
+    puller = PullService('puller',
+                         'inproc://batch_pull',
+                         broker_address=router.inbound_address,
+                         logger=logging,
+                         messages=1,
+                         batch=3)
+
+    def scatter(message):
+        for i in range(6):
+            message.payload = str(i).encode('utf-8')
+            yield message
+
+    puller.scatter = scatter
+
+    pusher = PushService('pusher',
+                         'inproc://batch_push',
+                         broker_address=router.outbound_address,
+                         logger=logging,
+                         messages=2)
+
+    def client():
+        push = zmq_context.socket(zmq.PUSH)
+        push.connect('inproc://batch_pull')
+        pull = zmq_context.socket(zmq.PULL)
+        pull.connect('inproc://batch_push')
+
+        message = PalmMessage()
+        message.pipeline = '0'
+        message.client = '0'
+        message.stage = 0
+        message.function = 'f'
+        message.payload = b'0'
+        push.send(message.SerializeToString())
+
+        got = []
+        for i in range(6):
+            message.ParseFromString(pull.recv())
+            got.append(message.payload)
+
+        push.close()
+        pull.close()
+        return got
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        results = [executor.submit(router.start),
+                   executor.submit(puller.start),
+                   executor.submit(pusher.start),
+                   executor.submit(client)]
+
+        assert results[0].result() == b'router'
+        assert results[3].result() == [b'0', b'1', b'2', b'3', b'4', b'5']
+
+
+if __name__ == '__main__':
+    test_batched_scatter()
@@ -0,0 +1,90 @@
+from threading import Thread
+import multiprocessing
+import pickle
+
+from pylm.persistence.kv import DictDB
+
+
+def test_dictdb():
+    cache = DictDB(stripes=4)
+    for i in range(100):
+        cache.set('session-{}'.format(i), b'session')
+        cache.set('task-{}'.format(i), b'task')
+
+    assert len(cache) == 200
+    assert 'task-10' in cache
+    assert cache.get('task-10') == b'task'
+    assert cache.get('missing') is None
+
+    cache.delete('task-10')
+    assert 'task-10' not in cache
+
+    cache.clean('session-')
+    assert len(cache) == 99
+    assert all(cache.get('task-{}'.format(i)) == b'task'
+               for i in range(11, 100))
+
+    # The instances don't share the data, and they can be pickled
+    copy = pickle.loads(pickle.dumps(cache))
+    copy.set('task-10', b'again')
+    assert cache.get('task-10') is None
+    assert len(copy) == 100
+
+
+def lookup(cache, keys, queue):
+    queue.put([cache.get(key) for key in keys])
+
+
+def test_dictdb_spawn():
+    """
+    A process gets the keys of a cache that was pickled by another one,
+    where the hashes of the keys are different.
+    """
+    cache = DictDB()
+    cache.set('name', b'x')
+    cache.set('worker_push_address', b'y')
+
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=lookup,
+                              args=(cache, ['name', 'worker_push_address'],
+                                    queue))
+    process.start()
+    try:
+        assert queue.get(timeout=30) == [b'x', b'y']
+    finally:
+        process.join()
+
+
+def test_dictdb_threads():
+    """
+    Writes, reads and cleanups from many threads at once.
+    """
+    cache = DictDB()
+
+    def write(index):
+        for i in range(1000):
+            key = 'thread{}-{}'.format(index, i)
+            cache.set(key, key.encode('utf-8'))
+            assert cache.get(key) == key.encode('utf-8')
+
+    def clean():
+        for i in range(50):
+            for j in range(100):
+                cache.set('session-{}'.format(j), b'session')
+            cache.clean('session-')
+
+    threads = [Thread(target=write, args=(i,)) for i in range(4)]
+    threads.append(Thread(target=clean))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(cache) == 4000
+
+
+if __name__ == '__main__':
+    test_dictdb()
+    test_dictdb_spawn()
+    test_dictdb_threads()
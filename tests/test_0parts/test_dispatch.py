@@ -0,0 +1,82 @@
+from pylm.parts.dispatch import DispatchTable, parse, target, function_id
+from pylm.servers import Worker
+from pylm.parts.messages_pb2 import PalmMessage
+
+
+class MyServer(object):
+    def foo(self, payload):
+        return b'foo ' + payload
+
+    def bar(self, payload):
+        return b'bar ' + payload
+
+    def _private(self, payload):
+        return payload
+
+
+class MyWorker(Worker):
+    def foo(self, payload):
+        return payload
+
+
+def test_parse():
+    assert parse('server.foo') == (('server', 'foo'),)
+    assert parse('first.foo second.bar') == (('first', 'foo'),
+                                             ('second', 'bar'))
+
+    message = PalmMessage()
+    message.function = 'first.foo second.bar'
+    message.stage = 1
+    assert target(message) == ('second', 'bar')
+
+    for function in ('server', '', 'first.foo second'):
+        try:
+            parse(function)
+        except ValueError:
+            pass
+        else:
+            assert False, function
+
+
+def test_dispatch_table():
+    server = MyServer()
+    table = DispatchTable(server)
+
+    assert table.names == ['bar', 'foo']
+    assert table.lookup('foo')(b'x') == b'foo x'
+    assert table.lookup('missing') is None
+    assert table.lookup('_private')(b'x') == b'x'
+
+    message = PalmMessage()
+    message.function = 'server.foo'
+    assert table.function(message) == 'foo'
+
+    # The ids are stable, and they must match the function string
+    assert table.ids == {'bar': function_id('bar'), 'foo': function_id('foo')}
+    message.function_id = table.ids['foo']
+    assert table.function(message) == 'foo'
+    message.function_id = table.ids['bar']
+    assert table.function(message) is None
+
+    message.function = ''
+    assert table.function(message) == 'bar'
+    message.function_id = 3
+    assert table.function(message) is None
+
+    # The misses are not kept
+    for i in range(10):
+        assert table.lookup('missing{}'.format(i)) is None
+    assert sorted(table.functions) == ['_private', 'bar', 'foo']
+
+    # Only the user functions of a server have ids
+    worker = MyWorker('worker', 'inproc://dispatch_db',
+                      push_address='inproc://dispatch_push',
+                      pull_address='inproc://dispatch_pull')
+    table = DispatchTable(worker)
+    assert table.names == ['foo']
+    assert table.lookup('set') is not None
+
+
+if __name__ == '__main__':
+    test_parse()
+    test_dispatch_table()
@@ -1,4 +1,4 @@
-from pylm.parts.core import zmq_context
+from pylm.parts.core import zmq_context, pack
 from pylm.parts.messages_pb2 import PalmMessage
 from pylm.parts.gateways import GatewayRouter, GatewayDealer, HttpGateway
 from pylm.persistence.kv import DictDB
@@ -114,6 +114,45 @@ def test_gateway_dealer():
     assert message.payload == b'This is a message'
 
 
+def test_gateway_dealer_split():
+    """
+    The dealer gets the payload of a message in a frame of its own.
+    """
+    broker = zmq_context.socket(zmq.ROUTER)
+    broker.bind('inproc://split_broker')
+    router = zmq_context.socket(zmq.ROUTER)
+    router.bind('inproc://split_gateway_router')
+
+    dealer = GatewayDealer(listen_address='inproc://split_gateway_router',
+                           broker_address='inproc://split_broker',
+                           logger=logging, messages=1)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(dealer.start)
+        message = PalmMessage()
+        message.client = 'client'
+        message.pipeline = '0'
+        message.function = 'f.servername'
+        message.stage = 1
+        message.payload = b'This is a message'
+        message.split = True
+        broker.send_multipart([b'gateway_dealer', b''] + pack(message))
+
+        assert router.poll(5000)
+        [dealer_id, target, empty, data] = router.recv_multipart()
+        broker.recv_multipart()
+        future.result()
+
+    dealer.cleanup()
+    broker.close()
+    router.close()
+
+    got = PalmMessage()
+    got.ParseFromString(data)
+    assert target == b'client'
+    assert got.payload == b'This is a message'
+
+
 def test_gateway_http():
     """
     Test function for the complete gateway with a dummy router.
@@ -166,4 +205,5 @@ def test_gateway_http():
 if __name__ == "__main__":
     test_gateway_router()
     test_gateway_dealer()
+    test_gateway_dealer_split()
     test_gateway_http()
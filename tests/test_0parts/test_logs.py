@@ -0,0 +1,35 @@
+from contextlib import redirect_stdout
+import logging
+import io
+
+from pylm.parts.logs import console, flush, ConsoleHandler
+
+
+def test_console():
+    logger = console(name='test_logs', level=logging.INFO)
+    # The handler is attached only once
+    logger = console(name='test_logs', level=logging.INFO)
+    assert len([handler for handler in logger.handlers
+                if isinstance(handler, ConsoleHandler)]) == 1
+
+    output = io.StringIO()
+    with redirect_stdout(output):
+        arguments = ['first']
+        logger.debug('%s is not logged', 'this')
+        logger.info('Logged %s', arguments)
+        # The arguments are merged in the thread that logs
+        arguments.append('second')
+        try:
+            raise ValueError('broken')
+        except ValueError:
+            logger.exception('Failed')
+        flush()
+
+    output = output.getvalue()
+    assert 'not logged' not in output
+    assert "test_logs - INFO - Logged ['first']\n" in output
+    assert 'ValueError: broken' in output
+
+
+if __name__ == '__main__':
+    test_console()
@@ -0,0 +1,127 @@
+import concurrent.futures
+import logging
+import urllib.request
+
+from pylm.clients import Client
+from pylm.parts.metrics import Histogram, Registry, registry
+from pylm.parts.services import CacheService, MetricsService
+from pylm.persistence.kv import DictDB
+
+
+def test_histogram():
+    histogram = Histogram()
+    assert histogram.percentile(99) == 0.0
+
+    for i in range(99):
+        histogram.record(0.001)
+    histogram.record(1.0)
+
+    # Within one part in eight of the latency
+    assert 0.001 <= histogram.percentile(50) < 0.001 * 1.1
+    assert 0.001 <= histogram.percentile(99) < 0.001 * 1.1
+    assert 1.0 <= histogram.percentile(99.9) < 1.1
+
+    buckets = histogram.buckets()
+    assert [count for upper, count in buckets] == sorted(
+        count for upper, count in buckets)
+    assert buckets[-1][1] == 100
+    assert histogram.summary()['count'] == 100
+
+    # Latencies too long for the histogram go to the last bucket
+    histogram.record(1000)
+    assert histogram.percentile(100) > 100
+    assert histogram.buckets()[-1][1] == 100
+
+
+def test_registry():
+    metrics = Registry()
+    part = metrics.part(b'Pull')
+    assert metrics.part('Pull') is part
+
+    part.inc('messages_in')
+    part.inc('messages_in', 2)
+    part.observe('latency', 0.002)
+
+    snapshot = metrics.snapshot()
+    assert snapshot['Pull']['counters'] == {'messages_in': 3}
+    assert snapshot['Pull']['latencies']['latency']['count'] == 1
+
+    text = metrics.render()
+    assert 'pylm_messages_in_total{part="Pull"} 3' in text
+    assert 'pylm_latency_seconds_bucket{part="Pull",le="+Inf"} 1' in text
+    assert 'pylm_latency_seconds_count{part="Pull"} 1' in text
+
+
+def test_shared_metrics():
+    metrics = Registry()
+
+    def update(part):
+        for i in range(20000):
+            metrics.part('Server').inc('errors')
+            metrics.part('Server').observe('latency', 0.001)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(update, range(8)))
+
+    snapshot = metrics.snapshot()['Server']
+    assert snapshot['counters']['errors'] == 160000
+    assert snapshot['latencies']['latency']['count'] == 160000
+
+
+def test_metrics_service():
+    metrics = Registry()
+    metrics.part('Pub').inc('messages_out', 5)
+
+    service = MetricsService('metrics', 'http://127.0.0.1:0',
+                             logger=logging,
+                             messages=1,
+                             metrics=metrics)
+    port = service.server.server_address[1]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(service.start)
+        with urllib.request.urlopen(
+                'http://127.0.0.1:{}/metrics'.format(port)) as response:
+            text = response.read().decode('utf-8')
+
+    service.cleanup()
+    assert 'pylm_messages_out_total{part="Pub"} 5' in text
+
+    try:
+        MetricsService('metrics', 'localhost')
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_cache_stats():
+    cache = CacheService('metrics_cache', 'inproc://metrics_db',
+                         cache=DictDB(),
+                         logger=logging,
+                         messages=3)
+
+    def client():
+        with Client('server', 'inproc://metrics_db',
+                    push_address='inproc://metrics_pull',
+                    sub_address='inproc://metrics_pub',
+                    logging_level=logging.WARNING,
+                    this_config=True) as client:
+            client.get('missing')
+            client.get('missing')
+            return client.stats()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        executor.submit(cache.start)
+        stats = executor.submit(client).result()
+
+    assert stats['metrics_cache']['counters']['misses'] == 2
+    assert 'metrics_cache' in registry.snapshot()
+
+
+if __name__ == '__main__':
+    test_histogram()
+    test_registry()
+    test_shared_metrics()
+    test_metrics_service()
+    test_cache_stats()
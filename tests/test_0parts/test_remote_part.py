@@ -0,0 +1,105 @@
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+import zmq
+
+from pylm.parts.core import zmq_context
+from pylm.parts.servers import RemotePart, _relay_outbound
+from pylm.parts.services import PushService
+
+
+def scatter(message_data):
+    yield message_data
+
+
+def test_remote_part_build():
+    """
+    Attributes set to the placeholder end up in the part, even after the
+    placeholder is sent to another process.
+    """
+    remote = RemotePart(PushService, 'outbound', 'push',
+                        'inproc://remote_part_push', {})
+    remote.scatter = scatter
+
+    remote = pickle.loads(pickle.dumps(remote))
+    part = remote.build(logging, 'inproc://remote_part_broker')
+
+    assert part.name == b'push'
+    assert part.scatter is scatter
+    part.cleanup()
+
+
+def test_relay_restart():
+    """
+    The messages that an outbound part did not answer when it died get to
+    the part that replaces it. A message that kills the part twice fails.
+    """
+    address = 'ipc://{}'.format(os.path.join(
+        tempfile.gettempdir(), 'pylm-test-relay-{}'.format(os.getpid())))
+    router = zmq_context.socket(zmq.ROUTER)
+    router.bind('inproc://relay_router')
+    frontend = zmq_context.socket(zmq.DEALER)
+    frontend.setsockopt(zmq.IDENTITY, b'push')
+    frontend.connect('inproc://relay_router')
+    backend = zmq_context.socket(zmq.DEALER)
+    backend.bind(address)
+    threading.Thread(target=_relay_outbound,
+                     args=(frontend, backend, logging),
+                     daemon=True).start()
+
+    def part():
+        socket = zmq_context.socket(zmq.REP)
+        socket.connect(address)
+        return socket
+
+    def die(socket):
+        socket.close(linger=0)
+        # Give some time to the relay to see it
+        time.sleep(0.2)
+
+    def receive(socket):
+        assert socket.poll(5000)
+        return socket.recv()
+
+    # The router drops the messages to peers it does not know yet
+    first = part()
+    time.sleep(0.2)
+    router.send_multipart([b'push', b'', b'm1'])
+    assert receive(first) == b'm1'
+    die(first)
+
+    router.send_multipart([b'push', b'', b'm2'])
+    second = part()
+    assert receive(second) == b'm1'
+    second.send(b'r1')
+    assert receive(second) == b'm2'
+    second.send(b'r2')
+    assert receive(router) == b'push'
+    assert router.recv_multipart() == [b'', b'r1']
+    assert router.recv_multipart()[-1] == b'r2'
+
+    router.send_multipart([b'push', b'', b'm3'])
+    assert receive(second) == b'm3'
+    die(second)
+    third = part()
+    assert receive(third) == b'm3'
+    die(third)
+
+    fourth = part()
+    assert router.poll(5000)
+    assert router.recv_multipart() == [b'push', b'', b'0']
+    router.send_multipart([b'push', b'', b'm4'])
+    assert receive(fourth) == b'm4'
+    fourth.send(b'r4')
+    assert router.recv_multipart()[-1] == b'r4'
+
+    fourth.close()
+    router.close()
+
+
+if __name__ == '__main__':
+    test_remote_part_build()
+    test_relay_restart()
@@ -1,5 +1,5 @@
 from pylm.persistence.kv import DictDB
-from pylm.parts.core import zmq_context
+from pylm.parts.core import zmq_context, PROBE_TOPIC, FEATURES
 from pylm.parts.messages_pb2 import PalmMessage
 from pylm.parts.services import PubService
 from concurrent.futures import ThreadPoolExecutor
@@ -78,5 +78,46 @@ def test_pub_client():
                 print(*lines)
 
 
+def test_probe_busy_broker():
+    """
+    The probes get an answer while the broker has messages waiting.
+    """
+    message = PalmMessage()
+    message.pipeline = 'pipeline'
+    message.client = 'client'
+    message.stage = 1
+    message.function = 'function'
+    message.payload = b'0'
+
+    broker = zmq_context.socket(zmq.DEALER)
+    broker.bind('inproc://probe_broker')
+    service = PubService('probe_service',
+                         listen_address='inproc://probe_pub',
+                         broker_address='inproc://probe_broker',
+                         logger=logging,
+                         messages=2000)
+
+    # The broker has messages waiting at every poll of the service
+    for i in range(2000):
+        broker.send_multipart([b'', message.SerializeToString()])
+
+    client = zmq_context.socket(zmq.SUB)
+    client.setsockopt(zmq.SUBSCRIBE, PROBE_TOPIC)
+    client.connect('inproc://probe_pub')
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(service.start)
+        answered = client.poll(5000)
+        future.result()
+
+    assert answered
+    assert client.recv_multipart() == [PROBE_TOPIC, FEATURES]
+
+    service.cleanup()
+    broker.close(linger=0)
+    client.close()
+
+
 if __name__ == '__main__':
     test_pub_client()
+    test_probe_busy_broker()
@@ -0,0 +1,87 @@
+import logging
+
+import zmq
+
+from pylm.parts.core import zmq_context
+from pylm.parts.messages_pb2 import PalmMessage
+from pylm.parts.shards import ShardDispatcher, ShardCollector
+
+
+def test_dispatcher_keeps_pipelines_together():
+    shard_addresses = ['inproc://shard_pull0', 'inproc://shard_pull1']
+    shards = []
+    for address in shard_addresses:
+        shards.append(zmq_context.socket(zmq.PULL))
+        shards[-1].bind(address)
+
+    dispatcher = ShardDispatcher('Pull',
+                                 'inproc://shard_external_pull',
+                                 shard_addresses,
+                                 logger=logging,
+                                 messages=20)
+
+    push = zmq_context.socket(zmq.PUSH)
+    push.connect('inproc://shard_external_pull')
+
+    message = PalmMessage()
+    message.function = 'server.function'
+    for i in range(20):
+        message.pipeline = 'pipeline{}'.format(i % 4)
+        message.payload = str(i).encode('utf-8')
+        push.send(message.SerializeToString())
+
+    assert dispatcher.start() == b'Pull'
+
+    pipelines = {}
+    poller = zmq.Poller()
+    for socket in shards:
+        poller.register(socket, zmq.POLLIN)
+
+    got = 0
+    while got < 20:
+        for socket in dict(poller.poll(1000)):
+            message.ParseFromString(socket.recv())
+            pipelines.setdefault(message.pipeline, set()).add(socket)
+            got += 1
+
+    # The messages of a pipeline are never split between shards
+    assert len(pipelines) == 4
+    assert all(len(sockets) == 1 for sockets in pipelines.values())
+
+    push.close()
+    dispatcher.cleanup()
+    for socket in shards:
+        socket.close()
+
+
+def test_collector_merges_shards():
+    shard_addresses = ['inproc://shard_push0', 'inproc://shard_push1']
+    shards = []
+    for address in shard_addresses:
+        shards.append(zmq_context.socket(zmq.PUSH))
+        shards[-1].bind(address)
+
+    collector = ShardCollector('WorkerPush',
+                               'inproc://shard_external_push',
+                               shard_addresses,
+                               logger=logging,
+                               messages=4)
+
+    pull = zmq_context.socket(zmq.PULL)
+    pull.connect('inproc://shard_external_push')
+
+    for i, socket in enumerate(shards * 2):
+        socket.send(str(i).encode('utf-8'))
+
+    assert collector.start() == b'WorkerPush'
+    assert sorted(pull.recv() for i in range(4)) == [b'0', b'1', b'2', b'3']
+
+    pull.close()
+    collector.cleanup()
+    for socket in shards:
+        socket.close()
+
+
+if __name__ == '__main__':
+    test_dispatcher_keeps_pipelines_together()
+    test_collector_merges_shards()
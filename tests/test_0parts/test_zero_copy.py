@@ -0,0 +1,87 @@
+import concurrent.futures
+import logging
+
+import zmq
+
+from pylm.parts.core import zmq_context, Router, pack, unpack_frames
+from pylm.parts.messages_pb2 import PalmMessage
+from pylm.parts.services import PullService, PushService
+
+
+def test_zero_copy_forwarding():
+    """
+    Large payloads go from the pull service to the push service as the
+    frames that were received, and the scatter function does not see them.
+    """
+    router = Router(inbound_address='inproc://zero_copy_inbound',
+                    outbound_address='inproc://zero_copy_outbound',
+                    logger=logging,
+                    messages=2,
+                    zero_copy=1024)
+    router.register_inbound('puller', route='pusher')
+    router.register_outbound('pusher')
+
+    puller = PullService('puller',
+                         'inproc://zero_copy_pull',
+                         broker_address=router.inbound_address,
+                         logger=logging,
+                         messages=2,
+                         zero_copy=1024)
+
+    seen = []
+
+    def scatter(message):
+        seen.append(message.payload)
+        yield message
+
+    puller.scatter = scatter
+
+    pusher = PushService('pusher',
+                         'inproc://zero_copy_push',
+                         broker_address=router.outbound_address,
+                         logger=logging,
+                         messages=2,
+                         zero_copy=1024)
+
+    large = bytes(range(256)) * 1024
+
+    def client():
+        push = zmq_context.socket(zmq.PUSH)
+        push.connect('inproc://zero_copy_pull')
+        pull = zmq_context.socket(zmq.PULL)
+        pull.connect('inproc://zero_copy_push')
+
+        message = PalmMessage()
+        message.pipeline = '0'
+        message.client = '0'
+        message.stage = 0
+        message.function = 'f'
+        message.split = True
+        for payload in [b'small', large]:
+            message.payload = payload
+            push.send_multipart(pack(message))
+
+        got = []
+        for i in range(2):
+            frames = pull.recv_multipart(copy=False)
+            for message, payload in unpack_frames(frames):
+                got.append(message.payload if payload is None else payload.bytes)
+
+        push.close()
+        pull.close()
+        return got
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        results = [executor.submit(router.start),
+                   executor.submit(puller.start),
+                   executor.submit(pusher.start),
+                   executor.submit(client)]
+
+        assert results[0].result() == b'router'
+        assert results[3].result() == [b'small', large]
+
+    assert seen == [b'small', b'']
+
+
+if __name__ == '__main__':
+    test_zero_copy_forwarding()
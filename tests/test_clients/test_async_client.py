@@ -0,0 +1,94 @@
+import asyncio
+import concurrent.futures
+import logging
+
+import zmq
+
+from pylm.clients import AsyncClient
+from pylm.parts.core import zmq_context, pack, unpack
+from pylm.servers import Server
+
+
+class MyServer(Server):
+    def reverse(self, message):
+        return message[::-1]
+
+
+def test_async_client():
+    # 20 evals and a job with 5 messages
+    server = MyServer('server',
+                      'inproc://async_client_db',
+                      'inproc://async_client_pull',
+                      'inproc://async_client_pub',
+                      log_level=logging.WARNING,
+                      messages=25)
+
+    async def client():
+        client = AsyncClient('server', 'inproc://async_client_db',
+                             logging_level=logging.WARNING)
+
+        payloads = [str(i * 100).encode('utf-8') for i in range(20)]
+        results = await asyncio.gather(
+            *[client.eval('server.reverse', payload) for payload in payloads]
+        )
+
+        got = []
+        async for result in client.job('server.reverse',
+                                       [b'ab', b'cd', b'ef', b'gh', b'ij'],
+                                       messages=5):
+            got.append(result)
+
+        assert await client.get('name') == b'server'
+        client.clean()
+        return payloads, results, got
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        # The client gets the configuration with three requests, and the name
+        # once again.
+        executor.submit(server.start, cache_messages=4)
+        payloads, results, got = executor.submit(asyncio.run, client()).result()
+
+    # Each call gets its own result
+    assert results == [payload[::-1] for payload in payloads]
+    assert sorted(got) == [b'ba', b'dc', b'fe', b'hg', b'ji']
+
+
+def test_undecodable_result():
+    """
+    A message that can't be decoded does not stop the results of the calls.
+    """
+    pull = zmq_context.socket(zmq.PULL)
+    pull.bind('inproc://async_undecodable_pull')
+    pub = zmq_context.socket(zmq.PUB)
+    pub.bind('inproc://async_undecodable_pub')
+
+    def server():
+        message = next(unpack(pull.recv_multipart()))
+        topic = message.client.encode('utf-8')
+        pub.send_multipart([topic, b'\xff\xff'])
+        message.payload = b'result'
+        pub.send_multipart([topic] + pack(message))
+
+    async def client():
+        client = AsyncClient('server', 'inproc://async_undecodable_db',
+                             push_address='inproc://async_undecodable_pull',
+                             sub_address='inproc://async_undecodable_pub',
+                             logging_level=logging.CRITICAL,
+                             this_config=True,
+                             probe_timeout=100)
+        result = await asyncio.wait_for(
+            client.eval('server.foo', b'payload'), 5)
+        client.clean()
+        return result
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        executor.submit(server)
+        assert executor.submit(asyncio.run, client()).result() == b'result'
+
+    pull.close()
+    pub.close()
+
+
+if __name__ == '__main__':
+    test_async_client()
+    test_undecodable_result()
@@ -0,0 +1,80 @@
+import concurrent.futures
+import logging
+import zlib
+
+import pytest
+from google.protobuf.message import DecodeError
+
+from pylm.clients import Client
+from pylm.parts.compression import register_codec, check_codec, compress, \
+    decompress
+from pylm.parts.messages_pb2 import PalmMessage
+from pylm.servers import Server
+
+
+class MyServer(Server):
+    def size(self, message):
+        # The user function gets the payload decompressed
+        return str(len(message)).encode('utf-8') + b' ' + message
+
+
+def test_compress_message():
+    register_codec('zlib1',
+                   lambda payload: zlib.compress(payload, 1),
+                   zlib.decompress)
+
+    message = PalmMessage()
+    message.payload = b'a' * 2048
+    compress(message, 'zlib1')
+    assert message.codec == 'zlib1'
+    assert len(message.payload) < 2048
+
+    decompress(message)
+    assert message.codec == ''
+    assert message.payload == b'a' * 2048
+
+    # Small payloads are not compressed
+    message.payload = b'small'
+    compress(message, 'zlib1')
+    assert message.codec == ''
+    assert message.payload == b'small'
+
+    with pytest.raises(ValueError):
+        check_codec('unknown')
+
+    message.codec = 'unknown'
+    with pytest.raises(DecodeError):
+        decompress(message)
+
+
+def test_compressed_calls():
+    server = MyServer('server',
+                      'inproc://compression_db',
+                      'inproc://compression_pull',
+                      'inproc://compression_pub',
+                      log_level=logging.WARNING,
+                      messages=2,
+                      codec='lzma')
+
+    payload = b'name,value\n' + b'a,1\n' * 10000
+
+    def client():
+        with Client('server', 'inproc://compression_db',
+                    logging_level=logging.WARNING,
+                    codec='zlib') as client:
+            large = client.eval('server.size', payload)
+            small = client.eval('server.size', b'small')
+
+        return large, small
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        executor.submit(server.start, cache_messages=3)
+        large, small = executor.submit(client).result()
+
+    assert large == str(len(payload)).encode('utf-8') + b' ' + payload
+    assert small == b'5 small'
+
+
+if __name__ == '__main__':
+    test_compress_message()
+    test_compressed_calls()
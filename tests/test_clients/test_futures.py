@@ -0,0 +1,81 @@
+import concurrent.futures
+import logging
+import time
+
+import zmq
+
+from pylm.clients import Client
+from pylm.parts.core import zmq_context, pack, unpack
+from pylm.servers import Server
+
+
+class MyServer(Server):
+    def slow(self, message):
+        # The first messages take longer, so the results arrive reversed.
+        time.sleep(0.02 * (10 - int(message)))
+        return b'slow ' + message
+
+
+def test_eval_many():
+    server = MyServer('server',
+                      'inproc://futures_db',
+                      'inproc://futures_pull',
+                      'inproc://futures_pub',
+                      log_level=logging.WARNING,
+                      messages=11,
+                      concurrency=10,
+                      ordered=False)
+
+    def client():
+        with Client('server', 'inproc://futures_db',
+                    logging_level=logging.WARNING) as client:
+            payloads = [str(i).encode('utf-8') for i in range(10)]
+            futures = client.eval_many('server.slow', payloads)
+
+            # The futures do not get in the way of the rest of the calls
+            single = client.eval('server.slow', b'9')
+
+            results = [future.result(timeout=5) for future in futures]
+            return single, payloads, results
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        executor.submit(server.start, cache_messages=3)
+        single, payloads, results = executor.submit(client).result()
+
+    assert single == b'slow 9'
+    assert results == [b'slow ' + payload for payload in payloads]
+
+
+def test_undecodable_result():
+    """
+    A message that can't be decoded does not stop the results of the
+    futures.
+    """
+    pull = zmq_context.socket(zmq.PULL)
+    pull.bind('inproc://undecodable_pull')
+    pub = zmq_context.socket(zmq.PUB)
+    pub.bind('inproc://undecodable_pub')
+
+    with Client('server', 'inproc://undecodable_db',
+                push_address='inproc://undecodable_pull',
+                sub_address='inproc://undecodable_pub',
+                logging_level=logging.CRITICAL,
+                this_config=True,
+                probe_timeout=100) as client:
+        future = client.submit('server.foo', b'payload')
+        message = next(unpack(pull.recv_multipart()))
+        topic = message.client.encode('utf-8')
+
+        pub.send_multipart([topic, b'\xff\xff'])
+        message.payload = b'result'
+        pub.send_multipart([topic] + pack(message))
+
+        assert future.result(timeout=5) == b'result'
+
+    pull.close()
+    pub.close()
+
+
+if __name__ == '__main__':
+    test_eval_many()
+    test_undecodable_result()
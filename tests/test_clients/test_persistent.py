@@ -0,0 +1,50 @@
+import concurrent.futures
+import logging
+import time
+
+from pylm.clients import Client
+from pylm.servers import Server
+
+
+class MyServer(Server):
+    def foo(self, message):
+        return b'foo ' + message
+
+
+def test_persistent_client():
+    server = MyServer('server',
+                      'inproc://persistent_db',
+                      'inproc://persistent_pull',
+                      'inproc://persistent_pub',
+                      log_level=logging.WARNING,
+                      messages=3)
+
+    def client():
+        start = time.time()
+        with Client('server', 'inproc://persistent_db',
+                    logging_level=logging.WARNING) as client:
+            # The server answers the probe, the client does not wait
+            connected = time.time() - start
+            sockets = client.push_socket, client.sub_socket
+
+            results = [client.eval('server.foo', b'1'),
+                       client.eval('server.foo', b'2')]
+            results.extend(client.job('server.foo', [b'3'], messages=1))
+
+            # Same sockets for all the calls
+            assert (client.push_socket, client.sub_socket) == sockets
+
+        assert client.push_socket.closed
+        assert client.sub_socket.closed
+        return connected, results
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        executor.submit(server.start, cache_messages=3)
+        connected, results = executor.submit(client).result()
+
+    assert connected < 0.5
+    assert results == [b'foo 1', b'foo 2', b'foo 3']
+
+
+if __name__ == '__main__':
+    test_persistent_client()
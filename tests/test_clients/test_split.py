@@ -0,0 +1,100 @@
+import concurrent.futures
+import logging
+
+from pylm.clients import Client
+from pylm.parts.core import pack, unpack
+from pylm.parts.messages_pb2 import PalmMessage
+from pylm.servers import Server
+
+
+class MyServer(Server):
+    def reverse(self, message):
+        return message[::-1]
+
+
+def test_pack_unpack():
+    message = PalmMessage()
+    message.pipeline = '0'
+    message.function = 'server.reverse'
+    message.payload = b'payload'
+
+    assert len(pack(message)) == 1
+
+    message.split = True
+    frames = pack(message)
+    assert frames[1] == b'payload'
+    assert message.payload == b'payload'
+
+    # Single-frame and split messages can share the same list of frames
+    message.split = False
+    got = list(unpack(frames + pack(message)))
+    assert [m.payload for m in got] == [b'payload', b'payload']
+    assert [m.split for m in got] == [True, False]
+
+
+def test_split_payload():
+    server = MyServer('server',
+                      'inproc://split_db',
+                      'inproc://split_pull',
+                      'inproc://split_pub',
+                      log_level=logging.WARNING,
+                      messages=2)
+
+    payload = bytes(range(256)) * 4096
+
+    def client():
+        with Client('server', 'inproc://split_db',
+                    logging_level=logging.WARNING,
+                    split=True) as client:
+            split = client.split
+            first = client.eval('server.reverse', payload)
+
+        with Client('server', 'inproc://split_db',
+                    logging_level=logging.WARNING) as client:
+            second = client.eval('server.reverse', payload)
+
+        return split, first, second
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        executor.submit(server.start, cache_messages=6)
+        split, first, second = executor.submit(client).result()
+
+    assert split
+    assert first == payload[::-1]
+    assert second == payload[::-1]
+
+
+def test_zero_copy_client():
+    server = MyServer('server',
+                      'inproc://zero_copy_db',
+                      'inproc://zero_copy_pull',
+                      'inproc://zero_copy_pub',
+                      log_level=logging.WARNING,
+                      messages=2)
+
+    payload = bytearray(range(256)) * 4096
+
+    def client():
+        with Client('server', 'inproc://zero_copy_db',
+                    logging_level=logging.WARNING,
+                    split=True,
+                    zero_copy=65536) as client:
+            large = client.eval('server.reverse', payload)
+            small = client.eval('server.reverse', b'small')
+
+        return large, small
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        executor.submit(server.start, cache_messages=3)
+        large, small = executor.submit(client).result()
+
+    # Large results are not copied
+    assert isinstance(large, memoryview)
+    assert large == payload[::-1]
+    assert small == b'llams'
+
+
+if __name__ == '__main__':
+    test_pack_unpack()
+    test_split_payload()
+    test_zero_copy_client()
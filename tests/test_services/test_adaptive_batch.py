@@ -0,0 +1,86 @@
+import concurrent.futures
+import logging
+
+import zmq
+
+from pylm.parts.core import zmq_context
+from pylm.parts.dispatch import AdaptiveBatch, batched
+from pylm.parts.messages_pb2 import PalmMessage
+from pylm.servers import Server
+
+
+class BatchServer(Server):
+    sizes = []
+
+    @batched
+    def square(self, payloads):
+        self.sizes.append(len(payloads))
+        return [str(int(payload) ** 2).encode('utf-8')
+                for payload in payloads]
+
+
+def test_adaptive_batch_size():
+    batch = AdaptiveBatch(10, max_size=4)
+
+    # Grows while the batches are full and fast
+    for i in range(5):
+        batch.update(0.001, batch.size)
+    assert batch.size == 4
+
+    # Halves when the latency goes over the target
+    batch.update(0.02, 4)
+    assert batch.size == 2
+
+    # Shrinks when the queue gets empty
+    batch.update(0.001, 1)
+    assert batch.size == 1
+
+
+def test_adaptive_batch_server():
+    server = BatchServer('server', 'inproc://adaptive_db',
+                         'inproc://adaptive_pull',
+                         'inproc://adaptive_pub',
+                         log_level=logging.WARNING,
+                         messages=40,
+                         batch_latency=1000,
+                         max_batch=8)
+
+    sub = zmq_context.socket(zmq.SUB)
+    sub.setsockopt_string(zmq.SUBSCRIBE, '')
+    sub.connect(server.pub_address)
+    push = zmq_context.socket(zmq.PUSH)
+    push.connect(server.pull_address)
+
+    # All the messages are waiting when the server starts
+    message = PalmMessage()
+    message.pipeline = '0'
+    message.client = 'client'
+    message.stage = 0
+    message.function = 'server.square'
+    for i in range(40):
+        message.payload = str(i).encode('utf-8')
+        push.send(message.SerializeToString())
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        handler = executor.submit(server._execution_handler)
+
+        got = []
+        for i in range(40):
+            topic, message_data = sub.recv_multipart()
+            message.ParseFromString(message_data)
+            got.append(message.payload)
+
+        handler.result()
+
+    assert got == [str(i ** 2).encode('utf-8') for i in range(40)]
+    assert sum(BatchServer.sizes) == 40
+    assert BatchServer.sizes[:4] == [1, 2, 3, 4]
+    assert max(BatchServer.sizes) == 8
+
+    sub.close()
+    push.close()
+
+
+if __name__ == '__main__':
+    test_adaptive_batch_size()
+    test_adaptive_batch_server()
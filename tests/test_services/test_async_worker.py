@@ -0,0 +1,147 @@
+import asyncio
+import concurrent.futures
+import logging
+import time
+
+import zmq
+
+from pylm.parts.core import zmq_context
+from pylm.parts.messages_pb2 import PalmMessage
+from pylm.parts.services import CacheService
+from pylm.persistence.kv import DictDB
+from pylm.parts.dispatch import batched
+from pylm.servers import AsyncWorker
+
+
+class MyWorker(AsyncWorker):
+    async def foo(self, message):
+        await asyncio.sleep(0.1)
+        await self.set(message, 'last')
+        return b'processed ' + message
+
+    def bar(self, message):
+        return message
+
+
+def test_async_worker():
+    cache = DictDB()
+    cache.set('worker_push_address', b'inproc://async_worker_push')
+    cache.set('worker_pull_address', b'inproc://async_worker_pull')
+
+    # Two requests for the configuration, and one set for each message
+    cache_service = CacheService('db', 'inproc://async_worker_db',
+                                 cache=cache,
+                                 logger=logging,
+                                 messages=12)
+
+    push = zmq_context.socket(zmq.PUSH)
+    push.bind('inproc://async_worker_push')
+    pull = zmq_context.socket(zmq.PULL)
+    pull.bind('inproc://async_worker_pull')
+
+    worker = MyWorker('worker', 'inproc://async_worker_db',
+                      log_level=logging.WARNING,
+                      messages=11,
+                      concurrency=10)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        results = [executor.submit(cache_service.start),
+                   executor.submit(worker.start)]
+
+        message = PalmMessage()
+        message.pipeline = '0'
+        message.client = '0'
+        message.stage = 0
+
+        start = time.time()
+        message.function = 'master.foo'
+        for i in range(10):
+            message.payload = str(i).encode('utf-8')
+            push.send(message.SerializeToString())
+
+        got = []
+        for i in range(10):
+            message.ParseFromString(pull.recv())
+            got.append(message.payload)
+
+        # The messages wait at the same time
+        assert time.time() - start < 0.5
+        assert sorted(got) == sorted(
+            b'processed ' + str(i).encode('utf-8') for i in range(10))
+
+        # Plain functions work too
+        message.function = 'master.bar'
+        message.payload = b'plain'
+        push.send(message.SerializeToString())
+        message.ParseFromString(pull.recv())
+        assert message.payload == b'plain'
+
+        for future in results:
+            future.result()
+
+    assert cache.get('last') in [str(i).encode('utf-8') for i in range(10)]
+
+    push.close()
+    pull.close()
+
+
+class MyBatchedWorker(AsyncWorker):
+    sizes = []
+
+    @batched
+    def double(self, payloads):
+        self.sizes.append(len(payloads))
+        return [payload * 2 for payload in payloads]
+
+    async def single(self, message):
+        return b'single ' + message
+
+
+def test_async_worker_batched():
+    """
+    The consecutive messages of a batch that call a batched function go
+    together in a single call.
+    """
+    push = zmq_context.socket(zmq.PUSH)
+    push.bind('inproc://async_batched_push')
+    pull = zmq_context.socket(zmq.PULL)
+    pull.bind('inproc://async_batched_pull')
+
+    worker = MyBatchedWorker('worker', 'inproc://async_batched_db',
+                             push_address='inproc://async_batched_push',
+                             pull_address='inproc://async_batched_pull',
+                             log_level=logging.WARNING,
+                             messages=1)
+
+    frames = []
+    for function, payload in [('double', b'0'), ('double', b'1'),
+                              ('double', b'2'), ('single', b'3'),
+                              ('double', b'4')]:
+        message = PalmMessage()
+        message.pipeline = '0'
+        message.client = '0'
+        message.stage = 0
+        message.function = 'master.' + function
+        message.payload = payload
+        frames.append(message.SerializeToString())
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        result = executor.submit(worker.start)
+        push.send_multipart(frames)
+
+        got = []
+        for i in range(5):
+            message.ParseFromString(pull.recv())
+            got.append(message.payload)
+        result.result()
+
+    assert got == [b'00', b'11', b'22', b'single 3', b'44']
+    assert MyBatchedWorker.sizes == [3, 1]
+
+    push.close()
+    pull.close()
+
+
+if __name__ == '__main__':
+    test_async_worker()
+    test_async_worker_batched()
@@ -0,0 +1,128 @@
+import logging
+import time
+
+import zmq
+
+from pylm.parts.core import zmq_context, check_policy
+from pylm.parts.servers import part_setting
+from pylm.parts.services import PubService, PushService, WorkerPushService
+
+
+def test_settings():
+    assert check_policy('drop') == 'drop'
+    try:
+        check_policy('wait')
+    except ValueError:
+        pass
+    else:
+        assert False
+
+    assert part_setting(10, 'Pull') == 10
+    assert part_setting({'Pull': 10}, 'Pull') == 10
+    assert part_setting({'Pull': 10}, 'Pub') is None
+
+
+def test_push_drop():
+    """
+    The messages that don't fit in the queues of a worker that does not
+    read them are dropped and counted.
+    """
+    push = PushService('Push', 'inproc://backpressure_push',
+                       broker_address='inproc://backpressure_broker',
+                       logger=logging,
+                       hwm=2,
+                       policy='drop')
+    push.listen_to.bind('inproc://backpressure_push')
+
+    worker = zmq_context.socket(zmq.PULL)
+    worker.setsockopt(zmq.RCVHWM, 2)
+    worker.connect('inproc://backpressure_push')
+    time.sleep(0.1)
+
+    for i in range(10):
+        push._push([str(i).encode('utf-8')])
+
+    received = []
+    while worker.poll(100):
+        received.append(worker.recv())
+
+    assert received == [str(i).encode('utf-8') for i in range(len(received))]
+    assert push.dropped == 10 - len(received) > 0
+
+    worker.close()
+    push.cleanup()
+
+
+def test_credits_drop():
+    """
+    A worker with credits keeps the slots of the messages that were
+    dropped, since it never gets them.
+    """
+    push = WorkerPushService('WorkerPush', 'inproc://backpressure_credits',
+                             broker_address='inproc://backpressure_broker',
+                             logger=logging,
+                             credits=True,
+                             hwm=2,
+                             policy='drop')
+    push.listen_to.bind('inproc://backpressure_credits')
+
+    worker = zmq_context.socket(zmq.DEALER)
+    worker.identity = b'worker'
+    worker.setsockopt(zmq.RCVHWM, 2)
+    worker.connect('inproc://backpressure_credits')
+    worker.send(b'100')
+    time.sleep(0.1)
+
+    for i in range(10):
+        push._push([str(i).encode('utf-8')])
+
+    received = []
+    while worker.poll(100):
+        received.append(worker.recv())
+
+    assert push.dropped == 10 - len(received) > 0
+    assert push.worker_credits[b'worker'] == 100 - len(received)
+
+    worker.close()
+    push.cleanup()
+
+
+def test_pub_drop():
+    """
+    A slow subscriber does not lose messages silently with a policy.
+    """
+    pub = PubService('Pub', 'inproc://backpressure_pub',
+                     broker_address='inproc://backpressure_broker',
+                     logger=logging,
+                     hwm=2,
+                     policy='drop')
+    pub.listen_to.bind('inproc://backpressure_pub')
+
+    client = zmq_context.socket(zmq.SUB)
+    client.setsockopt(zmq.RCVHWM, 2)
+    client.setsockopt(zmq.SUBSCRIBE, b'client')
+    client.connect('inproc://backpressure_pub')
+    # The subscription gets to the publisher
+    assert pub.listen_to.poll(1000)
+    pub.listen_to.recv()
+
+    for i in range(10):
+        pub._send(pub.listen_to, [b'client', str(i).encode('utf-8')])
+
+    received = 0
+    while client.poll(100):
+        client.recv_multipart()
+        received += 1
+
+    assert 0 < received < 10
+    assert pub.dropped == 10 - received
+
+    client.close()
+    pub.cleanup()
+
+
+if __name__ == '__main__':
+    test_settings()
+    test_push_drop()
+    test_credits_drop()
+    test_pub_drop()
@@ -0,0 +1,134 @@
+import concurrent.futures
+import logging
+
+import zmq
+
+from pylm.clients import Client
+from pylm.parts.core import Router, zmq_context
+from pylm.parts.messages_pb2 import PalmMessage
+from pylm.parts.services import PullService, PubService, \
+    WorkerPullService, WorkerPushService
+from pylm.servers import Worker, MuxWorker
+from pylm.parts.dispatch import batched
+
+
+class MyWorker(Worker):
+    sizes = []
+
+    @batched
+    def double(self, payloads):
+        self.sizes.append(len(payloads))
+        return [payload * 2 for payload in payloads]
+
+    def single(self, payload):
+        return b'single ' + payload
+
+
+def test_batched_worker():
+    router = Router(inbound_address='inproc://batched_inbound',
+                    outbound_address='inproc://batched_outbound',
+                    logger=logging,
+                    messages=18)
+    router.register_inbound('Pull', route='WorkerPush')
+    router.register_inbound('WorkerPull', route='Pub')
+    router.register_outbound('WorkerPush')
+    router.register_outbound('Pub')
+
+    pull = PullService('Pull', 'inproc://batched_pull',
+                       broker_address=router.inbound_address,
+                       logger=logging,
+                       messages=9)
+    worker_push = WorkerPushService('WorkerPush', 'inproc://batched_push',
+                                    broker_address=router.outbound_address,
+                                    logger=logging,
+                                    messages=9,
+                                    batch=4,
+                                    batch_timeout=100)
+    worker_pull = WorkerPullService('WorkerPull', 'inproc://batched_results',
+                                    broker_address=router.inbound_address,
+                                    logger=logging,
+                                    messages=9)
+    pub = PubService('Pub', 'inproc://batched_pub',
+                     broker_address=router.outbound_address,
+                     logger=logging,
+                     messages=9)
+
+    worker = MyWorker('worker', 'inproc://batched_db',
+                      push_address='inproc://batched_push',
+                      pull_address='inproc://batched_results',
+                      log_level=logging.WARNING,
+                      messages=9)
+
+    payloads = [str(i).encode('utf-8') for i in range(8)]
+
+    def client():
+        with Client('server', 'inproc://batched_db',
+                    push_address='inproc://batched_pull',
+                    sub_address='inproc://batched_pub',
+                    logging_level=logging.WARNING,
+                    this_config=True) as client:
+            return (sorted(client.job('server.double', payloads, messages=8)),
+                    client.eval('server.single', b'payload'))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=7) as executor:
+        for part in (router, pull, worker_push, worker_pull, pub, worker):
+            executor.submit(part.start)
+        results, single = executor.submit(client).result(timeout=10)
+
+    assert results == sorted(payload * 2 for payload in payloads)
+    assert single == b'single payload'
+    assert sum(MyWorker.sizes) == 8
+    assert max(MyWorker.sizes) > 1
+
+
+class MyMuxWorker(MuxWorker):
+    @batched
+    def twice(self, payloads):
+        return [[payload, payload] for payload in payloads]
+
+
+def test_batched_mux_worker():
+    """
+    A multiplexing worker sends the results of all the messages of a batch.
+    """
+    push = zmq_context.socket(zmq.PUSH)
+    push.bind('inproc://batched_mux_push')
+    pull = zmq_context.socket(zmq.PULL)
+    pull.bind('inproc://batched_mux_pull')
+
+    worker = MyMuxWorker('worker', 'inproc://batched_mux_db',
+                         push_address='inproc://batched_mux_push',
+                         pull_address='inproc://batched_mux_pull',
+                         log_level=logging.WARNING,
+                         messages=3)
+
+    frames = []
+    for i in range(3):
+        message = PalmMessage()
+        message.pipeline = str(i)
+        message.client = '0'
+        message.stage = 0
+        message.function = 'master.twice'
+        message.payload = str(i).encode('utf-8')
+        frames.append(message.SerializeToString())
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        result = executor.submit(worker.start)
+        push.send_multipart(frames)
+
+        got = []
+        for i in range(6):
+            message.ParseFromString(pull.recv())
+            got.append((message.pipeline, message.payload))
+        result.result(timeout=10)
+
+    assert got == [(str(i), str(i).encode('utf-8'))
+                   for i in range(3) for j in range(2)]
+
+    push.close()
+    pull.close()
+
+
+if __name__ == '__main__':
+    test_batched_worker()
+    test_batched_mux_worker()
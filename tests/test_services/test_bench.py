@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+
+from pylm.bench.runner import percentile, run_case, compare
+from pylm.bench.micro import logging_calls, dictdb_calls
+from pylm.bench.__main__ import main
+
+
+def test_percentile():
+    ordered = list(range(1, 101))
+    assert percentile(ordered, 50) == 50
+    assert percentile(ordered, 99) == 99
+    assert percentile(ordered, 99.9) == 100
+    assert percentile([], 50) == 0.0
+
+
+def test_run_case():
+    result = run_case({'topology': 'server', 'transport': 'inproc',
+                       'size': 128, 'concurrency': 2, 'messages': 50,
+                       'warmup': 5, 'workers': 1, 'stages': 1,
+                       'settle': 0.2, 'timeout': 30})
+
+    assert 'error' not in result
+    assert result['messages'] == 50
+    assert result['throughput'] > 0
+    assert 0 < result['latency']['p50'] <= result['latency']['p99'] <= \
+        result['latency']['max']
+
+
+def test_compare():
+    def results(throughput, p99):
+        return {'results': [{'topology': 'master', 'transport': 'tcp',
+                             'size': 64, 'concurrency': 1,
+                             'throughput': throughput,
+                             'latency': {'p99': p99}}]}
+
+    [change] = compare(results(1000, 0.001), results(950, 0.00105))
+    assert not change['regression']
+    assert round(change['throughput'], 2) == -0.05
+
+    [change] = compare(results(1000, 0.001), results(1000, 0.002))
+    assert change['regression']
+
+    # Cases with errors are not compared
+    failed = {'results': [{'topology': 'master', 'transport': 'tcp',
+                           'size': 64, 'concurrency': 1, 'error': 'x'}]}
+    assert compare(results(1000, 0.001), failed) == []
+
+
+def test_cli_compare():
+    result = {'topology': 'cache', 'transport': 'ipc', 'size': 64,
+              'concurrency': 1, 'throughput': 1000,
+              'latency': {'p99': 0.001}}
+
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = os.path.join(directory, 'baseline.json')
+        current = os.path.join(directory, 'current.json')
+        with open(baseline, 'w') as output:
+            json.dump({'results': [result]}, output)
+        with open(current, 'w') as output:
+            json.dump({'results': [dict(result, throughput=500)]}, output)
+
+        assert main(['compare', baseline, baseline]) == 0
+        assert main(['compare', baseline, current]) == 1
+
+
+def test_micro_logging():
+    results = logging_calls(200)
+    assert sorted(results) == ['eager_off', 'lazy_off', 'queue_on',
+                               'stream_on']
+    assert all(nanoseconds > 0 for nanoseconds in results.values())
+
+
+def test_micro_dictdb():
+    results = dictdb_calls(400, threads=2)
+    assert sorted(results) == ['single_lock', 'single_lock_p999', 'striped',
+                               'striped_p999']
+    assert all(nanoseconds > 0 for nanoseconds in results.values())
+
+
+if __name__ == '__main__':
+    test_percentile()
+    test_run_case()
+    test_compare()
+    test_cli_compare()
+    test_micro_logging()
+    test_micro_dictdb()
@@ -0,0 +1,102 @@
+import concurrent.futures
+import logging
+import time
+
+import zmq
+
+from pylm.parts.core import zmq_context
+from pylm.parts.messages_pb2 import PalmMessage
+from pylm.servers import Server
+
+
+class SlowServer(Server):
+    def slow(self, message):
+        # The first messages take longer
+        time.sleep(0.05 * (8 - int(message)))
+        return message
+
+    def square(self, message):
+        return str(int(message) ** 2).encode('utf-8')
+
+
+def run(server, function, number):
+    pull = zmq_context.socket(zmq.PULL)
+    pull.connect(server.pull_address)
+    sub = zmq_context.socket(zmq.SUB)
+    sub.setsockopt_string(zmq.SUBSCRIBE, '')
+    sub.connect(server.pub_address)
+    push = zmq_context.socket(zmq.PUSH)
+    push.connect(server.pull_address)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        handler = executor.submit(server._execution_handler)
+
+        message = PalmMessage()
+        message.pipeline = '0'
+        message.client = 'client'
+        message.stage = 0
+        message.function = 'server.{}'.format(function)
+        for i in range(number):
+            message.payload = str(i).encode('utf-8')
+            push.send(message.SerializeToString())
+
+        got = []
+        for i in range(number):
+            topic, message_data = sub.recv_multipart()
+            message.ParseFromString(message_data)
+            got.append(message.payload)
+
+        handler.result()
+
+    pull.close()
+    sub.close()
+    push.close()
+    return got
+
+
+def test_thread_pool_ordered():
+    server = SlowServer('server', 'inproc://concurrent_db1',
+                        'inproc://concurrent_pull1',
+                        'inproc://concurrent_pub1',
+                        log_level=logging.WARNING,
+                        messages=8,
+                        concurrency=8)
+
+    start = time.time()
+    got = run(server, 'slow', 8)
+    assert time.time() - start < 0.05 * 36
+    assert got == [str(i).encode('utf-8') for i in range(8)]
+
+
+def test_thread_pool_unordered():
+    server = SlowServer('server', 'inproc://concurrent_db2',
+                        'inproc://concurrent_pull2',
+                        'inproc://concurrent_pub2',
+                        log_level=logging.WARNING,
+                        messages=8,
+                        concurrency=8,
+                        ordered=False)
+
+    got = run(server, 'slow', 8)
+    assert sorted(got) == [str(i).encode('utf-8') for i in range(8)]
+    assert got != [str(i).encode('utf-8') for i in range(8)]
+
+
+def test_process_pool():
+    server = SlowServer('server', 'inproc://concurrent_db3',
+                        'inproc://concurrent_pull3',
+                        'inproc://concurrent_pub3',
+                        log_level=logging.WARNING,
+                        messages=10,
+                        concurrency=2,
+                        pool='process',
+                        max_in_flight=4)
+
+    got = run(server, 'square', 10)
+    assert got == [str(i ** 2).encode('utf-8') for i in range(10)]
+
+
+if __name__ == '__main__':
+    test_thread_pool_ordered()
+    test_thread_pool_unordered()
+    test_process_pool()
@@ -0,0 +1,119 @@
+import concurrent.futures
+import logging
+import time
+
+import zmq
+
+from pylm.clients import Client
+from pylm.parts.core import zmq_context, Router
+from pylm.parts.services import PullService, PubService, \
+    WorkerPullService, WorkerPushService
+from pylm.servers import Worker
+
+
+class MyWorker(Worker):
+    def foo(self, message):
+        return self.name.encode('utf-8') + b' ' + message
+
+
+def test_least_loaded():
+    """
+    The messages go to the workers with most free slots, and wait while
+    there are none.
+    """
+    service = WorkerPushService('WorkerPush', 'inproc://credits_push',
+                                broker_address='inproc://credits_broker',
+                                logger=logging,
+                                credits=True)
+    service.listen_to.bind('inproc://credits_push')
+
+    workers = {}
+    for name, credits in [(b'a', b'1'), (b'b', b'2')]:
+        workers[name] = zmq_context.socket(zmq.DEALER)
+        workers[name].identity = name
+        workers[name].connect('inproc://credits_push')
+        workers[name].send(credits)
+
+    time.sleep(0.1)
+    for i in range(3):
+        service._push([str(i).encode('utf-8')])
+
+    # Ties are resolved in turns
+    assert workers[b'b'].recv() == b'0'
+    assert workers[b'a'].recv() == b'1'
+    assert workers[b'b'].recv() == b'2'
+    assert not any(socket.poll(100) for socket in workers.values())
+
+    # The next message waits for a free slot
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        pushed = executor.submit(service._push, [b'3'])
+        time.sleep(0.1)
+        assert not pushed.done()
+
+        workers[b'a'].send(b'1')
+        pushed.result(timeout=1)
+
+    assert workers[b'a'].recv() == b'3'
+
+    for socket in workers.values():
+        socket.close()
+    service.cleanup()
+
+
+def test_credit_worker():
+    router = Router(inbound_address='inproc://credits_inbound',
+                    outbound_address='inproc://credits_outbound',
+                    logger=logging,
+                    messages=16)
+    router.register_inbound('Pull', route='WorkerPush')
+    router.register_inbound('WorkerPull', route='Pub')
+    router.register_outbound('WorkerPush')
+    router.register_outbound('Pub')
+
+    pull = PullService('Pull', 'inproc://credits_pull',
+                       broker_address=router.inbound_address,
+                       logger=logging,
+                       messages=8)
+    worker_push = WorkerPushService('WorkerPush', 'inproc://credits_worker',
+                                    broker_address=router.outbound_address,
+                                    logger=logging,
+                                    messages=8,
+                                    credits=True)
+    worker_pull = WorkerPullService('WorkerPull', 'inproc://credits_results',
+                                    broker_address=router.inbound_address,
+                                    logger=logging,
+                                    messages=8)
+    pub = PubService('Pub', 'inproc://credits_pub',
+                     broker_address=router.outbound_address,
+                     logger=logging,
+                     messages=8)
+
+    payloads = [str(i).encode('utf-8') for i in range(8)]
+
+    def client():
+        with Client('server', 'inproc://credits_db',
+                    push_address='inproc://credits_pull',
+                    sub_address='inproc://credits_pub',
+                    logging_level=logging.WARNING,
+                    this_config=True) as client:
+            return sorted(client.job('server.foo', payloads, messages=8))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=7) as executor:
+        for part in (router, pull, worker_push, worker_pull, pub):
+            executor.submit(part.start)
+
+        worker = MyWorker('worker', 'inproc://credits_db',
+                          push_address='inproc://credits_worker',
+                          pull_address='inproc://credits_results',
+                          log_level=logging.WARNING,
+                          messages=8,
+                          credits=2)
+        executor.submit(worker.start)
+        results = executor.submit(client).result(timeout=10)
+
+    assert results == [b'worker ' + payload for payload in payloads]
+
+
+if __name__ == '__main__':
+    test_least_loaded()
+    test_credit_worker()
@@ -0,0 +1,102 @@
+import concurrent.futures
+import logging
+
+from pylm.clients import Client
+from pylm.parts.core import Router
+from pylm.parts.services import PullService, PubService, \
+    WorkerPullService, WorkerPushService
+from pylm.parts.sharedmem import SegmentPool, read
+from pylm.servers import Worker
+
+
+class MyWorker(Worker):
+    def measure(self, message):
+        return str(len(message)).encode('utf-8') + b' ' + message[:3]
+
+
+def test_segment_pool():
+    segments = SegmentPool()
+    name = segments.put(b'0123456789')
+    segments.acquire(name)
+
+    assert read(name, 2, 3) == b'234'
+
+    segments.release(name)
+    assert len(segments) == 1
+    segments.release(name)
+    assert len(segments) == 0
+
+
+def test_shared_memory():
+    """
+    The payload is scattered to three messages, and written once in shared
+    memory. It is freed when the three results are back.
+    """
+    router = Router(inbound_address='inproc://shm_inbound',
+                    outbound_address='inproc://shm_outbound',
+                    logger=logging,
+                    messages=8)
+    router.register_inbound('Pull', route='WorkerPush')
+    router.register_inbound('WorkerPull', route='Pub')
+    router.register_outbound('WorkerPush')
+    router.register_outbound('Pub')
+
+    segments = SegmentPool()
+    pull = PullService('Pull', 'inproc://shm_pull',
+                       broker_address=router.inbound_address,
+                       logger=logging,
+                       messages=2,
+                       shared_memory=1024,
+                       segments=segments)
+
+    def scatter(message):
+        # The payload is already in shared memory if it is large
+        for i in range(1 if message.payload else 3):
+            yield message
+
+    pull.scatter = scatter
+
+    worker_push = WorkerPushService('WorkerPush', 'inproc://shm_push',
+                                    broker_address=router.outbound_address,
+                                    logger=logging,
+                                    messages=4)
+    worker_pull = WorkerPullService('WorkerPull', 'inproc://shm_results',
+                                    broker_address=router.inbound_address,
+                                    logger=logging,
+                                    messages=4,
+                                    segments=segments)
+    pub = PubService('Pub', 'inproc://shm_pub',
+                     broker_address=router.outbound_address,
+                     logger=logging,
+                     messages=4)
+
+    worker = MyWorker('worker', 'inproc://shm_db',
+                      push_address='inproc://shm_push',
+                      pull_address='inproc://shm_results',
+                      log_level=logging.WARNING,
+                      messages=4)
+
+    payload = bytes(range(256)) * 64
+
+    def client():
+        with Client('server', 'inproc://shm_db',
+                    push_address='inproc://shm_pull',
+                    sub_address='inproc://shm_pub',
+                    logging_level=logging.WARNING,
+                    this_config=True) as client:
+            return (list(client.job('server.measure', [payload], messages=3)),
+                    client.eval('server.measure', b'small'))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=7) as executor:
+        for part in (router, pull, worker_push, worker_pull, pub, worker):
+            executor.submit(part.start)
+        results, small = executor.submit(client).result(timeout=10)
+
+    assert results == [b'16384 \x00\x01\x02'] * 3
+    assert small == b'5 sma'
+    assert len(segments) == 0
+
+
+if __name__ == '__main__':
+    test_segment_pool()
+    test_shared_memory()
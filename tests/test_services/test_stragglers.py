@@ -0,0 +1,217 @@
+import concurrent.futures
+import logging
+import time
+
+import zmq
+
+from pylm.clients import Client
+from pylm.parts.core import zmq_context, Router
+from pylm.parts.messages_pb2 import PalmMessage
+from pylm.parts.services import PullService, PubService, \
+    WorkerPullService, WorkerPushService
+from pylm.parts.stragglers import TaskTracker
+
+
+def test_task_tracker():
+    tasks = TaskTracker(50, factor=2, min_samples=3)
+
+    # Not enough latencies to find stragglers
+    tasks.start('slow', 'server.foo', [b'slow'])
+    assert tasks.stragglers() == []
+
+    for i in range(3):
+        tasks.start(str(i), 'server.foo', [b'fast'])
+        assert tasks.finish(str(i))
+
+    assert tasks.threshold('server.foo') is not None
+    assert tasks.threshold('server.bar') is None
+
+    time.sleep(0.05)
+    assert tasks.stragglers() == [[b'slow']]
+    # A task is sent again only once
+    assert tasks.stragglers() == []
+
+    # The first result goes on, the second one is discarded
+    assert tasks.finish('slow')
+    assert not tasks.finish('slow')
+    assert len(tasks) == 0
+
+    # A copy whose result never comes back is forgotten
+    tasks = TaskTracker(50, factor=2, min_samples=3, expire=0.05)
+    for i in range(3):
+        tasks.start(str(i), 'server.foo', [b'fast'])
+        tasks.finish(str(i))
+    tasks.start('lost', 'server.foo', [b'lost'])
+    time.sleep(0.05)
+    assert tasks.stragglers() == [[b'lost']]
+    assert tasks.finish('lost')
+    assert 'lost' in tasks.speculated
+    time.sleep(0.1)
+    tasks.stragglers()
+    assert not tasks.speculated
+
+    tasks.start('gone', 'server.foo', [b'gone'])
+    assert tasks.drop() == 1
+    assert len(tasks) == 0
+
+    try:
+        TaskTracker(100)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_speculate():
+    """
+    Two workers that take credits. The task that one of them holds is sent
+    to the other one, and only the first result gets to the client.
+    """
+    router = Router(inbound_address='inproc://stragglers_inbound',
+                    outbound_address='inproc://stragglers_outbound',
+                    logger=logging,
+                    messages=12)
+    router.register_inbound('Pull', route='WorkerPush')
+    router.register_inbound('WorkerPull', route='Pub')
+    router.register_outbound('WorkerPush')
+    router.register_outbound('Pub')
+
+    tasks = TaskTracker(50, factor=3, min_samples=5)
+    pull = PullService('Pull', 'inproc://stragglers_pull',
+                       broker_address=router.inbound_address,
+                       logger=logging,
+                       messages=6)
+    worker_push = WorkerPushService('WorkerPush', 'inproc://stragglers_push',
+                                    broker_address=router.outbound_address,
+                                    logger=logging,
+                                    messages=6,
+                                    credits=True,
+                                    tasks=tasks,
+                                    speculate_interval=10)
+    worker_pull = WorkerPullService('WorkerPull',
+                                    'inproc://stragglers_results',
+                                    broker_address=router.inbound_address,
+                                    logger=logging,
+                                    messages=7,
+                                    tasks=tasks)
+    pub = PubService('Pub', 'inproc://stragglers_pub',
+                     broker_address=router.outbound_address,
+                     logger=logging,
+                     messages=6)
+
+    payloads = [b'fast'] * 5 + [b'slow']
+
+    def client():
+        with Client('server', 'inproc://stragglers_db',
+                    push_address='inproc://stragglers_pull',
+                    sub_address='inproc://stragglers_pub',
+                    logging_level=logging.WARNING,
+                    this_config=True) as client:
+            return [client.eval('server.foo', payload)
+                    for payload in payloads]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=6) as executor:
+        for part in (router, pull, worker_push, worker_pull, pub):
+            executor.submit(part.start)
+
+        results = zmq_context.socket(zmq.PUSH)
+        results.connect('inproc://stragglers_results')
+        poller = zmq.Poller()
+        workers = {}
+        for name in (b'a', b'b'):
+            workers[name] = zmq_context.socket(zmq.DEALER)
+            workers[name].identity = name
+            workers[name].connect('inproc://stragglers_push')
+            workers[name].send(b'1')
+            poller.register(workers[name], zmq.POLLIN)
+
+        evals = executor.submit(client)
+
+        # The first worker that gets the slow task holds it until the
+        # other one sends the result of the copy.
+        held = None
+        while not evals.done():
+            for socket, event in poller.poll(100):
+                message = PalmMessage()
+                message.ParseFromString(socket.recv())
+                if message.payload == b'slow' and held is None:
+                    held = message
+                    continue
+
+                time.sleep(0.02)
+                message.payload = socket.identity + b' ' + message.payload
+                results.send(message.SerializeToString())
+                socket.send(b'1')
+
+        held.payload = b'held'
+        results.send(held.SerializeToString())
+        time.sleep(0.1)
+
+        for socket in workers.values():
+            socket.close()
+        results.close()
+
+    *fast, slow = evals.result()
+    assert len(fast) == 5 and all(result.endswith(b' fast')
+                                  for result in fast)
+    assert slow.endswith(b' slow')
+    assert len(tasks) == 0
+
+
+def test_drain_timeout():
+    """
+    The service stops after the last message even if a task never gets a
+    result.
+    """
+    router = Router(inbound_address='inproc://drain_inbound',
+                    outbound_address='inproc://drain_outbound',
+                    logger=logging,
+                    messages=1)
+    router.register_inbound('Pull', route='WorkerPush')
+    router.register_outbound('WorkerPush')
+
+    tasks = TaskTracker(50)
+    pull = PullService('Pull', 'inproc://drain_pull',
+                       broker_address=router.inbound_address,
+                       logger=logging,
+                       messages=1)
+    worker_push = WorkerPushService('WorkerPush', 'inproc://drain_push',
+                                    broker_address=router.outbound_address,
+                                    logger=logging,
+                                    messages=1,
+                                    tasks=tasks,
+                                    speculate_interval=10,
+                                    drain_timeout=200)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        for part in (router, pull):
+            executor.submit(part.start)
+        service = executor.submit(worker_push.start)
+
+        worker = zmq_context.socket(zmq.PULL)
+        worker.connect('inproc://drain_push')
+        client = zmq_context.socket(zmq.PUSH)
+        client.connect('inproc://drain_pull')
+
+        message = PalmMessage()
+        message.pipeline = '0'
+        message.client = '0'
+        message.stage = 0
+        message.function = 'server.foo'
+        message.payload = b'lost'
+        client.send(message.SerializeToString())
+
+        # The worker gets the task and dies
+        worker.recv()
+        assert service.result(timeout=5) == b'WorkerPush'
+
+        worker.close()
+        client.close()
+
+    assert len(tasks) == 0
+
+
+if __name__ == '__main__':
+    test_task_tracker()
+    test_speculate()
+    test_drain_timeout()
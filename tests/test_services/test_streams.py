@@ -0,0 +1,178 @@
+import concurrent.futures
+import io
+import logging
+
+import zmq
+
+from pylm.clients import Client
+from pylm.parts.core import zmq_context, Router, pack, unpack
+from pylm.parts.messages_pb2 import PalmMessage
+from pylm.parts.services import PullService, PubService, \
+    WorkerPullService, WorkerPushService
+from pylm.servers import Worker
+
+
+class MyWorker(Worker):
+    def count(self, message):
+        if isinstance(message, bytes):
+            return b'single ' + message
+
+        chunks = list(message)
+        return str(len(chunks)).encode('utf-8') + b' ' + b''.join(chunks)
+
+    def first(self, message):
+        if isinstance(message, bytes):
+            return message
+
+        return next(message)
+
+
+def test_stream():
+    router = Router(inbound_address='inproc://streams_inbound',
+                    outbound_address='inproc://streams_outbound',
+                    logger=logging,
+                    messages=20)
+    router.register_inbound('Pull', route='WorkerPush')
+    router.register_inbound('WorkerPull', route='Pub')
+    router.register_outbound('WorkerPush')
+    router.register_outbound('Pub')
+
+    pull = PullService('Pull', 'inproc://streams_pull',
+                       broker_address=router.inbound_address,
+                       logger=logging,
+                       messages=17)
+    worker_push = WorkerPushService('WorkerPush', 'inproc://streams_push',
+                                    broker_address=router.outbound_address,
+                                    logger=logging,
+                                    messages=17,
+                                    stream_address='inproc://streams_chunks')
+    worker_pull = WorkerPullService('WorkerPull', 'inproc://streams_results',
+                                    broker_address=router.inbound_address,
+                                    logger=logging,
+                                    messages=3)
+    pub = PubService('Pub', 'inproc://streams_pub',
+                     broker_address=router.outbound_address,
+                     logger=logging,
+                     messages=3)
+
+    worker = MyWorker('worker', 'inproc://streams_db',
+                      push_address='inproc://streams_push',
+                      pull_address='inproc://streams_results',
+                      stream_address='inproc://streams_chunks',
+                      log_level=logging.WARNING,
+                      messages=3)
+
+    payload = bytes(range(250)) * 4
+
+    def client():
+        with Client('server', 'inproc://streams_db',
+                    push_address='inproc://streams_pull',
+                    sub_address='inproc://streams_pub',
+                    logging_level=logging.WARNING,
+                    this_config=True) as client:
+            return [client.stream('server.count', payload, chunk_size=100),
+                    client.stream('server.count', io.BytesIO(payload[:550]),
+                                  chunk_size=100),
+                    client.eval('server.count', b'payload')]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=7) as executor:
+        for part in (router, pull, worker_push, worker_pull, pub, worker):
+            executor.submit(part.start)
+        results = executor.submit(client).result(timeout=10)
+
+    assert results[0] == b'10 ' + payload
+    assert results[1] == b'6 ' + payload[:550]
+    assert results[2] == b'single payload'
+
+
+def test_interleaved_streams():
+    """
+    The worker gets the chunks of two streams mixed, and processes one
+    stream after the other.
+    """
+    master = zmq_context.socket(zmq.ROUTER)
+    master.bind('inproc://interleaved_chunks')
+    results = zmq_context.socket(zmq.PULL)
+    results.bind('inproc://interleaved_results')
+
+    worker = MyWorker('worker', 'inproc://interleaved_db',
+                      push_address='inproc://interleaved_push',
+                      pull_address='inproc://interleaved_results',
+                      stream_address='inproc://interleaved_chunks',
+                      log_level=logging.WARNING,
+                      messages=2)
+
+    [identity, ready] = master.recv_multipart()
+
+    message = PalmMessage()
+    message.pipeline = '0'
+    message.client = '0'
+    message.function = 'server.count'
+    for stream, chunk, last in [('a', 1, False), ('b', 1, False),
+                                ('a', 2, False), ('b', 2, True),
+                                ('a', 3, True)]:
+        message.id = stream
+        message.chunk = chunk
+        message.last = last
+        message.payload = '{}{}'.format(stream, chunk).encode('utf-8')
+        master.send_multipart([identity] + pack(message))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(worker.start)
+        got = [next(unpack(results.recv_multipart())) for i in range(2)]
+
+    assert [m.payload for m in got] == [b'3 a1a2a3', b'2 b1b2']
+    assert [m.chunk for m in got] == [0, 0]
+
+    master.close()
+    results.close()
+
+
+def test_stream_disabled():
+    """
+    A worker without streams answers the chunks of a stream with an error,
+    and keeps working.
+    """
+    master = zmq_context.socket(zmq.PUSH)
+    master.bind('inproc://disabled_push')
+    results = zmq_context.socket(zmq.PULL)
+    results.bind('inproc://disabled_results')
+
+    worker = MyWorker('worker', 'inproc://disabled_db',
+                      push_address='inproc://disabled_push',
+                      pull_address='inproc://disabled_results',
+                      log_level=logging.CRITICAL,
+                      messages=2)
+
+    message = PalmMessage()
+    message.pipeline = '0'
+    message.client = '0'
+    message.function = 'server.first'
+    message.id = 'a'
+    message.chunk = 1
+    message.payload = b'a1'
+    master.send_multipart(pack(message))
+
+    message.function = 'server.count'
+    message.chunk = 0
+    message.payload = b'payload'
+    master.send_multipart(pack(message))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(worker.start)
+        got = []
+        for i in range(2):
+            assert results.poll(5000)
+            got.append(next(unpack(results.recv_multipart())))
+
+    assert [m.payload for m in got] == [b'0', b'single payload']
+    assert [m.chunk for m in got] == [0, 0]
+
+    master.close()
+    results.close()
+
+
+if __name__ == '__main__':
+    test_stream()
+    test_interleaved_streams()
+    test_stream_disabled()
@@ -0,0 +1,118 @@
+import concurrent.futures
+import logging
+
+from pylm.clients import Client
+from pylm.parts.core import Router
+from pylm.parts.messages_pb2 import PalmMessage
+from pylm.parts.services import PullService, PubService, \
+    WorkerPullService, WorkerPushService, TraceService
+from pylm.parts.tracing import sample, record, events, hops
+from pylm.servers import Worker
+
+
+class MyWorker(Worker):
+    def foo(self, message):
+        return b'processed ' + message
+
+
+def test_sample():
+    message = PalmMessage()
+    assert not sample(message, 0)
+    assert not message.trace and not message.trace_parts
+
+    assert sample(message, 1)
+    record(message, b'Pull', 'in')
+    record(message, 'WorkerPush', 'out')
+
+    assert [(part, event) for part, event, time in events(message)] == [
+        ('client', 'sent'), ('Pull', 'in'), ('WorkerPush', 'out')]
+    assert [hop for hop, seconds in hops(message)] == [
+        'client.sent -> Pull.in', 'Pull.in -> WorkerPush.out']
+    assert all(seconds >= 0 for hop, seconds in hops(message))
+
+    # The trace survives the serialization
+    copy = PalmMessage()
+    copy.ParseFromString(message.SerializeToString())
+    assert events(copy) == events(message)
+
+
+def test_trace_collector():
+    """
+    Every part appends its events to the traced messages, and the collector
+    gets the whole journey from the client.
+    """
+    router = Router(inbound_address='inproc://tracing_inbound',
+                    outbound_address='inproc://tracing_outbound',
+                    logger=logging,
+                    messages=8)
+    router.register_inbound('Pull', route='WorkerPush')
+    router.register_inbound('WorkerPull', route='Pub')
+    router.register_outbound('WorkerPush')
+    router.register_outbound('Pub')
+
+    pull = PullService('Pull', 'inproc://tracing_pull',
+                       broker_address=router.inbound_address,
+                       logger=logging,
+                       messages=4)
+    worker_push = WorkerPushService('WorkerPush', 'inproc://tracing_worker',
+                                    broker_address=router.outbound_address,
+                                    logger=logging,
+                                    messages=4)
+    worker_pull = WorkerPullService('WorkerPull', 'inproc://tracing_results',
+                                    broker_address=router.inbound_address,
+                                    logger=logging,
+                                    messages=4)
+    pub = PubService('Pub', 'inproc://tracing_pub',
+                     broker_address=router.outbound_address,
+                     logger=logging,
+                     messages=4)
+    collector = TraceService('Trace', 'inproc://tracing_collector',
+                             logger=logging,
+                             messages=4)
+
+    def client():
+        with Client('server', 'inproc://tracing_db',
+                    push_address='inproc://tracing_pull',
+                    sub_address='inproc://tracing_pub',
+                    logging_level=logging.WARNING,
+                    this_config=True,
+                    trace_rate=1,
+                    trace_address='inproc://tracing_collector') as client:
+            return [client.eval('server.foo', str(i).encode('utf-8'))
+                    for i in range(4)]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        parts = [executor.submit(part.start)
+                 for part in (router, pull, worker_push, worker_pull, pub,
+                              collector)]
+
+        worker = MyWorker('worker', 'inproc://tracing_db',
+                          push_address='inproc://tracing_worker',
+                          pull_address='inproc://tracing_results',
+                          log_level=logging.WARNING,
+                          messages=4)
+        executor.submit(worker.start)
+        results = executor.submit(client).result(timeout=10)
+        parts[-1].result(timeout=10)
+
+    assert results == [b'processed ' + str(i).encode('utf-8')
+                       for i in range(4)]
+    assert len(collector.traces) == 4
+
+    trace, journey = collector.traces[0]
+    assert [hop for hop, seconds in journey] == [
+        'client.sent -> Pull.in',
+        'Pull.in -> WorkerPush.out',
+        'WorkerPush.out -> worker.in',
+        'worker.in -> worker.out',
+        'worker.out -> WorkerPull.in',
+        'WorkerPull.in -> Pub.out',
+        'Pub.out -> client.received']
+    assert collector.breakdown()['worker.in -> worker.out']['count'] == 4
+
+    collector.cleanup()
+
+
+if __name__ == '__main__':
+    test_sample()
+    test_trace_collector()